@@ -30,6 +30,7 @@ def enforce_autostop():
     client.login(USERNAME, PASSWORD)
     
     apps = client.get_applications()
+    expire = []
     for app in apps:
         if app['published'] == False:
             continue
@@ -38,12 +39,13 @@ def enforce_autostop():
             continue
         if not app.has_key('nextStopTime'):
             # no expiration set for this application, set it
-            set_expiration(client, app)
+            expire.append(app)
         else:
             expiration_time = datetime.datetime.utcfromtimestamp(app['nextStopTime'] / 1e3)
             # if expiration_time (utc) is too long into the future, set_expiration correctly
             if should_expire_app(expiration_time, app):
-                set_expiration(client, app)
+                expire.append(app)
+    set_expiration(client, expire)
 
 def should_expire_app(current_expiration_time_utc, app):
     now = datetime.datetime.utcnow()
@@ -52,6 +54,12 @@ def should_expire_app(current_expiration_time_utc, app):
         return True
     return False
 
-def set_expiration(client, app):
-    print "setting expiration for ", app['name']
-    client.set_application_expiration(app, {'expirationFromNowSeconds': MAX_ALLOWED_EXPIRATION_PERIOD_IN_SEC})
\ No newline at end of file
+def set_expiration(client, apps):
+    # set the expirations concurrently, a failure for one app does not stop the others
+    req = {'expirationFromNowSeconds': MAX_ALLOWED_EXPIRATION_PERIOD_IN_SEC}
+    results = client.map('set_application_expiration', [(app, req) for app in apps])
+    for app, result in zip(apps, results):
+        if result.error is not None:
+            print "failed to set expiration for ", app['name'], ": ", result.error
+        else:
+            print "set expiration for ", app['name']
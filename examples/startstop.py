@@ -30,7 +30,6 @@ import textwrap
 
 from argparse import ArgumentParser
 from datetime import datetime
-from contextlib import closing
 from ravello_sdk import *
 
 log = logging.getLogger('main')
@@ -123,17 +122,18 @@ def active(intervals, now):
             return True
     return False
 
-def connect(username, password):
-    """Connect to the API, return a `RavelloClient` instance."""
-    client = RavelloClient()
-    client.connect()
-    client.login(username, password)
-    return client
+def mkpool():
+    """Create the pool of API clients.
 
-def startstop(cfg, req, now, dry_run):
+    Entries for the same user share a client, so that we log in once per
+    user. The sessions are saved in our application directory, so that the
+    next run can reuse them instead of logging in again.
+    """
+    return ClientPool(session_store=SessionStore(appfile('sessions')))
+
+def startstop(cfg, req, now, dry_run, pool):
     """Start or stop an application, if needed."""
-    client = connect(req['username'], req['password'])
-    with closing(client):
+    with pool.client(req['username'], req['password']) as client:
         app = client.get_application(req['id'])
         if app is None:
             log.error('no such application: {}'.format(app['id']))
@@ -169,10 +169,11 @@ def main():
     initlog(args)
     cfg = readcfg()
     now = datetime.utcnow()
+    pool = mkpool()
     for req in cfg['applications']:
         log.info('processing: {} (id = {})'.format(req['name'], req['id']))
         try:
-            success = startstop(cfg, req, now, args.dry_run)
+            success = startstop(cfg, req, now, args.dry_run, pool)
         except Exception as e:
             if args.debug:
                 log.exception('uncaught exception')
@@ -183,6 +184,7 @@ def main():
             log.info('success: {}'.format(req['name']))
         else:
             log.error('failure: {}'.format(req['name']))
+    pool.close()
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,915 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, print_function
+
+import ssl
+import time
+import asyncio
+import inspect
+import logging
+import functools
+import collections
+
+import requests
+
+from http.cookies import SimpleCookie
+from requests.structures import CaseInsensitiveDict
+from requests.utils import requote_uri
+
+from ravello_sdk import (RavelloClient, RavelloError, BatchResult, CircuitBreaker,
+                         ConcurrencyGovernor, Record, compile_filter, _RELOGIN, _Flight,
+                         _JSONArrayParser, _coalesced_methods, _compile_criteria,
+                         _copy_entity, _filter_rejected, _flight_key, _match_filter, _monotonic,
+                         _path_template, _split_call, _untraced_methods)
+
+
+__all__ = ['AsyncRavelloClient']
+
+
+class _StaleConnection(Exception):
+    """A kept-alive connection was closed by the server before it replied."""
+
+
+class _AsyncSession(object):
+    """A session with the API.
+
+    The session holds the session cookies, and a pool of keep-alive HTTP/1.1
+    connections to the API host. At most *maxsize* connections are open at
+    the same time.
+    """
+
+    def __init__(self, url, maxsize):
+        self.host = url.hostname
+        self.port = url.port
+        self.ssl = ssl.create_default_context() if url.scheme == 'https' else None
+        default_port = 443 if url.scheme == 'https' else 80
+        self.netloc = self.host if self.port == default_port else url.netloc
+        self.cookies = {}
+        self.connections = 0
+        self._idle = []
+        self._slots = asyncio.Semaphore(maxsize)
+
+    async def request(self, method, target, headers, body, stream=False):
+        """Send a request and return a ``(status, reason, headers, content)``
+        tuple.
+
+        If *stream* is set, the body of a successful response is not read,
+        and *content* is a :class:`_Body` instead. The connection is in use
+        until the body has been read or closed.
+        """
+        await self._slots.acquire()
+        try:
+            status, reason, rheaders, rbody = await self._send(method, target, headers, body)
+        except BaseException:
+            self._slots.release()
+            raise
+        if stream and 200 <= status < 300:
+            return status, reason, rheaders, rbody
+        return status, reason, rheaders, await rbody.read()
+
+    async def _send(self, method, target, headers, body):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if reader.at_eof():
+                writer.close()
+                continue
+            try:
+                return await self._exchange(reader, writer, method, target, headers, body)
+            except _StaleConnection:
+                continue
+        self.connections += 1
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        try:
+            return await self._exchange(reader, writer, method, target, headers, body)
+        except _StaleConnection:
+            raise ConnectionError('connection closed by server')
+
+    async def _exchange(self, reader, writer, method, target, headers, body):
+        # Send a request on a connection and read the response head.
+        lines = ['{0} {1} HTTP/1.1'.format(method, target), 'Host: {0}'.format(self.netloc)]
+        for key, value in headers.items():
+            lines.append('{0}: {1}'.format(key, value))
+        if self.cookies:
+            cookies = '; '.join('{0}={1}'.format(*item) for item in self.cookies.items())
+            lines.append('Cookie: {0}'.format(cookies))
+        if body or method not in ('GET', 'HEAD'):
+            lines.append('Content-Length: {0}'.format(len(body)))
+        lines.append('\r\n')
+        try:
+            try:
+                writer.write('\r\n'.join(lines).encode('latin-1') + body)
+                await writer.drain()
+                line = await reader.readline()
+            except ConnectionError:
+                raise _StaleConnection()
+            if not line:
+                raise _StaleConnection()
+            parts = line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+            version, status = parts[0], int(parts[1])
+            reason = parts[2] if len(parts) > 2 else ''
+            rheaders = CaseInsensitiveDict()
+            setcookies = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, value = line.decode('latin-1').split(':', 1)
+                key, value = key.strip(), value.strip()
+                if key.lower() == 'set-cookie':
+                    setcookies.append(value)
+                elif key in rheaders:
+                    rheaders[key] += ', ' + value
+                else:
+                    rheaders[key] = value
+        except BaseException:
+            writer.close()
+            raise
+        self._update_cookies(setcookies)
+        keepalive = version == 'HTTP/1.1' and \
+                rheaders.get('Connection', '').lower() != 'close'
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            length = 0
+        elif rheaders.get('Transfer-Encoding', '').lower() == 'chunked':
+            length = None
+        elif 'Content-Length' in rheaders:
+            length = int(rheaders['Content-Length'])
+        else:
+            length = -1
+            keepalive = False
+        return status, reason, rheaders, _Body(self, reader, writer, length, keepalive)
+
+    def _update_cookies(self, setcookies):
+        for value in setcookies:
+            cookie = SimpleCookie()
+            cookie.load(value)
+            for name, morsel in cookie.items():
+                if morsel['max-age'] == '0':
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+    def _release(self, reader, writer, reuse):
+        # Called by _Body when it is done with a connection.
+        if reuse:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+        self._slots.release()
+
+    def close(self):
+        """Close all idle connections."""
+        for reader, writer in self._idle:
+            writer.close()
+        del self._idle[:]
+
+
+class _Body(object):
+    """The body of a response, read from a connection of an
+    :class:`_AsyncSession`.
+
+    The *length* is the Content-Length, None for a chunked body, or -1 for a
+    body that extends until the connection is closed. Once the body has been
+    read to the end, or is closed, the connection goes back to the session.
+    """
+
+    def __init__(self, session, reader, writer, length, keepalive):
+        self._session = session
+        self._reader = reader
+        self._writer = writer
+        self._length = length
+        self._keepalive = keepalive
+        self._chunk = 0
+        self._closed = False
+        if length == 0:
+            self._finish(True)
+
+    async def read_chunk(self, size=65536):
+        """Read and return the next chunk of at most *size* bytes, or an empty
+        bytes object at the end of the body."""
+        if self._closed:
+            return b''
+        try:
+            if self._length is None:
+                data = await self._read_chunked(size)
+            elif self._length < 0:
+                data = await self._reader.read(size)
+                if not data:
+                    self._finish(False)
+            else:
+                data = await self._reader.readexactly(min(size, self._length))
+                self._length -= len(data)
+                if self._length == 0:
+                    self._finish(self._keepalive)
+        except BaseException:
+            self.close()
+            raise
+        return data
+
+    async def _read_chunked(self, size):
+        reader = self._reader
+        if self._chunk == 0:
+            line = await reader.readline()
+            self._chunk = int(line.split(b';', 1)[0], 16)
+            if self._chunk == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                self._finish(self._keepalive)
+                return b''
+        data = await reader.readexactly(min(size, self._chunk))
+        self._chunk -= len(data)
+        if self._chunk == 0:
+            await reader.readline()
+        return data
+
+    async def read(self):
+        """Read and return the rest of the body."""
+        chunks = []
+        while True:
+            data = await self.read_chunk()
+            if not data:
+                break
+            chunks.append(data)
+        return b''.join(chunks)
+
+    def _finish(self, reuse):
+        if not self._closed:
+            self._closed = True
+            self._session._release(self._reader, self._writer, reuse)
+
+    def close(self):
+        """Close the body. If it has not been read to the end, the connection
+        is closed as well."""
+        self._finish(False)
+
+    def __del__(self):
+        try:
+            self.close()
+        except RuntimeError:
+            # The event loop has been closed already.
+            pass
+
+
+class _Pending(object):
+    """The result of an API call that has not been made yet."""
+
+    def __getattr__(self, name):
+        raise AttributeError(name)
+
+    def _unavailable(self, *args):
+        raise TypeError('the result of an API call is not available here')
+
+    __len__ = __iter__ = __getitem__ = __contains__ = __bool__ = _unavailable
+
+_PENDING = _Pending()
+
+
+class _Recorder(object):
+    """Stands in for the client when running a mapped method of
+    :class:`RavelloClient`, and records the API call it makes."""
+
+    tracer = None
+
+    def __init__(self):
+        self.calls = []
+
+    def request(self, *args, **kwargs):
+        self.calls.append(('request', args, kwargs))
+        return _PENDING
+
+    def _list(self, *args, **kwargs):
+        self.calls.append(('_list', args, kwargs))
+        return _PENDING
+
+    def _iter(self, *args, **kwargs):
+        self.calls.append(('_iter', args, kwargs))
+        return _PENDING
+
+    def _wait_for_state(self, *args):
+        raise TypeError('wait=True is not supported by AsyncRavelloClient, '
+                        'use wait_for() instead')
+
+
+def _mirror(func):
+    """Return a coroutine version of the mapped method *func*.
+
+    The mapped method is run against a :class:`_Recorder`. This builds the
+    URL and entity exactly as the synchronous client does, and captures the
+    single API call that the method makes. That call is then made on the
+    asynchronous client.
+    """
+    @functools.wraps(func)
+    async def method(self, *args, **kwargs):
+        recorder = _Recorder()
+        result = func(recorder, *args, **kwargs)
+        if len(recorder.calls) != 1 or (result is not None and result is not _PENDING):
+            raise TypeError('{0}() cannot be mirrored, it needs an explicit '
+                            'coroutine in AsyncRavelloClient'.format(func.__name__))
+        name, cargs, ckwargs = recorder.calls[0]
+        value = await getattr(self, name)(*cargs, **ckwargs)
+        return value if result is _PENDING else None
+    return method
+
+
+def _mirror_iter(func):
+    """Return a version of the mapped "iter" method *func* that returns an
+    asynchronous iterator. See :func:`_mirror`."""
+    @functools.wraps(func)
+    def method(self, *args, **kwargs):
+        recorder = _Recorder()
+        result = func(recorder, *args, **kwargs)
+        if len(recorder.calls) != 1 or recorder.calls[0][0] != '_iter' or result is not _PENDING:
+            raise TypeError('{0}() cannot be mirrored, it needs an explicit '
+                            'method in AsyncRavelloClient'.format(func.__name__))
+        name, cargs, ckwargs = recorder.calls[0]
+        return self._iter(*cargs, **ckwargs)
+    return method
+
+
+def _wake(waiter):
+    """Wake up a coroutine that waits on the future *waiter*."""
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _SlotWaiter(object):
+    """A waiter for a :class:`ConcurrencyGovernor`, which wakes up a
+    coroutine on *loop*."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def __call__(self):
+        self.loop.call_soon_threadsafe(_wake, self.future)
+
+    def done(self):
+        return self.future.done()
+
+
+class AsyncRavelloClient(RavelloClient):
+    """An asyncio client for the Ravello API. This requires Python 3.5+.
+
+    The client has the same methods as :class:`RavelloClient`, but all
+    methods that talk to the API are coroutines. Many API calls can be in
+    flight at the same time on a single event loop, up to *pool_maxsize*
+    concurrent connections::
+
+        client = AsyncRavelloClient(username, password)
+        apps = await client.get_applications()
+        await asyncio.gather(*[client.start_application(app) for app in apps])
+
+    URLs, the ``"_href"`` annotation and the mapping of error responses to
+    exceptions are shared with :class:`RavelloClient`, so both clients return
+    the same objects and raise the same exceptions. The mapped API calls are
+    derived automatically from the methods of :class:`RavelloClient`. The
+    "iter" methods return asynchronous iterators::
+
+        async for app in client.iter_applications():
+            print(app['name'])
+
+    A client must be used from a single event loop. Its HTTP transport is
+    minimal: HTTP proxies are not supported, and redirects are not followed.
+    """
+
+    default_pool_maxsize = 100
+    default_batch_workers = 50
+
+    # Methods of RavelloClient that do not talk to the API and stay regular
+    # methods.
+    _sync_methods = ('connect', 'stats')
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get('proxy_url') is not None:
+            raise ValueError('AsyncRavelloClient does not support proxies')
+        super(AsyncRavelloClient, self).__init__(*args, **kwargs)
+        self._async_lock = None
+
+    def _lock(self):
+        # Created lazily, so that it binds to the loop that runs the client.
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        return self._async_lock
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def connect(self, url=None, proxy_url=None, eph_token=None):
+        """Connect to the API. See :meth:`RavelloClient.connect`."""
+        if proxy_url is not None:
+            raise ValueError('AsyncRavelloClient does not support proxies')
+        super(AsyncRavelloClient, self).connect(url, eph_token=eph_token)
+
+    async def login(self, username=None, password=None, identity_domain=None):
+        """Login to the API. See :meth:`RavelloClient.login`."""
+        if username is None and password is None and identity_domain is None:
+            # Coroutines that call this at the same time share one login,
+            # like the re-logins in _login().
+            if not self.logged_in:
+                await self._login(self._generation)
+            return
+        if self.logged_in:
+            raise RuntimeError('already logged in')
+        if username is not None:
+            self._username = username
+        if identity_domain is not None:
+            self._identity_domain = identity_domain
+        if password is not None:
+            self._password = password
+        await self._login()
+
+    async def _login(self, generation=None):
+        # Like RavelloClient._login(): only one coroutine logs in at a time.
+        async with self._lock():
+            if generation is not None and generation != self._generation:
+                return
+            if not self.have_credentials and not self.have_eph_access_token:
+                raise RuntimeError('no credentials or ephemeral access token set')
+            session = self._connection or _AsyncSession(self._url, self.pool_maxsize)
+            saved = self._saved_session() if self._generation == 0 else None
+            if saved is not None:
+                self._logger.debug('using a saved session')
+                for cookie in saved['cookies']:
+                    session.cookies[cookie['name']] = cookie['value']
+                self._user_info = saved['user_info']
+            elif self.have_credentials:
+                self._logger.debug('performing a username/password login')
+                headers = [('Authorization', self._basic_auth())]
+                try:
+                    self._user_info = await self._request('POST', '/login', b'', headers,
+                                                          session=session)
+                except Exception:
+                    session.close()
+                    self._connection = None
+                    raise
+                self._save_session([{'name': name, 'value': value,
+                                     'domain': self._url.hostname, 'path': '/'}
+                                    for name, value in session.cookies.items()])
+            else:
+                self._logger.debug('using ephemeral access based session')
+            self._connection = session
+            self._generation += 1
+
+    async def logout(self):
+        """Logout from the API. See :meth:`RavelloClient.logout`."""
+        if self.logged_in:
+            await self.request('POST', '/logout')
+        self._forget_session()
+        await self.close()
+
+    async def warm_up(self):
+        """Log in and open a connection to the API ahead of the first call.
+        See :meth:`RavelloClient.warm_up`. Run it as a task to warm up in
+        the background."""
+        await self.request('GET', self.warm_up_path, cache=False)
+
+    async def close(self):
+        """Close the connections to the API."""
+        if not self.connected:
+            return
+        self._connection.close()
+        self._connection = None
+
+    async def request(self, method, path, entity=None, headers=None, cache=True):
+        """Issues a request to the API. See :meth:`RavelloClient.request`."""
+        body = self._encode_entity(entity)
+        if self.response_cache is not None and method == 'GET' and cache:
+            cached = self.response_cache.get(path, body)
+            if cached is not None:
+                return cached
+        headers = headers if headers is not None else []
+        if self.coalesce and method in _coalesced_methods:
+            return await self._single_flight(method, path, body, headers)
+        return await self._request(method, path, body, headers)
+
+    async def _single_flight(self, method, path, body, headers):
+        # See RavelloClient._single_flight(). The followers wait on a future.
+        key = _flight_key(method, path, body, headers)
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.followers += 1
+            self.coalesced += 1
+            # Shielded, so that a cancelled follower does not cancel the
+            # request for everyone.
+            await asyncio.shield(flight.done)
+            if flight.error is not None:
+                raise flight.error
+            return _copy_entity(flight.entity)
+        flight = self._flights[key] = _Flight(asyncio.get_event_loop().create_future())
+        entity = None
+        try:
+            entity = await self._request(method, path, body, headers)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            del self._flights[key]
+            if flight.followers and flight.error is None:
+                flight.entity = _copy_entity(entity)
+            flight.done.set_result(None)
+        return entity
+
+    def _prepare_target(self, rpath):
+        # The request target, quoted like requests does. Cached like URLs.
+        target = self._url_cache.get(rpath)
+        if target is None:
+            target = requote_uri(rpath)
+            if len(self._url_cache) >= self._url_cache_size:
+                self._url_cache.clear()
+            self._url_cache[rpath] = target
+        return target
+
+    async def _send(self, session, method, path, target, abpath, hdict, body, stream):
+        # Send a request on *session*, mapping errors to the exceptions
+        # raised by requests. See RavelloClient._send().
+        breaker = self.circuit_breaker
+        governor = self.governor
+        if governor is not None:
+            await self._acquire_slot(governor)
+        try:
+            probe = breaker.allow() if breaker is not None else False
+        except Exception:
+            if governor is not None:
+                governor.release(None)
+            raise
+        if self.on_request:
+            self._call_hooks(self.on_request, method, path)
+        tracer = self.tracer
+        if tracer is not None:
+            span = tracer.start('{0} {1}'.format(method, _path_template(path)), path=path)
+        sent = _monotonic()
+        congested = failed = False
+        status = error = None
+        received = 0
+        # Whether the request has an outcome for the breaker. It has none
+        # when the coroutine is cancelled.
+        outcome = False
+        try:
+            try:
+                response = await asyncio.wait_for(
+                        session.request(method, target, hdict, body, stream), self.timeout)
+            except asyncio.TimeoutError:
+                congested = failed = outcome = True
+                raise requests.exceptions.Timeout('request timed out: {0}'.format(abpath))
+            except (OSError, EOFError) as e:
+                failed = outcome = True
+                raise requests.exceptions.ConnectionError(str(e))
+            outcome = True
+            status, reason, rheaders, content = response
+            congested = status in ConcurrencyGovernor.congestion_statuses
+            failed = status in CircuitBreaker.failure_statuses
+            if isinstance(content, _Body):
+                received = int(rheaders.get('Content-Length') or 0)
+            else:
+                received = len(content)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = _monotonic() - sent
+            if governor is not None:
+                governor.release(elapsed, congested)
+            if breaker is not None:
+                if outcome:
+                    breaker.record(failed, probe)
+                else:
+                    breaker.cancel(probe)
+            if self.on_response:
+                self._call_hooks(self.on_response, method, path, status, elapsed,
+                                 len(body), received, error)
+            if tracer is not None:
+                span.attributes.update(status=status, bytes_sent=len(body),
+                                       bytes_received=received)
+                tracer.finish(span, error)
+
+    async def _acquire_slot(self, governor):
+        # Wait until the governor allows another request in flight.
+        loop = asyncio.get_event_loop()
+        while True:
+            waiter = _SlotWaiter(loop)
+            if governor.try_acquire(waiter):
+                return
+            try:
+                await waiter.future
+            except BaseException:
+                # Cancelled: do not leave a dead waiter with the governor.
+                governor.cancel(waiter)
+                raise
+
+    async def _request(self, method, path, body=b'', headers=None, session=None, stream=False):
+        # Like RavelloClient._request(), but returns the entity. If *stream*
+        # is set, the unread _Body of a successful JSON response is returned
+        # instead, and the caller must read or close it.
+        rpath, abpath, hdict = self._build_request(path, body, headers)
+        target = self._prepare_target(rpath)
+        validators, hdict = self._conditional(method, path, hdict, stream)
+        login_session = session
+        policy = self.retry_policy
+        debug = self._logger.isEnabledFor(logging.DEBUG)
+        start_time = time.time()
+        attempt = 0
+        while True:
+            generation = self._generation
+            session = login_session or self._connection
+            if session is None and self._autologin \
+                    and (self.have_credentials or self.have_eph_access_token):
+                await self._login(generation)
+                generation = self._generation
+                session = self._connection
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve(method, path)
+                if wait:
+                    if debug:
+                        self._logger.debug('rate limited, waiting {0:.2f} seconds'.format(wait))
+                    await asyncio.sleep(wait)
+            try:
+                if debug:
+                    self._logger.debug('request: {0} {1}'.format(method, rpath))
+                status, reason, rheaders, content = await self._send(
+                        session, method, path, target, abpath, hdict, body, stream)
+                ctype = rheaders.get('Content-Type')
+                if isinstance(content, _Body):
+                    if ctype == 'application/json':
+                        if debug:
+                            self._logger.debug('response: {0} ({1}), streaming'
+                                               .format(status, ctype))
+                        return content
+                    content = await self._read_body(content)
+                if validators is not None and status == 304:
+                    if debug:
+                        self._logger.debug('response: 304, using cached entity')
+                    return self.validator_cache.hit(path, validators)
+                entity = self._parse_entity(ctype, content)
+                if debug:
+                    self._logger.debug('response: {0} ({1})'.format(status, ctype))
+            except policy.exceptions as e:
+                if debug:
+                    self._logger.debug('error: {0!s}'.format(e))
+                if not policy.retry_exception(method, e):
+                    if debug:
+                        self._logger.debug('not retrying {0} request'.format(method))
+                    raise
+                delay = policy.delay(attempt, time.time() - start_time)
+                if delay is None:
+                    raise RavelloError('maximum number of retries reached')
+                self._retrying(method, path, attempt, delay, e, debug)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if policy.retry_status(method, status):
+                delay = policy.delay(attempt, time.time() - start_time, rheaders)
+                if delay is not None:
+                    self._retrying(method, path, attempt, delay, status, debug)
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+            entity = self._check_response(method, path, status, reason, rheaders, entity,
+                                          login_session is None)
+            if entity is _RELOGIN:
+                if attempt >= policy.retries:
+                    raise RavelloError('maximum number of retries reached')
+                self._retrying(method, path, attempt, 0, status, debug)
+                await self._login(generation)
+                attempt += 1
+                continue
+            if not stream:
+                self._update_caches(method, path, body, status, rheaders, entity, len(content))
+            return entity
+
+    async def _read_body(self, body, whole=True):
+        # Read the whole body, or the next chunk of it, mapping errors to the
+        # exceptions raised by requests.
+        try:
+            read = body.read() if whole else body.read_chunk()
+            return await asyncio.wait_for(read, self.timeout)
+        except asyncio.TimeoutError:
+            body.close()
+            raise requests.exceptions.Timeout('timed out reading response')
+        except (OSError, EOFError) as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+    async def reload(self, obj):
+        """Reload the object *obj*. See :meth:`RavelloClient.reload`."""
+        href = obj.get('_href')
+        if href is None:
+            raise RuntimeError('obj must have an "_href" key')
+        return await self.request('GET', href, cache=False)
+
+    @property
+    def poller(self):
+        """Not available: a :class:`~ravello_sdk.Poller` makes blocking
+        calls from a thread. Use :meth:`wait_for` instead."""
+        raise TypeError('AsyncRavelloClient has no poller, use wait_for() instead')
+
+    async def wait_for(self, obj, cond, timeout=None):
+        """Wait for a condition on *obj* to become true. See
+        :meth:`RavelloClient.wait_for`, which also returns the reloaded
+        object.
+
+        Other coroutines keep running while waiting. The object is reloaded
+        every 5 seconds, since there is no :attr:`poller`.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        match = compile_filter(cond)
+        end_time = time.time() + timeout
+        while end_time > time.time():
+            obj = await self.reload(obj)
+            if match(obj):
+                return obj
+            await asyncio.sleep(min(5, max(0, end_time - time.time())))
+        raise RavelloError('timeout waiting for condition')
+
+    async def batch(self, calls, max_workers=None, progress=None):
+        """Run many API calls concurrently. See :meth:`RavelloClient.batch`.
+
+        The calls run as coroutines on the current event loop, at most
+        *max_workers* at the same time.
+        """
+        calls = list(calls)
+        results = [None] * len(calls)
+        slots = asyncio.Semaphore(max_workers or self._batch_workers())
+        done = 0
+        async def run(index, call):
+            nonlocal done
+            method, args, kwargs = _split_call(call)
+            async with slots:
+                try:
+                    value = await getattr(self, method)(*args, **kwargs)
+                except Exception as e:
+                    self._logger.debug('batch: {0}() failed: {1!s}'.format(method, e))
+                    results[index] = BatchResult(call, None, e)
+                else:
+                    results[index] = BatchResult(call, value, None)
+            done += 1
+            if progress is not None:
+                progress(done, len(calls))
+        await asyncio.gather(*[run(index, call) for index, call in enumerate(calls)])
+        return results
+
+    async def map(self, method, args, max_workers=None, progress=None):
+        """Call *method* once for every element of *args*, concurrently.
+        See :meth:`RavelloClient.map`."""
+        calls = [(method, arg if isinstance(arg, tuple) else (arg,)) for arg in args]
+        return await self.batch(calls, max_workers, progress)
+
+    async def _list(self, path, filter=None):
+        method, rpath, criteria = self._list_request(path, filter)
+        try:
+            objs = await self.request(method, rpath, criteria)
+        except requests.HTTPError as e:
+            if rpath == path or not _filter_rejected(e):
+                raise
+            objs = None
+        if rpath != path:
+            if objs is None:
+                self._unfiltered_paths.add(path)
+                return await self._list(path, filter)
+            self._annotate_list(path, objs)
+        if filter is not None:
+            objs = _match_filter(objs, filter)
+        if self.compact and objs:
+            objs = [Record(obj, path) for obj in objs]
+        return objs
+
+    def _iter(self, path, filter=None):
+        return _ListIterator(self, path, filter)
+
+    async def get_application_by_name(self, app_name, aspect=None, lazy=False):
+        """Return the application named *app_name*. See
+        :meth:`RavelloClient.get_application_by_name`. Lazy applications are
+        not supported."""
+        if lazy:
+            raise TypeError('AsyncRavelloClient does not support lazy applications')
+        criteria = _compile_criteria({'name': app_name})
+        apps = await self.request('POST', '/applications/filter', criteria)
+        if len(apps) == 0:
+            raise RavelloError('app "{0}" not found'.format(app_name))
+        if len(apps) > 1:
+            raise RavelloError('multiple apps for name "{0}" found'.format(app_name))
+        self._annotate_list('/applications', apps)
+        app = apps[0]
+        if aspect != 'properties':
+            app = await self.get_application(app, aspect)
+        return app
+
+
+class _ListIterator(object):
+    """An asynchronous iterator over the list of objects at *path*. See
+    :meth:`RavelloClient._iter`.
+
+    An iterator that is not run to the end should be closed with
+    :meth:`aclose`, to release its connection.
+    """
+
+    def __init__(self, client, path, filter):
+        self._client = client
+        self._path = path
+        self._filter = compile_filter(filter) if filter is not None else None
+        self._body = None
+        self._parser = None
+        self._elements = collections.deque()
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            while self._elements:
+                elem = self._elements.popleft()
+                if self._filter is None or self._filter(elem):
+                    return Record(elem, self._path) if self._client.compact else elem
+            if self._done:
+                raise StopAsyncIteration
+            if self._parser is None:
+                await self._start()
+                continue
+            chunk = await self._client._read_body(self._body, False)
+            for elem in self._parser.feed(chunk, not chunk):
+                if not self._client.compact:
+                    self._client._annotate_element(self._path, elem)
+                self._elements.append(elem)
+            self._done = not chunk
+
+    async def _start(self):
+        client = self._client
+        method, rpath, criteria = client._list_request(self._path, self._filter)
+        try:
+            entity = await client._request(method, rpath, client._encode_entity(criteria),
+                                           stream=True)
+        except requests.HTTPError as e:
+            if rpath == self._path or not _filter_rejected(e):
+                raise
+            entity = None
+        self._parser = _JSONArrayParser(client.codec)
+        if rpath != self._path and entity is None:
+            client._unfiltered_paths.add(self._path)
+            return await self._start()
+        if isinstance(entity, _Body):
+            self._body = entity
+        else:
+            if rpath != self._path:
+                client._annotate_list(self._path, entity)
+            self._elements.extend(entity or [])
+            self._done = True
+
+    async def aclose(self):
+        """Stop the iteration and release the connection."""
+        self._done = True
+        self._elements.clear()
+        if self._body is not None:
+            self._body.close()
+
+
+def _mirror_mapped_methods(cls):
+    """Add a coroutine to *cls* for every mapped method of
+    :class:`RavelloClient` that *cls* does not define itself."""
+    for name, func in vars(RavelloClient).items():
+        if name.startswith('_') or name in vars(cls) or name in cls._sync_methods:
+            continue
+        if inspect.isfunction(func) and name.startswith('iter_'):
+            setattr(cls, name, _mirror_iter(func))
+        elif inspect.isfunction(func):
+            setattr(cls, name, _mirror(func))
+
+_mirror_mapped_methods(AsyncRavelloClient)
+
+
+def _traced_coroutine(func):
+    """Run the coroutine method *func* in a span when the client has a
+    tracer. See :func:`ravello_sdk._traced`."""
+    name = func.__name__
+    @functools.wraps(func)
+    async def method(self, *args, **kwargs):
+        tracer = self.tracer
+        if tracer is None:
+            return await func(self, *args, **kwargs)
+        with tracer.span(name):
+            return await func(self, *args, **kwargs)
+    return method
+
+
+def _trace_coroutines(cls):
+    """Wrap the public coroutine methods of *cls* with :func:`_traced_coroutine`."""
+    for name, func in list(vars(cls).items()):
+        if name.startswith('_') or name in _untraced_methods:
+            continue
+        if asyncio.iscoroutinefunction(func):
+            setattr(cls, name, _traced_coroutine(func))
+
+_trace_coroutines(AsyncRavelloClient)
@@ -19,12 +19,13 @@ import re
 import sys
 import logging
 import socket
+import functools
 import six
 
 from getpass import getpass
 from six.moves import reduce
 
-from ravello_sdk import RavelloClient, RavelloError
+from ravello_sdk import RavelloClient, RavelloError, Tracer, JSONFileExporter
 
 
 common_options = """\
@@ -34,6 +35,7 @@ Common options:
                     Ravello API username ($RAVELLO_USERNAME)
   -p <password>, --password <password>
                     Ravello API password ($RAVELLO_PASSWORD)
+  --trace <file>    Append a trace of the API calls to <file>, as JSON lines.
 """
 
 def parse_common_arguments(args):
@@ -52,6 +54,7 @@ def parse_common_arguments(args):
         if password is None and not sys.stdin.isatty():
             raise ValueError('missing -p/--password or $RAVELLO_PASSWORD')
     values['password'] = password
+    values['trace'] = args.get('--trace')
     return values
 
 
@@ -271,9 +274,24 @@ def setup_logger(debug):
 
 # API methods
 
+def traced(func):
+    """Run the helper *func*, which takes the client as its first argument,
+    in a span when the client has a tracer."""
+    name = 'cli.{0}'.format(func.__name__)
+    @functools.wraps(func)
+    def helper(client, *args, **kwargs):
+        if client.tracer is None:
+            return func(client, *args, **kwargs)
+        with client.tracer.span(name):
+            return func(client, *args, **kwargs)
+    return helper
+
+
 def create_client(args):
     """Connect to the Ravello API and return a connection."""
     client = RavelloClient()
+    if args.get('trace'):
+        client.tracer = Tracer(JSONFileExporter(args['trace']))
     if args['password'] is None:
         args['password'] = getpass('Enter password for {0}: '.format(args['username']))
     client.connect()
@@ -284,6 +302,7 @@ def create_client(args):
     return client
 
 
+@traced
 def get_image(client, name_or_id):
     """Load an image by name or ID."""
     if name_or_id.isdigit():
@@ -294,6 +313,7 @@ def get_image(client, name_or_id):
     return client.reload(images[0])
 
 
+@traced
 def get_diskimage(client, name_or_id):
     """Load a disk image by name or ID."""
     if name_or_id.isdigit():
@@ -304,6 +324,7 @@ def get_diskimage(client, name_or_id):
     return client.reload(images[0])
 
 
+@traced
 def get_application(client, name_or_id):
     """Load an application by name or ID."""
     if name_or_id.isdigit():
@@ -314,6 +335,7 @@ def get_application(client, name_or_id):
     return client.reload(applications[0])
 
 
+@traced
 def get_keypair(client, name_or_id):
     """Load a keypair by name or ID."""
     if name_or_id.isdigit():
@@ -13,29 +13,84 @@
 # limitations under the License.
 from __future__ import absolute_import, print_function
 
+import os
 import sys
 import base64
+import hashlib
 import socket
 import logging
 import time
+import re
 import json
+import zlib
 import random
+import codecs
+import bisect
+import inspect
+import functools
+import threading
+import contextlib
 import requests
 import urllib
 
+from email.utils import parsedate_tz, mktime_tz
+from concurrent.futures import Future
+from collections import namedtuple, OrderedDict, deque
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
 # Python 2.x / 3.x module name differences
 try:
     from urllib import parse as urlparse
 except ImportError:
     import urlparse
 
+try:
+    from urllib.request import getproxies
+except ImportError:
+    from urllib import getproxies
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+# Faster JSON libraries are used when they are installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
 pyver = sys.version_info[:2]
-if pyver not in [(2, 6), (2, 7)] and pyver < (3, 3):
-    raise ImportError('Python 2.6, 2.7 or 3.3+ is required')
+if pyver != (2, 7) and pyver < (3, 3):
+    raise ImportError('Python 2.7 or 3.3+ is required')
 
 
 __all__ = ['random_luid', 'update_luids', 'application_state', 'new_name',
-           'RavelloError', 'RavelloClient']
+           'RavelloError', 'RavelloClient', 'BatchResult', 'RetryPolicy',
+           'JSONCodec', 'OrjsonCodec', 'UjsonCodec', 'get_codec', 'ValidatorCache',
+           'ResponseCache', 'TokenBucket', 'RateLimiter', 'ConcurrencyGovernor',
+           'CircuitBreaker', 'CircuitOpenError', 'StatsCollector',
+           'Tracer', 'Span', 'InMemoryExporter', 'JSONFileExporter', 'Record',
+           'Application', 'In', 'Contains', 'Range', 'And', 'Or', 'Not',
+           'compile_filter', 'CompiledFilter', 'Inventory',
+           'LocalStore', 'SessionStore', 'ClientPool',
+           'Poller', 'ChangeFeed']
 
 http_methods = {'POST': requests.post, 'GET': requests.get, 'PUT': requests.put, 'DELETE': requests.delete}
 DEFAULT_HTTPS_PORT = 443
@@ -108,7 +163,7 @@ def new_name(existing, prefix):
     """
     names = set()
     for name in existing:
-        if isinstance(name, dict):
+        if isinstance(name, _objects):
             names.add(name['name'])
         else:
             names.add(name)
@@ -138,40 +193,1916 @@ def urlsplit2(url, default_scheme='http'):
     return result
 
 
+# Identical requests with these methods are coalesced while in flight.
+_coalesced_methods = ('GET', 'HEAD')
+
+
+def _digest(secret):
+    """Return a hex digest of the string *secret*, to tell secrets apart
+    without keeping them."""
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()
+
+
 def _idempotent(method):
     """Return whether *method* is idempotent."""
     return method in ('GET', 'HEAD', 'PUT')
 
 
-def _match_filter(obj, flt):
-    """Match the object *obj* with filter *flt*."""
+def _raise_for_status(status, reason, url, response=None):
+    """Raise a :class:`requests.HTTPError` if *status* is a 4xx or 5xx
+    status, like :meth:`requests.Response.raise_for_status` does."""
+    if 400 <= status < 500:
+        kind = 'Client'
+    elif 500 <= status < 600:
+        kind = 'Server'
+    else:
+        return
+    msg = '{0} {1} Error: {2} for url: {3}'.format(status, kind, reason, url)
+    error = requests.HTTPError(msg, response=response)
+    error.status = status
+    raise error
+
+
+def _filter_rejected(error):
+    """Return whether the API rejected a filter call with *error*, e.g.
+    because it does not support the criteria or the call. The list is then
+    filtered locally instead."""
+    status = getattr(error, 'status', None)
+    return status is not None and 400 <= status < 500 and status not in (401, 429)
+
 
+# Returned by RavelloClient._check_response() when the session has expired.
+_RELOGIN = object()
+
+# The entity of a response whose body is left unread for the caller to stream.
+_STREAM = object()
+
+
+class _JSONArrayParser(object):
+    """Incremental parser for a JSON array.
+
+    The encoded array is fed in chunks of bytes with :meth:`feed`, which
+    returns the elements that were completed by the chunk. Only the elements
+    that are not complete yet are kept in memory.
+
+    The bytes are only scanned for the boundaries of the elements, once, and
+    the scan resumes where it stopped when an element spans chunks. Each
+    element is then decoded as a whole with *codec*, which defaults to a
+    :class:`JSONCodec`.
+    """
+
+    _whitespace = re.compile(br'[ \t\n\r]*')
+    _scalar = re.compile(br'[^ \t\n\r,\]]*')
+    # The bytes that change the nesting, outside and inside a string. The
+    # bytes of multi-byte UTF-8 sequences never match these.
+    _structural = re.compile(br'[][{}"]')
+    _quoted = re.compile(br'["\\]')
+
+    # Parser states: before the "[", before the first element or the "]",
+    # before an element, inside an element, after an element, and after the
+    # "]".
+    _start, _first, _element, _inside, _next, _end = range(6)
+
+    def __init__(self, codec=None):
+        self.codec = codec if codec is not None else JSONCodec()
+        self._buffer = bytearray()
+        self._state = self._start
+        # Where the scan of the current element resumes, and its nesting.
+        self._scan = 0
+        self._depth = 0
+        self._in_string = False
+
+    def _find_end(self, buf):
+        # Continue scanning the element at the start of *buf*, and return
+        # the offset just after it, or None if it is not complete yet.
+        pos = self._scan
+        while True:
+            if self._in_string:
+                match = self._quoted.search(buf, pos)
+                if match is None:
+                    self._scan = len(buf)
+                    return
+                if match.group() == b'\\':
+                    if match.end() == len(buf):
+                        # Look at the escaped byte in the next chunk.
+                        self._scan = match.start()
+                        return
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+            else:
+                match = self._structural.search(buf, pos)
+                if match is None:
+                    self._scan = len(buf)
+                    return
+                char = match.group()
+                if char == b'"':
+                    self._in_string = True
+                elif char in (b'[', b'{'):
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+            pos = match.end()
+            if self._depth == 0 and not self._in_string:
+                return pos
+
+    def feed(self, data, final=False):
+        """Parse the chunk *data*, and return a list with the elements it
+        completed. The *final* argument must be set for the last chunk."""
+        buf = self._buffer
+        buf += data
+        pos = 0
+        elements = []
+        while True:
+            if self._state != self._inside:
+                pos = self._whitespace.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            char = buf[pos:pos+1]
+            if self._state == self._start:
+                if char != b'[':
+                    raise ValueError('expecting a JSON array')
+                self._state = self._first
+                pos += 1
+            elif self._state == self._next:
+                if char == b',':
+                    self._state = self._element
+                elif char == b']':
+                    self._state = self._end
+                else:
+                    raise ValueError('expecting "," or "]"')
+                pos += 1
+            elif self._state == self._first and char == b']':
+                self._state = self._end
+                pos += 1
+            elif self._state == self._end:
+                raise ValueError('extra data after JSON array')
+            elif self._state == self._inside or char in (b'[', b'{', b'"'):
+                # Keep the start of the element at the start of the buffer,
+                # so that the scan offset stays valid across chunks.
+                del buf[:pos]
+                pos = 0
+                if self._state != self._inside:
+                    self._state = self._inside
+                    self._scan = 0
+                end = self._find_end(buf)
+                if end is None:
+                    break
+                elements.append(self.codec.decode(bytes(buf[:end])))
+                self._state = self._next
+                pos = end
+            else:
+                # A number or literal at the end of the chunk may continue in
+                # the next one.
+                end = self._scalar.match(buf, pos).end()
+                if end == len(buf) and not final:
+                    break
+                elements.append(self.codec.decode(bytes(buf[pos:end])))
+                self._state = self._next
+                pos = end
+        if final and self._state != self._end:
+            raise ValueError('truncated JSON array')
+        del buf[:pos]
+        return elements
+
+
+def _match_filter(obj, flt):
+    """Match the object *obj* with filter *flt*, or return the objects
+    that match if *obj* is a list. See :func:`compile_filter`."""
+    match = compile_filter(flt)
     if isinstance(obj, list):
-        return [ob for ob in obj if _match_filter(ob, flt)]
+        return match.select(obj)
+    return match(obj)
+
+
+class And(object):
+    """A filter that matches if all of *filters* match."""
+
+    def __init__(self, *filters):
+        self.filters = filters
+
+    def __repr__(self):
+        return 'And{0!r}'.format(self.filters)
+
+
+class Or(object):
+    """A filter that matches if any of *filters* matches."""
+
+    def __init__(self, *filters):
+        self.filters = filters
+
+    def __repr__(self):
+        return 'Or{0!r}'.format(self.filters)
+
+
+class Not(object):
+    """A filter that matches if *filter* does not match."""
+
+    def __init__(self, filter):
+        self.filter = filter
+
+    def __repr__(self):
+        return 'Not({0!r})'.format(self.filter)
 
-    if callable(flt):
-        return flt(obj)
-    elif not isinstance(flt, dict):
-        raise TypeError('expecting a callable or a dict')
 
-    for fkey, fval in flt.items():
-        obval = obj.get(fkey)
-        if obval is None:
+class CompiledFilter(object):
+    """A filter compiled by :func:`compile_filter`. Call it with an object
+    to match it, or use :meth:`select` to match a list of objects."""
+
+    __slots__ = ('spec', 'match')
+
+    def __init__(self, spec, match):
+        self.spec = spec
+        self.match = match
+
+    def __call__(self, obj):
+        return self.match(obj)
+
+    def select(self, objs):
+        """Return a list with the objects in *objs* that match."""
+        match = self.match
+        return [obj for obj in objs if match(obj)]
+
+    def __repr__(self):
+        return 'CompiledFilter({0!r})'.format(self.spec)
+
+
+def _never(value):
+    return False
+
+
+def _compile_compound(spec, compile):
+    """Compile the :class:`And`, :class:`Or` or :class:`Not` filter *spec*,
+    with *compile* for its operands."""
+    if isinstance(spec, Not):
+        pred = compile(spec.filter)
+        return lambda value: not pred(value)
+    preds = tuple(compile(operand) for operand in spec.filters)
+    if isinstance(spec, And):
+        def match(value):
+            for pred in preds:
+                if not pred(value):
+                    return False
+            return True
+    else:
+        def match(value):
+            for pred in preds:
+                if pred(value):
+                    return True
+            return False
+    return match
+
+
+def _compile_value(spec):
+    """Return a predicate for a value in an object, for the filter value
+    *spec*."""
+    if isinstance(spec, dict):
+        return _compile_dict(spec, True)
+    elif isinstance(spec, (And, Or, Not)):
+        return _compile_compound(spec, _compile_value)
+    elif isinstance(spec, In):
+        try:
+            values = frozenset(spec.values)
+        except TypeError:
+            return spec
+        def member(value):
+            try:
+                return value in values
+            except TypeError:
+                return False
+        return member
+    elif isinstance(spec, CompiledFilter):
+        return spec.match
+    elif callable(spec):
+        return spec
+    return lambda value: value == spec
+
+
+# Upper bound on the number of record shapes for which the positions of
+# the keys of a dict filter are kept.
+_plans_size = 64
+
+
+def _compile_dict(spec, nested):
+    """Return a predicate for the dict filter *spec*. If *nested* is set,
+    the object must be a dict or a record."""
+    equals = []
+    checks = []
+    for key, value in spec.items():
+        if value is None:
+            return _never
+        elif isinstance(value, _scalar_types):
+            equals.append((key, value))
+        else:
+            checks.append((key, _compile_value(value)))
+    equals = tuple(equals)
+    checks = tuple(checks)
+    # The positions of the keys in a record only depend on its shape, so
+    # they are looked up once per shape. The values are then read from the
+    # record's tuple directly.
+    plans = {}
+    use_plans = '_href' not in spec
+    def plan(shape):
+        index = shape.index
+        if any(key not in index for key, expected in equals) or \
+                any(key not in index for key, pred in checks):
+            return None
+        return (tuple((index[key], expected) for key, expected in equals),
+                tuple((index[key], pred) for key, pred in checks))
+    def match(obj):
+        cls = type(obj)
+        if cls is Record and use_plans:
+            positions = plans.get(obj._shape, False)
+            if positions is False:
+                if len(plans) >= _plans_size:
+                    plans.clear()
+                positions = plans[obj._shape] = plan(obj._shape)
+            if positions is None:
+                return False
+            values = obj._values
+            for pos, expected in positions[0]:
+                if values[pos] != expected:
+                    return False
+            for pos, pred in positions[1]:
+                value = values[pos]
+                if value is None or not pred(value):
+                    return False
+            return True
+        if nested and cls is not dict and not isinstance(obj, _objects):
             return False
-        elif isinstance(fval, dict):
-            if not isinstance(obval, dict) or not _match_filter(obval, fval):
+        get = obj.get
+        for key, expected in equals:
+            if get(key) != expected:
+                return False
+        for key, pred in checks:
+            value = get(key)
+            if value is None or not pred(value):
                 return False
-        elif callable(fval):
-            return fval(obval)
-        elif fval != obval:
+        return True
+    return match
+
+
+def compile_filter(flt):
+    """Compile the filter *flt* into a reusable :class:`CompiledFilter`.
+
+    A filter is a dict or a callable. A callable is called with the object
+    and must return whether it matches. A dict matches an object if every
+    key of the dict matches the value for that key in the object, and a
+    missing or None value never matches. A filter value matches if it is:
+
+    * a dict, and the value is an object that matches it, recursively;
+    * a callable, like :class:`In`, :class:`Contains` or :class:`Range`,
+      that returns True when called with the value;
+    * equal to the value.
+
+    The :class:`And`, :class:`Or` and :class:`Not` operators combine
+    filters, and filter values. For example, ``Or({'name': 'web'},
+    {'owner': Not('admin')})``.
+
+    The filter is interpreted once, so a compiled filter is faster than
+    matching with the original filter when it is used more than once.
+    Records from a client in compact mode are matched on the positions of
+    the values in their tuples.
+    """
+    if isinstance(flt, CompiledFilter):
+        return flt
+    elif isinstance(flt, dict):
+        match = _compile_dict(flt, False)
+    elif isinstance(flt, (And, Or, Not)):
+        match = _compile_compound(flt, lambda operand: compile_filter(operand).match)
+    elif callable(flt):
+        match = flt
+    else:
+        raise TypeError('expecting a callable or a dict')
+    return CompiledFilter(flt, match)
+
+
+class In(object):
+    """A filter value that matches if the value is one of *values*, e.g.
+    ``{'state': In('STARTED', 'STARTING')}``."""
+
+    def __init__(self, *values):
+        self.values = values
+
+    def __call__(self, value):
+        return value in self.values
+
+    def __repr__(self):
+        return 'In{0!r}'.format(self.values)
+
+
+class Contains(object):
+    """A filter value that matches if the value contains *item*: a
+    substring of a string, or an element of a list."""
+
+    def __init__(self, item):
+        self.item = item
+
+    def __call__(self, value):
+        try:
+            return self.item in value
+        except TypeError:
+            return False
+
+    def __repr__(self):
+        return 'Contains({0!r})'.format(self.item)
+
+
+class Range(object):
+    """A filter value that matches if the value is between *low* and *high*,
+    inclusive. Either bound may be None."""
+
+    def __init__(self, low=None, high=None):
+        self.low = low
+        self.high = high
+
+    def __call__(self, value):
+        try:
+            return (self.low is None or value >= self.low) and \
+                    (self.high is None or value <= self.high)
+        except TypeError:
             return False
-    return True
+
+    def __repr__(self):
+        return 'Range({0!r}, {1!r})'.format(self.low, self.high)
+
+
+# Filter values of these types can be compared by the API.
+_string_types = (str, type(u''))
+_scalar_types = _string_types + (int, float, type(2 ** 64))
+
+
+def _simple_criterion(name, operator, operand):
+    return {'type': 'SIMPLE', 'operator': operator, 'propertyName': name, 'operand': operand}
+
+
+def _complex_criterion(operator, criteria):
+    return {'type': 'COMPLEX', 'operator': operator, 'criteria': criteria}
+
+
+def _server_criteria(flt, prefix=''):
+    """Return the list of criteria for the keys of the dict filter *flt*
+    that the API can evaluate. Nested keys are joined with a dot."""
+    criteria = []
+    for key, value in flt.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            criteria.extend(_server_criteria(value, name + '.'))
+        elif isinstance(value, In):
+            if value.values and all(isinstance(item, _scalar_types) for item in value.values):
+                criteria.append(_complex_criterion('Or', [_simple_criterion(name, 'Equals', item)
+                                                          for item in value.values]))
+        elif isinstance(value, Contains):
+            if isinstance(value.item, _string_types):
+                criteria.append(_simple_criterion(name, 'Contains', value.item))
+        elif isinstance(value, Range):
+            if isinstance(value.low, _scalar_types):
+                criteria.append(_simple_criterion(name, 'GreaterThanOrEquals', value.low))
+            if isinstance(value.high, _scalar_types):
+                criteria.append(_simple_criterion(name, 'LessThanOrEquals', value.high))
+        elif isinstance(value, _scalar_types):
+            criteria.append(_simple_criterion(name, 'Equals', value))
+    return criteria
+
+
+def _compile_criteria(flt):
+    """Compile the filter *flt* into criteria for a "filter" call, or return
+    None if the API cannot evaluate any part of it.
+
+    Equality with strings, numbers and booleans, nested keys, the
+    :class:`In`, :class:`Contains` and :class:`Range` operators, and the
+    dicts in an :class:`And` filter are compiled. Other parts, like
+    callables and :class:`Or` filters, are left out, so the result of a
+    filter call must still be filtered locally with the full filter.
+    """
+    if isinstance(flt, CompiledFilter):
+        flt = flt.spec
+    if isinstance(flt, And):
+        criteria = [criterion for operand in flt.filters if isinstance(operand, dict)
+                    for criterion in _server_criteria(operand)]
+    elif isinstance(flt, dict):
+        criteria = _server_criteria(flt)
+    else:
+        return None
+    return _complex_criterion('And', criteria) if criteria else None
 
 
 class RavelloError(Exception):
     """Exception used by :class:`RavelloClient`."""
 
 
+class CircuitOpenError(RavelloError):
+    """Raised instead of sending a request while the circuit breaker of the
+    client is open. See :class:`CircuitBreaker`."""
+
+
+class BatchResult(namedtuple('BatchResult', ('call', 'result', 'error'))):
+    """The outcome of one call in :meth:`RavelloClient.batch`.
+
+    The *call* attribute is the call as it was passed in, *result* is its
+    return value, and *error* is the exception it raised, or None if it
+    succeeded.
+    """
+
+    __slots__ = ()
+
+
+class JSONCodec(object):
+    """Encode and decode request and response bodies with the standard
+    library :mod:`json` module.
+
+    A codec has an :meth:`encode` method that turns an entity into the UTF-8
+    encoded bytes of a request body, and a :meth:`decode` method that parses
+    the bytes of a response body. Codecs are stateless and may be shared.
+    """
+
+    name = 'json'
+
+    def encode(self, entity):
+        """Return *entity* encoded as JSON in UTF-8 bytes."""
+        return json.dumps(entity).encode('utf-8')
+
+    def decode(self, content):
+        """Parse the UTF-8 encoded JSON bytes *content*."""
+        return json.loads(content.decode('utf-8'))
+
+
+class OrjsonCodec(JSONCodec):
+    """A codec using :mod:`orjson`, which encodes to and decodes from bytes
+    directly."""
+
+    name = 'orjson'
+
+    def encode(self, entity):
+        return orjson.dumps(entity, option=orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, content):
+        return orjson.loads(content)
+
+
+class UjsonCodec(JSONCodec):
+    """A codec using :mod:`ujson`."""
+
+    name = 'ujson'
+
+    def encode(self, entity):
+        return ujson.dumps(entity, ensure_ascii=False,
+                           escape_forward_slashes=False).encode('utf-8')
+
+    def decode(self, content):
+        return ujson.loads(content)
+
+
+# The codecs and their libraries, fastest first.
+_codecs = [(OrjsonCodec, orjson), (UjsonCodec, ujson), (JSONCodec, json)]
+
+
+def get_codec(name=None):
+    """Return the codec called *name* ("orjson", "ujson" or "json").
+
+    If *name* is not given, return the fastest codec whose library is
+    installed. A :class:`RavelloError` is raised if the library of the
+    requested codec is not installed.
+    """
+    for cls, module in _codecs:
+        if name is None and module is not None:
+            return cls()
+        elif name == cls.name:
+            if module is None:
+                raise RavelloError('codec {0!r} is not available'.format(name))
+            return cls()
+    raise RavelloError('unknown codec: {0!r}'.format(name))
+
+
+class RetryPolicy(object):
+    """When and how long to wait before retrying a failed request.
+
+    A request is retried when its response status is in *statuses*, or when
+    sending it raised one of *exceptions*. Statuses other than 429 (Too Many
+    Requests) and all exceptions are only retried for idempotent methods,
+    because the server may have acted on the request already. At most
+    *retries* retries are made for a single request.
+
+    The delay before a retry grows exponentially with "full jitter": it is
+    chosen at random between zero and ``backoff * 2 ** attempt``, capped at
+    *max_backoff* seconds. If the response has a ``Retry-After`` header, its
+    value is used as the delay instead. The retries of a single request give
+    up once they would take more than *budget* seconds in total, counted
+    from the first attempt.
+
+    The policy counts the retries it allowed in :attr:`retry_count`, the
+    seconds spent waiting before them in :attr:`backoff_time`, and the
+    requests it gave up on in :attr:`giveup_count`. A policy may be shared by
+    multiple clients, which then share the counters as well.
+    """
+
+    default_statuses = (429, 502, 503, 504)
+    default_exceptions = (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                          ValueError)
+    default_backoff = 0.5
+    default_max_backoff = 30
+    default_budget = 120
+
+    def __init__(self, retries=3, statuses=None, exceptions=None, backoff=None,
+                 max_backoff=None, budget=None):
+        self.retries = retries
+        self.statuses = frozenset(statuses if statuses is not None else self.default_statuses)
+        self.exceptions = tuple(exceptions if exceptions is not None else self.default_exceptions)
+        self.backoff = backoff if backoff is not None else self.default_backoff
+        self.max_backoff = max_backoff if max_backoff is not None else self.default_max_backoff
+        self.budget = budget if budget is not None else self.default_budget
+        self.retry_count = 0
+        self.giveup_count = 0
+        self.backoff_time = 0.0
+        self._lock = threading.Lock()
+
+    def retry_status(self, method, status):
+        """Return whether a *method* request that got *status* may be retried."""
+        if status not in self.statuses:
+            return False
+        return status == 429 or _idempotent(method)
+
+    def retry_exception(self, method, exc):
+        """Return whether a *method* request that raised *exc* may be retried."""
+        return isinstance(exc, self.exceptions) and _idempotent(method)
+
+    def retry_after(self, headers):
+        """Return the delay requested by the ``Retry-After`` header in
+        *headers*, in seconds, or None if there is no such header."""
+        value = headers.get('Retry-After') if headers is not None else None
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(0.0, mktime_tz(parsed) - time.time())
+
+    def delay(self, attempt, elapsed, headers=None):
+        """Return the delay before retry number *attempt* (counting from 0).
+
+        The *elapsed* argument is the time spent on the request so far, and
+        *headers* are the headers of the failed response, if any. Returns
+        None if the request should not be retried anymore.
+        """
+        if attempt >= self.retries:
+            return self._giveup()
+        delay = self.retry_after(headers)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if elapsed + delay > self.budget:
+            return self._giveup()
+        with self._lock:
+            self.retry_count += 1
+            self.backoff_time += delay
+        return delay
+
+    def _giveup(self):
+        with self._lock:
+            self.giveup_count += 1
+        return None
+
+
+def _copy_entity(entity):
+    """Return a deep copy of the parsed JSON entity *entity*."""
+    if isinstance(entity, dict):
+        return dict((key, _copy_entity(value)) for key, value in entity.items())
+    elif isinstance(entity, list):
+        return [_copy_entity(value) for value in entity]
+    elif isinstance(entity, Record):
+        return entity.to_dict()
+    return entity
+
+
+# Python 2 cannot intern unicode strings.
+if pyver >= (3, 0):
+    _intern = sys.intern
+else:
+    _intern = lambda value: value
+
+# Strings up to this length are interned in compact records. Longer ones,
+# like descriptions, are rarely repeated.
+_intern_maxlen = 64
+
+# Field name tuple -> _Shape, shared by all records with the same fields.
+_shapes = {}
+_shapes_size = 1024
+
+
+class _Shape(object):
+    """The field names of a :class:`Record`, and their positions."""
+
+    __slots__ = ('keys', 'index')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = dict((key, pos) for pos, key in enumerate(keys))
+
+
+def _get_shape(keys):
+    """Return the shared shape for the field names *keys*."""
+    shape = _shapes.get(keys)
+    if shape is None:
+        shape = _Shape(tuple(_intern(str(key)) for key in keys))
+        if len(_shapes) < _shapes_size:
+            shape = _shapes.setdefault(keys, shape)
+    return shape
+
+
+def _compact(value):
+    """Return the compact form of a value in a JSON entity: nested objects
+    become records, and short strings are interned. Lists are updated in
+    place."""
+    # This runs for every value in a list response, so it checks the exact
+    # types that a JSON decoder returns, which is faster than isinstance().
+    cls = type(value)
+    if cls is str:
+        return _intern(value) if len(value) <= _intern_maxlen else value
+    elif cls is dict:
+        return Record(value)
+    elif cls is list:
+        value[:] = [_compact(item) for item in value]
+    return value
+
+
+class Record(object):
+    """A compact, read-only object returned by the list calls of a client
+    in compact mode.
+
+    A record stores the values of an object in a tuple, and shares the
+    tuple of its field names with all other records that have the same
+    fields. Nested objects are records as well, and short strings are
+    interned, so repeated values like states and owners are stored once.
+    The ``"_href"`` key of an object in the list at *path* is computed when
+    it is accessed, instead of being stored.
+
+    A record can be used like the dict it replaces: ``rec['name']``,
+    ``rec.get('name')``, ``'name' in rec``, and iteration over its keys all
+    work. Fields are available as attributes as well, e.g. ``rec.name``.
+    Use :meth:`to_dict` to get the full dict, for example to modify and
+    update the object.
+    """
+
+    __slots__ = ('_shape', '_values', '_path')
+
+    def __init__(self, entity, path=None):
+        if '_href' in entity:
+            entity = dict(entity)
+            del entity['_href']
+        self._shape = _get_shape(tuple(entity))
+        self._values = tuple([_compact(value) for value in entity.values()])
+        self._path = _intern(path) if path is not None else None
+
+    def _has_href(self):
+        return self._path is not None and 'id' in self._shape.index
+
+    def _build_href(self):
+        ident = self.get('id')
+        if self._path is None or ident is None:
+            return None
+        return '{0}/{1}'.format(self._path, ident)
+
+    def __getitem__(self, key):
+        pos = self._shape.index.get(key)
+        if pos is not None:
+            return self._values[pos]
+        if key == '_href':
+            href = self._build_href()
+            if href is not None:
+                return href
+        raise KeyError(key)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def get(self, key, default=None):
+        """Return the value of *key*, or *default* if it is not present."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._shape.index or (key == '_href' and self._has_href())
+
+    def keys(self):
+        """Return the field names, including "_href" if the object has an ID."""
+        keys = list(self._shape.keys)
+        if self._has_href():
+            keys.append('_href')
+        return keys
+
+    def values(self):
+        """Return the field values."""
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        """Return the ``(key, value)`` pairs."""
+        return [(key, self[key]) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def to_dict(self):
+        """Return the object as a new dict, including its "_href"."""
+        return dict((key, _copy_entity(value)) for key, value in self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        return isinstance(other, dict) and self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Record({0!r})'.format(self.to_dict())
+
+
+class Application(object):
+    """A lazy view of the application *app*, which is an ID, or a dict with
+    the properties of the application as returned by the "get all" and
+    filter calls.
+
+    The properties aspect of the application is loaded the first time it is
+    needed, unless it was passed in. The design and deployment aspects are
+    loaded separately, the first time they are accessed. Like a dict,
+    ``app['name']`` returns a property and ``app['deployment']`` returns the
+    deployment aspect. The derived views :attr:`vms`, :attr:`state` and
+    :attr:`public_ips` are computed once. Everything is kept until
+    :meth:`reload` is called.
+
+    Use :meth:`RavelloClient.get_application_by_name` with ``lazy=True`` to
+    get an application by name with a single API call. An application
+    object is not thread safe, and cannot be used with
+    :class:`~ravello_async.AsyncRavelloClient`.
+    """
+
+    _aspects = ('design', 'deployment')
+
+    def __init__(self, client, app):
+        self.client = client
+        if isinstance(app, _objects):
+            self.id = app['id']
+            self._initial = app
+        else:
+            self.id = app
+            self._initial = None
+        self.reload()
+
+    def reload(self):
+        """Forget the loaded aspects and derived views. They are loaded
+        again when they are accessed."""
+        self._properties = self._initial
+        self._initial = None
+        self._loaded = {}
+        self._views = {}
+
+    def _load(self, aspect):
+        app = self.client.get_application(self.id, aspect)
+        if app is None:
+            raise RavelloError('application {0} not found'.format(self.id))
+        return app
+
+    @property
+    def properties(self):
+        """The properties of the application."""
+        if self._properties is None:
+            self._properties = self._load('properties')
+        return self._properties
+
+    def _aspect(self, aspect):
+        if aspect not in self._loaded:
+            self._loaded[aspect] = self._load(aspect).get(aspect) or {}
+        return self._loaded[aspect]
+
+    @property
+    def design(self):
+        """The design aspect of the application."""
+        return self._aspect('design')
+
+    @property
+    def deployment(self):
+        """The deployment aspect of the application."""
+        return self._aspect('deployment')
+
+    def _view(self, name, func):
+        if name not in self._views:
+            self._views[name] = func()
+        return self._views[name]
+
+    @property
+    def vms(self):
+        """The deployed VMs of the application."""
+        return self._view('vms', lambda: self.deployment.get('vms', []))
+
+    @property
+    def state(self):
+        """The consolidated state of the application. See
+        :func:`application_state`."""
+        return self._view('state', lambda: application_state(self))
+
+    @property
+    def public_ips(self):
+        """The public IPs of the deployed VMs, as a list of ``(vm name,
+        ip)`` tuples."""
+        def public_ips():
+            ips = []
+            for vm in self.vms:
+                for conn in vm.get('networkConnections', []):
+                    ip = (conn.get('ipConfig') or {}).get('publicIp')
+                    if ip:
+                        ips.append((vm.get('name'), ip))
+            return ips
+        return self._view('public_ips', public_ips)
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+        elif key in self._aspects:
+            return self._aspect(key)
+        return self.properties[key]
+
+    def get(self, key, default=None):
+        """Return the property or aspect *key*, or *default* if the
+        application does not have it."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._aspects or key in self.properties
+
+    def to_dict(self):
+        """Return the application with both aspects as a dict. This loads
+        all aspects that were not loaded yet."""
+        app = _copy_entity(self.properties)
+        for aspect in self._aspects:
+            app[aspect] = _copy_entity(self._aspect(aspect))
+        app['_href'] = '/applications/{0}'.format(self.id)
+        return app
+
+    def __repr__(self):
+        return 'Application({0!r})'.format(self.id)
+
+
+# The types of the objects that the mapped methods accept instead of an ID.
+_objects = (dict, Record, Application)
+
+
+# A clock that does not jump when the system time is changed.
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+class TokenBucket(object):
+    """A token bucket that allows *rate* operations per second on average,
+    with bursts of up to *burst* operations.
+
+    The bucket starts full. It is safe to share between threads. Tokens are
+    taken with :meth:`try_acquire`, which does not wait, with
+    :meth:`acquire`, which waits for the tokens, or with :meth:`reserve`,
+    which takes the tokens in advance and returns how long the caller must
+    wait before using them.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._last = _monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = _monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    @property
+    def tokens(self):
+        """The number of tokens in the bucket. This is negative when tokens
+        have been reserved in advance."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, tokens=1):
+        """Take *tokens* tokens if they are available now, and return whether
+        they were taken."""
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def reserve(self, tokens=1, max_wait=None):
+        """Take *tokens* tokens, and return the number of seconds until they
+        are available. If that is more than *max_wait* seconds, nothing is
+        taken, and None is returned."""
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (tokens - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= tokens
+            return wait
+
+    def release(self, tokens=1):
+        """Give back *tokens* tokens that were taken but not used."""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + tokens)
+
+    def acquire(self, tokens=1, timeout=None):
+        """Wait until *tokens* tokens are available and take them. If that
+        takes longer than *timeout* seconds, return False without waiting,
+        otherwise return True."""
+        wait = self.reserve(tokens, timeout)
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+
+class RateLimiter(object):
+    """Client-side rate limits for the requests of a :class:`RavelloClient`.
+
+    All requests take a token from the global bucket, which allows *rate*
+    requests per second with bursts of *burst*, and from the bucket of their
+    endpoint class. The *limits* map endpoint classes to a rate, or to a
+    ``(rate, burst)`` tuple. Either may be omitted to leave requests
+    unlimited. The endpoint classes are:
+
+    * "action": POST requests that act on an object, such as ``/start``,
+      ``/stop`` and ``/publish``.
+    * "billing": requests for ``/billing``.
+    * "read": other GET and HEAD requests.
+    * "write": all other requests.
+
+    A limiter may be shared by multiple clients, which then share its
+    budgets. The number of requests that had to wait is counted in
+    :attr:`waits`, and the total time they waited in :attr:`wait_time`.
+    """
+
+    _actions = re.compile(r'/(start|stop|restart|shutdown|poweroff|publish|publishUpdates|'
+                          r'redeploy|repair|resetDisks)$')
+
+    def __init__(self, rate=None, burst=None, limits=None):
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.buckets = {}
+        for name, limit in (limits or {}).items():
+            self.buckets[name] = TokenBucket(*limit) if isinstance(limit, tuple) \
+                    else TokenBucket(limit)
+        self.waits = 0
+        self.wait_time = 0.0
+        self._lock = threading.Lock()
+
+    def classify(self, method, path):
+        """Return the endpoint class of a *method* request for *path*."""
+        path = path.split('?', 1)[0]
+        if path.startswith('/billing'):
+            return 'billing'
+        elif method == 'POST' and self._actions.search(path):
+            return 'action'
+        elif method in ('GET', 'HEAD'):
+            return 'read'
+        return 'write'
+
+    def _buckets(self, method, path):
+        buckets = [self.bucket, self.buckets.get(self.classify(method, path))]
+        return [bucket for bucket in buckets if bucket is not None]
+
+    def reserve(self, method, path):
+        """Take the tokens for a *method* request for *path*, and return the
+        number of seconds to wait before sending it."""
+        wait = self._take(self._buckets(method, path), None)
+        if wait:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += wait
+        return wait
+
+    def try_acquire(self, method, path):
+        """Take the tokens for a *method* request for *path* if they are all
+        available now, and return whether they were taken."""
+        return self._take(self._buckets(method, path), 0) is not None
+
+    def acquire(self, method, path, timeout=None):
+        """Wait until a *method* request for *path* may be sent. If that
+        takes longer than *timeout* seconds, return False without waiting,
+        otherwise return True."""
+        wait = self._take(self._buckets(method, path), timeout)
+        if wait is None:
+            return False
+        if wait:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += wait
+            time.sleep(wait)
+        return True
+
+    def _take(self, buckets, max_wait):
+        # Take a token from all *buckets*, or from none of them if one of
+        # them would make us wait longer than *max_wait*.
+        waits = []
+        for bucket in buckets:
+            wait = bucket.reserve(1, max_wait)
+            if wait is None:
+                for taken in buckets[:len(waits)]:
+                    taken.release()
+                return None
+            waits.append(wait)
+        return max(waits or [0.0])
+
+
+class ConcurrencyGovernor(object):
+    """Adapts the number of requests in flight to what the API can take.
+
+    The governor allows :attr:`limit` requests in flight at the same time,
+    starting at *initial*. The limit is adapted with AIMD (additive
+    increase, multiplicative decrease):
+
+    * A response received while the smoothed latency stays within
+      *tolerance* times the lowest recent latency raises the limit by
+      *increase* divided by the limit, i.e. by *increase* per round of
+      requests.
+    * A response with one of the :attr:`congestion_statuses` (429 or 503),
+      or a timeout, multiplies the limit by *decrease*. Responses to
+      requests that were in flight at the same time count as one.
+
+    The limit stays between *minimum* and *maximum*. Its changes are
+    recorded in :attr:`history` as ``(time, limit)`` tuples, for the last
+    *history_size* changes. A governor is safe to share between threads.
+    """
+
+    default_initial = 4
+    default_minimum = 1
+    default_maximum = 32
+    congestion_statuses = (429, 503)
+
+    def __init__(self, initial=None, minimum=None, maximum=None, increase=1.0,
+                 decrease=0.5, tolerance=2.0, history_size=1000):
+        self.minimum = minimum if minimum is not None else self.default_minimum
+        self.maximum = maximum if maximum is not None else self.default_maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.history = deque(maxlen=history_size)
+        self._limit = float(initial if initial is not None else self.default_initial)
+        self._limit = min(self.maximum, max(self.minimum, self._limit))
+        self._inflight = 0
+        self._latency = None
+        self._baseline = None
+        self._last_decrease = None
+        self._waiters = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self.history.append((time.time(), self.limit))
+
+    @property
+    def limit(self):
+        """The current number of requests that may be in flight."""
+        return int(self._limit)
+
+    @property
+    def inflight(self):
+        """The number of requests in flight."""
+        return self._inflight
+
+    @property
+    def latency(self):
+        """The smoothed latency of the responses, in seconds."""
+        return self._latency
+
+    def acquire(self, timeout=None):
+        """Wait until a request may be sent, and count it as in flight. If
+        that takes longer than *timeout* seconds, return False, otherwise
+        return True."""
+        end_time = _monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while self._inflight >= self.limit:
+                if end_time is None:
+                    self._cond.wait()
+                    continue
+                remaining = end_time - _monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._inflight += 1
+            return True
+
+    def try_acquire(self, waiter=None):
+        """Count a request as in flight if the limit allows it, and return
+        whether it did. If not, and *waiter* is given, it is called without
+        arguments once a request may be sent again. If the waiter has a
+        ``done()`` method that returns True, it is skipped instead. A waiter
+        that is no longer interested must be passed to :meth:`cancel`."""
+        with self._cond:
+            if self._inflight < self.limit:
+                self._inflight += 1
+                return True
+            if waiter is not None:
+                self._waiters.append(waiter)
+            return False
+
+    def release(self, latency, congested=False):
+        """Count a request as no longer in flight, and adapt the limit. The
+        *latency* is the time it took, and *congested* tells whether the API
+        was congested, see above. A *latency* of None means that the request
+        was not sent, and leaves the limit as it is."""
+        with self._cond:
+            self._inflight -= 1
+            now = _monotonic()
+            limit = self.limit
+            if latency is None:
+                pass
+            elif congested:
+                if self._last_decrease is None or now - self._last_decrease > (self._latency or 0):
+                    self._limit = max(self.minimum, self._limit * self.decrease)
+                    self._last_decrease = now
+            else:
+                self._latency = latency if self._latency is None \
+                        else 0.8 * self._latency + 0.2 * latency
+                # Let the baseline creep up, so that it follows a slower API.
+                self._baseline = latency if self._baseline is None \
+                        else min(latency, self._baseline * 1.01)
+                if self._latency <= self._baseline * self.tolerance:
+                    self._limit = min(self.maximum, self._limit + self.increase / self._limit)
+            if self.limit != limit:
+                self.history.append((time.time(), self.limit))
+            free = self.limit - self._inflight
+            self._cond.notify(max(0, free))
+            waiters = self._pop_waiters(free)
+        for waiter in waiters:
+            waiter()
+
+    def _pop_waiters(self, count):
+        # Remove and return up to *count* waiters that are not done.
+        waiters = []
+        while self._waiters and len(waiters) < count:
+            waiter = self._waiters.popleft()
+            done = getattr(waiter, 'done', None)
+            if done is None or not done():
+                waiters.append(waiter)
+        return waiters
+
+    def cancel(self, waiter):
+        """Remove *waiter*, that was passed to :meth:`try_acquire`. If it
+        was called already, the next waiter is called instead, so that the
+        wake up is not lost."""
+        with self._cond:
+            try:
+                self._waiters.remove(waiter)
+                return
+            except ValueError:
+                pass
+            waiters = self._pop_waiters(min(1, self.limit - self._inflight))
+        for waiter in waiters:
+            waiter()
+
+
+class CircuitBreaker(object):
+    """A circuit breaker that stops sending requests to an API that fails.
+
+    The breaker watches the outcome of the requests of the last *window*
+    seconds. A request fails when it times out, cannot connect, or gets one
+    of the :attr:`failure_statuses`. When at least *min_requests* requests
+    were made, and at least *failure_rate* of them failed, the breaker
+    opens, and requests fail immediately with :class:`CircuitOpenError`.
+
+    After *reset_timeout* seconds the breaker is half open: up to
+    *probes* requests are let through at the same time. If *probes*
+    requests succeed the breaker closes again, and if one fails it opens
+    for another *reset_timeout* seconds.
+
+    The current state is available as :attr:`state`. The number of times
+    the breaker opened is counted in :attr:`trips`, and the number of
+    requests it refused in :attr:`rejected`. A breaker is safe to share
+    between threads and clients.
+    """
+
+    closed, open, half_open = 'closed', 'open', 'half-open'
+
+    failure_statuses = (500, 502, 503, 504)
+
+    def __init__(self, failure_rate=0.5, window=30.0, min_requests=10, reset_timeout=30.0,
+                 probes=1):
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_requests = min_requests
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.trips = 0
+        self.rejected = 0
+        self._state = self.closed
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened = None
+        self._probing = 0
+        self._passed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """The state of the breaker: "closed", "open" or "half-open"."""
+        with self._lock:
+            self._update(_monotonic())
+            return self._state
+
+    def _update(self, now):
+        if self._state == self.open and now - self._opened >= self.reset_timeout:
+            self._state = self.half_open
+            self._probing = self._passed = 0
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._failures -= self._outcomes.popleft()[1]
+
+    def _trip(self, now):
+        self._state = self.open
+        self._opened = now
+        self._outcomes.clear()
+        self._failures = 0
+        self.trips += 1
+
+    def allow(self):
+        """Check that a request may be sent. Raise :class:`CircuitOpenError`
+        if not, otherwise return whether the request is a probe."""
+        with self._lock:
+            self._update(_monotonic())
+            if self._state == self.closed:
+                return False
+            if self._state == self.half_open and self._probing < self.probes:
+                self._probing += 1
+                return True
+            self.rejected += 1
+        raise CircuitOpenError('circuit breaker is open, not sending request')
+
+    def cancel(self, probe):
+        """Forget a request that :meth:`allow` let through, but that has no
+        outcome, for example because it was cancelled. The *probe* argument
+        is the return value of :meth:`allow`."""
+        if not probe:
+            return
+        with self._lock:
+            self._probing -= 1
+
+    def record(self, failed, probe=False):
+        """Record the outcome of a request. The *probe* argument is the
+        return value of :meth:`allow` for the request."""
+        with self._lock:
+            now = _monotonic()
+            self._update(now)
+            if probe:
+                self._probing -= 1
+                if self._state != self.half_open:
+                    return
+                if failed:
+                    self._trip(now)
+                else:
+                    self._passed += 1
+                    if self._passed >= self.probes:
+                        self._state = self.closed
+                return
+            if self._state != self.closed:
+                return
+            self._outcomes.append((now, int(failed)))
+            self._failures += int(failed)
+            if len(self._outcomes) >= self.min_requests and \
+                    self._failures >= self.failure_rate * len(self._outcomes):
+                self._trip(now)
+
+
+class _Flight(object):
+    """A request that is in flight, and that other identical requests wait
+    for. See :meth:`RavelloClient._single_flight`."""
+
+    __slots__ = ('done', 'entity', 'error', 'followers')
+
+    def __init__(self, done):
+        self.done = done
+        self.entity = None
+        self.error = None
+        self.followers = 0
+
+
+def _flight_key(method, path, body, headers):
+    """Return the key under which identical requests are coalesced. The
+    *headers* are a mapping or a list of pairs, like for :meth:`request`."""
+    headers = tuple(sorted(dict(headers).items())) if headers else ()
+    return method, path, body, headers
+
+
+_Validators = namedtuple('_Validators', ('etag', 'last_modified', 'entity'))
+
+
+class ValidatorCache(object):
+    """A cache of entities by their validators, for conditional GETs.
+
+    The cache keeps the ``ETag`` and ``Last-Modified`` headers of the GET
+    responses that have them, together with the parsed entity, for up to
+    *maxsize* paths. A later GET of the same path is sent with
+    ``If-None-Match`` and ``If-Modified-Since`` headers, and when the API
+    replies with 304 (Not Modified), a copy of the cached entity is returned
+    without downloading or parsing it again. Any other request to a path
+    removes it from the cache.
+
+    The number of 304 responses is counted in :attr:`hits`, and the number of
+    full responses to conditional or cacheable GETs in :attr:`misses`.
+    """
+
+    default_maxsize = 1000
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize if maxsize is not None else self.default_maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, path):
+        """Return the validators for *path*, or None if it is not cached."""
+        with self._lock:
+            return self._entries.get(path)
+
+    def conditions(self, validators):
+        """Return the conditional request headers for *validators*."""
+        headers = {}
+        if validators.etag is not None:
+            headers['If-None-Match'] = validators.etag
+        if validators.last_modified is not None:
+            headers['If-Modified-Since'] = validators.last_modified
+        return headers
+
+    def hit(self, path, validators):
+        """Record a 304 response for *path*, and return a copy of the entity
+        in *validators*."""
+        with self._lock:
+            self.hits += 1
+            if path in self._entries:
+                # Move to the end, as the most recently used entry.
+                self._entries[path] = self._entries.pop(path)
+        return _copy_entity(validators.entity)
+
+    def update(self, method, path, status, headers, entity):
+        """Update the cache with the response to a *method* request for
+        *path* that was not a 304."""
+        if method != 'GET':
+            self.invalidate(path)
+            return
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        cacheable = status == 200 and entity is not None and (etag or last_modified)
+        with self._lock:
+            self._entries.pop(path, None)
+            if not cacheable:
+                return
+            self.misses += 1
+            self._entries[path] = _Validators(etag, last_modified, _copy_entity(entity))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path=None):
+        """Remove *path* from the cache, or all paths if it is not given."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+_ident = re.compile(r'/\d+(;[^/]*)?(?=/|$)')
+
+
+def _path_template(path):
+    """Return the template of *path*, with object IDs replaced by "{id}"
+    and without the query string, e.g. "/applications/{id}/vms"."""
+    return _ident.sub('/{id}', path.split('?', 1)[0])
+
+
+class ResponseCache(object):
+    """A cache of GET responses for resources that rarely change.
+
+    Only the resources listed in *ttls* are cached. It maps path templates,
+    in which object IDs are replaced by "{id}", to the number of seconds that
+    a response stays fresh, and is added to :attr:`default_ttls`. A TTL of
+    None disables caching for a template. The cache is bounded by *maxsize*
+    responses and by *maxbytes* bytes of response bodies, and evicts the
+    least recently used responses first.
+
+    Any other request than a GET invalidates all cached responses for the
+    same top-level resource, so that for example :meth:`~RavelloClient.update_keypair`
+    invalidates the cached keypairs. A cached entity is copied when it is
+    returned, so callers may modify it.
+
+    The statistics are available as the :attr:`hits`, :attr:`misses`,
+    :attr:`expirations`, :attr:`evictions` and :attr:`invalidations`
+    counters, and :attr:`nbytes`, the size of the cached responses.
+    """
+
+    default_ttls = {
+        '/images': 300,
+        '/diskImages': 300,
+        '/keypairs': 300,
+        '/permissionsGroups/describe': 3600,
+        '/events': 3600,
+        '/communities': 3600,
+        '/applications/{id}/publishLocations': 600,
+        '/blueprints/{id}/publishLocations': 600,
+    }
+    default_maxsize = 1000
+    default_maxbytes = 32 * 1024 * 1024
+
+    def __init__(self, ttls=None, maxsize=None, maxbytes=None):
+        self.ttls = dict(self.default_ttls)
+        self.ttls.update(ttls or {})
+        self.maxsize = maxsize if maxsize is not None else self.default_maxsize
+        self.maxbytes = maxbytes if maxbytes is not None else self.default_maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # (path, body) -> (expiry time, size, entity)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _ttl(self, path):
+        return self.ttls.get(_path_template(path))
+
+    def get(self, path, body=b''):
+        """Return a copy of the cached entity for a GET of *path* with
+        *body*, or None if it is not cached."""
+        if self._ttl(path) is None:
+            return None
+        key = (path, body)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] <= time.time():
+                self.nbytes -= entry[1]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+        return _copy_entity(entry[2])
+
+    def update(self, method, path, body, status, entity, size):
+        """Update the cache with the response to a *method* request for
+        *path*. The *size* is the size of the response body."""
+        if method != 'GET':
+            self.invalidate(path.split('?', 1)[0].split('/')[1])
+            return
+        ttl = self._ttl(path)
+        if ttl is None or status != 200 or entity is None or size > self.maxbytes:
+            return
+        key = (path, body)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._entries[key] = (time.time() + ttl, size, _copy_entity(entity))
+            self.nbytes += size
+            while len(self._entries) > self.maxsize or self.nbytes > self.maxbytes:
+                key, entry = self._entries.popitem(last=False)
+                self.nbytes -= entry[1]
+                self.evictions += 1
+
+    def invalidate(self, resource=None):
+        """Remove the cached responses for the top-level *resource* (e.g.
+        "keypairs"), or all responses if it is not given."""
+        with self._lock:
+            for key in list(self._entries):
+                if resource is None or key[0].split('/')[1] == resource:
+                    self.nbytes -= self._entries.pop(key)[1]
+                    self.invalidations += 1
+
+
+class _EndpointStats(object):
+    """Counters for one endpoint of a :class:`StatsCollector`."""
+
+    __slots__ = ('count', 'errors', 'retries', 'sent', 'received', 'total',
+                 'minimum', 'maximum', 'buckets', 'statuses')
+
+    def __init__(self, nbuckets):
+        self.count = self.errors = self.retries = 0
+        self.sent = self.received = 0
+        self.total = 0.0
+        self.minimum = self.maximum = None
+        self.buckets = [0] * nbuckets
+        self.statuses = {}
+
+
+class StatsCollector(object):
+    """Collects request statistics per endpoint.
+
+    An endpoint is a method and a path template, in which object IDs are
+    replaced by "{id}", e.g. "POST /applications/{id}/vms/{id}/start". For
+    every endpoint the collector counts the requests, the failed requests
+    (that did not get a response), the retries, the bytes sent and received,
+    and the responses per status code. It also keeps a histogram of the
+    latencies, with the upper bounds in seconds given by *buckets*.
+
+    The :meth:`response` and :meth:`retry` methods have the signatures of
+    the client's ``on_response`` and ``on_retry`` hooks, and are installed
+    as such by the client. Use
+    :meth:`~RavelloClient.stats` or :meth:`snapshot` to get the statistics.
+    """
+
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                       5.0, 10.0, 30.0, 60.0)
+
+    # Upper bound on the number of paths for which the template is cached.
+    _template_cache_size = 1024
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(sorted(buckets or self.default_buckets))
+        self._endpoints = {}
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, method, path):
+        # Return the counters for the endpoint of a request. Must be called
+        # with the lock held.
+        template = self._templates.get(path)
+        if template is None:
+            template = _path_template(path)
+            if len(self._templates) >= self._template_cache_size:
+                self._templates.clear()
+            self._templates[path] = template
+        key = (method, template)
+        stats = self._endpoints.get(key)
+        if stats is None:
+            stats = self._endpoints[key] = _EndpointStats(len(self.buckets) + 1)
+        return stats
+
+    def response(self, method, path, status, elapsed, sent, received, error):
+        """Record a response with *status* that took *elapsed* seconds.
+        For a request that failed without a response, *status* is None and
+        *error* is the exception."""
+        index = bisect.bisect_left(self.buckets, elapsed)
+        with self._lock:
+            stats = self._endpoint(method, path)
+            stats.count += 1
+            stats.sent += sent
+            stats.received += received
+            stats.total += elapsed
+            stats.buckets[index] += 1
+            if stats.minimum is None or elapsed < stats.minimum:
+                stats.minimum = elapsed
+            if stats.maximum is None or elapsed > stats.maximum:
+                stats.maximum = elapsed
+            if status is None:
+                stats.errors += 1
+            else:
+                stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def retry(self, method, path, attempt, delay, reason):
+        """Record a retry of a request."""
+        with self._lock:
+            self._endpoint(method, path).retries += 1
+
+    def _percentile(self, stats, fraction):
+        # The upper bound of the bucket that contains the percentile,
+        # capped at the maximum latency.
+        rank = fraction * stats.count
+        seen = 0
+        for bound, count in zip(self.buckets, stats.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, stats.maximum)
+        return stats.maximum
+
+    def snapshot(self):
+        """Return the statistics.
+
+        The return value is a dict mapping endpoints, e.g. "GET
+        /applications/{id}", to a dict with the keys "count", "errors",
+        "retries", "bytes_sent", "bytes_received", "statuses" (a dict mapping
+        status codes to counts) and "latency". The latter is a dict with the
+        "mean", "min", "max", "p50", "p90" and "p99" latencies in seconds,
+        and a "histogram" that is a list of ``(upper_bound, count)`` tuples
+        where the last upper bound is None.
+        """
+        result = {}
+        with self._lock:
+            for (method, template), stats in self._endpoints.items():
+                latency = {'histogram': list(zip(self.buckets + (None,), stats.buckets))}
+                if stats.count:
+                    latency.update({'mean': stats.total / stats.count,
+                                    'min': stats.minimum, 'max': stats.maximum,
+                                    'p50': self._percentile(stats, 0.5),
+                                    'p90': self._percentile(stats, 0.9),
+                                    'p99': self._percentile(stats, 0.99)})
+                result['{0} {1}'.format(method, template)] = {
+                    'count': stats.count, 'errors': stats.errors,
+                    'retries': stats.retries, 'bytes_sent': stats.sent,
+                    'bytes_received': stats.received, 'statuses': dict(stats.statuses),
+                    'latency': latency}
+        return result
+
+    def reset(self):
+        """Clear all statistics."""
+        with self._lock:
+            self._endpoints.clear()
+
+
+def _new_id():
+    """Return a new random trace or span ID."""
+    return '{0:016x}'.format(random.getrandbits(64))
+
+
+class Span(object):
+    """A timed operation in a trace.
+
+    A span has a *name*, a dict of *attributes*, and the IDs of its trace,
+    itself and its parent span (None for a root span). The :attr:`start`
+    time is a Unix timestamp, and :attr:`duration` is in seconds. If the
+    operation failed, :attr:`error` is the string form of the exception.
+    """
+
+    __slots__ = ('name', 'attributes', 'trace_id', 'span_id', 'parent',
+                 'start', 'duration', 'error', '_started')
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.trace_id = parent.trace_id if parent is not None else _new_id()
+        self.span_id = _new_id()
+        self.parent = parent
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        self._started = _monotonic()
+
+    @property
+    def parent_id(self):
+        """The ID of the parent span, or None."""
+        return self.parent.span_id if self.parent is not None else None
+
+    def set(self, key, value):
+        """Set the attribute *key* to *value*."""
+        self.attributes[key] = value
+
+    def to_dict(self):
+        """Return the span as a JSON serializable dict."""
+        return {'name': self.name, 'trace_id': self.trace_id,
+                'span_id': self.span_id, 'parent_id': self.parent_id,
+                'start': self.start, 'duration': self.duration,
+                'error': self.error, 'attributes': self.attributes}
+
+
+class InMemoryExporter(object):
+    """An exporter that keeps the finished spans in the :attr:`spans` list."""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        """Add *span* to :attr:`spans`."""
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        """Remove all spans."""
+        with self._lock:
+            del self.spans[:]
+
+    def close(self):
+        pass
+
+
+class JSONFileExporter(object):
+    """An exporter that appends the finished spans to the file *filename*,
+    one JSON object per line. See :meth:`Span.to_dict`."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        """Write *span* to the file."""
+        line = json.dumps(span.to_dict(), sort_keys=True, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = codecs.open(self.filename, 'a', 'utf-8')
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        """Close the file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Tracer(object):
+    """Traces the operations of a client as trees of :class:`Span` objects.
+
+    With a tracer, every public method of the client runs in a span named
+    after the method, and every HTTP request that is sent, including
+    retries, gets a child span named after its method and path template,
+    e.g. "GET /applications/{id}". Spans that are started while another
+    span is active become its children. The active span is tracked per
+    thread and per asyncio task.
+
+    Finished spans are passed to the ``export(span)`` method of *exporter*,
+    children before their parents. It defaults to an
+    :class:`InMemoryExporter`.
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter if exporter is not None else InMemoryExporter()
+        if contextvars is not None:
+            self._current = contextvars.ContextVar('ravello_span', default=None)
+        else:
+            self._current = threading.local()
+
+    def current(self):
+        """Return the active span, or None."""
+        if contextvars is not None:
+            return self._current.get()
+        return getattr(self._current, 'span', None)
+
+    def activate(self, span):
+        """Make *span* the active span."""
+        if contextvars is not None:
+            self._current.set(span)
+        else:
+            self._current.span = span
+
+    def start(self, name, **attributes):
+        """Start a span that is a child of the active span, and make it
+        the active span."""
+        span = Span(name, self.current(), attributes)
+        self.activate(span)
+        return span
+
+    def finish(self, span, error=None):
+        """Finish *span*, which must be the active span, and export it. The
+        parent of the span becomes the active span again."""
+        span.duration = _monotonic() - span._started
+        if error is not None:
+            span.error = str(error) or type(error).__name__
+        self.activate(span.parent)
+        self.exporter.export(span)
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """Return a context manager that runs its block in a new span."""
+        span = self.start(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish(span, e)
+            raise
+        self.finish(span)
+
+
+def _traced(func):
+    """Run the client method *func* in a span when the client has a tracer."""
+    name = func.__name__
+    @functools.wraps(func)
+    def method(self, *args, **kwargs):
+        tracer = self.tracer
+        if tracer is None:
+            return func(self, *args, **kwargs)
+        with tracer.span(name):
+            return func(self, *args, **kwargs)
+    return method
+
+
+def _split_call(call):
+    """Split a batch call into a ``(method, args, kwargs)`` tuple."""
+    args = call[1] if len(call) > 1 else ()
+    kwargs = call[2] if len(call) > 2 else {}
+    return call[0], args, kwargs
+
+
 class RavelloClient(object):
     """A client for the Ravello API.
 
@@ -206,14 +2137,45 @@ class RavelloClient(object):
     * HTTP response codes in the 4xx or 5xx range are considered errors, and
       are turned into :class:`RavelloError` exceptions (except for 404 which
       results in a response of ``None``).
+
+    A client can be shared by multiple threads. All threads use the same
+    session and its keep-alive connection pool, so *pool_maxsize* should be
+    at least the number of threads that make requests concurrently. When the
+    session expires, the first thread that gets a 401 response logs in again
+    while the other threads wait for it and then retry with the new session.
     """
 
     default_url = 'https://cloud.ravellosystems.com/api/v1'
     default_timeout = 60
     default_retries = 3
     default_redirects = 3
-
-    def __init__(self, username=None, password=None, url=None, timeout=None, retries=None, proxy_url=None, eph_token=None, identity_domain=None):
+    default_pool_connections = 4
+    default_pool_maxsize = 10
+    default_batch_workers = 8
+    default_coalesce = False
+    default_stats = True
+    default_compact = False
+    default_server_filters = False
+
+    # The collections that have a "filter" call, which returns the objects
+    # that match the criteria in the request entity.
+    filter_paths = ('/applications', '/blueprints')
+
+    # A small resource that is requested by :meth:`warm_up`.
+    warm_up_path = '/events'
+
+    # Upper bound on the number of prepared URLs kept by :meth:`_prepare_url`.
+    _url_cache_size = 1024
+    # The size of the chunks in which :meth:`_iter` reads a response.
+    _stream_chunk_size = 65536
+
+    def __init__(self, username=None, password=None, url=None, timeout=None, retries=None,
+                 proxy_url=None, eph_token=None, identity_domain=None, pool_connections=None,
+                 pool_maxsize=None, retry_policy=None, codec=None,
+                 validator_cache=None, response_cache=None, coalesce=None,
+                 rate_limiter=None, governor=None, circuit_breaker=None,
+                 stats_collector=None, tracer=None, compact=None, server_filters=None,
+                 session_store=None):
         """Create a new client.
 
         The *username* and *password* parameters specify the credentials to use
@@ -225,20 +2187,138 @@ class RavelloClient(object):
         of retries respectively.
         *proxy_url* should be used when an HTTP proxy is in place.
         *eph_token* is ephemeral access token to be used instead of username/password.
+
+        The *pool_connections* and *pool_maxsize* parameters configure the
+        keep-alive connection pools: the number of hosts to keep a pool for,
+        and the maximum number of idle connections kept per host.
+
+        The *retry_policy* parameter is a :class:`RetryPolicy` that decides
+        which failed requests are retried, and how long to wait before
+        retrying them. It defaults to a policy with *retries* retries.
+
+        The *codec* parameter is the codec used to encode request entities and
+        to decode JSON responses, or its name. See :func:`get_codec`. By
+        default the fastest installed codec is used.
+
+        The *validator_cache* parameter enables conditional GETs with the
+        given :class:`ValidatorCache`. Pass True to use a new cache.
+
+        The *response_cache* parameter enables caching of read-mostly
+        resources in the given :class:`ResponseCache`. Pass True to use a new
+        cache with the default TTLs.
+
+        If *coalesce* is true, identical GET requests that are made while one
+        of them is in flight wait for its response instead of being sent as
+        well. They get a copy of its entity, or the same exception. The
+        number of requests that were not sent because of this is counted in
+        :attr:`coalesced`. This is off by default, because a GET that joins
+        one that was sent before a concurrent update may not see that
+        update.
+
+        The *rate_limiter* parameter is a :class:`RateLimiter` that limits
+        the rate at which requests are sent, including retries.
+
+        The *governor* parameter is a :class:`ConcurrencyGovernor` that
+        limits the number of requests in flight, and adapts that limit to the
+        latency and the congestion of the API. With a governor, the batch
+        calls use up to its maximum number of workers, and *pool_maxsize*
+        defaults to that maximum as well.
+
+        The *circuit_breaker* parameter is a :class:`CircuitBreaker` that
+        makes requests fail fast while the API is failing.
+
+        The *stats_collector* parameter is the :class:`StatsCollector` that
+        collects the statistics returned by :meth:`stats`. By default a new
+        collector is used. Pass False to not collect statistics.
+
+        Every request that is sent, including retries, calls the hooks in
+        the :attr:`on_request` list with the method and the path, and then
+        the hooks in :attr:`on_response` with the method, the path, the
+        status (None if the request failed without a response), the latency
+        in seconds, the number of bytes sent and received, and the exception
+        (None if there was a response). Before a request is retried, the
+        hooks in :attr:`on_retry` are called with the method, the path, the
+        attempt number, the delay before the retry in seconds, and the
+        status or the exception that caused it. An exception raised by a
+        hook is logged and otherwise ignored.
+
+        The *tracer* parameter is a :class:`Tracer` that records a span for
+        every call of a public method, and for every HTTP request that is
+        sent.
+
+        If *compact* is true, the "get all" and "iter" calls return
+        :class:`Record` objects instead of dicts, which take a fraction of
+        the memory. The default is False.
+
+        If *server_filters* is true, the "get all" and "iter" calls for the
+        collections in :attr:`filter_paths` send the part of a dict filter
+        that the API can evaluate with a filter call, so that only the
+        matching objects are transferred. The result is then filtered
+        locally as usual. This is off by default: the API may evaluate some
+        criteria more strictly than the local filter, and objects that it
+        leaves out cannot be filtered back in.
+
+        The *session_store* parameter is a :class:`SessionStore`. If it is
+        provided, the first username/password login reuses the session that
+        is saved for the user, if any, and a new session is saved after a
+        login. If the saved session has expired, the client logs in again
+        when the API rejects it.
         """
         self._identity_domain = identity_domain
         self._username = username
         self._password = password
         self.timeout = timeout if timeout is not None else self.default_timeout
-        self.retries = retries if retries is not None else self.default_retries
+        if retry_policy is None:
+            retry_policy = RetryPolicy(retries if retries is not None else self.default_retries)
+        elif retries is not None:
+            retry_policy.retries = retries
+        self.retry_policy = retry_policy
+        self.codec = get_codec(codec) if codec is None or isinstance(codec, str) else codec
+        self.validator_cache = ValidatorCache() if validator_cache is True else validator_cache
+        self.response_cache = ResponseCache() if response_cache is True else response_cache
+        self.coalesce = coalesce if coalesce is not None else self.default_coalesce
+        self.coalesced = 0
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self.rate_limiter = rate_limiter
+        self.governor = governor
+        self.circuit_breaker = circuit_breaker
+        if stats_collector is None and self.default_stats:
+            stats_collector = StatsCollector()
+        self.stats_collector = stats_collector or None
+        self.tracer = tracer
+        self.session_store = session_store
+        self._poller = None
+        self.compact = compact if compact is not None else self.default_compact
+        self.server_filters = server_filters if server_filters is not None \
+                else self.default_server_filters
+        self._unfiltered_paths = set()
+        self.on_request = []
+        self.on_response = []
+        self.on_retry = []
+        if self.stats_collector is not None:
+            self.on_response.append(self.stats_collector.response)
+            self.on_retry.append(self.stats_collector.retry)
         self.redirects = self.default_redirects
+        self.pool_connections = pool_connections if pool_connections is not None \
+                else self.default_pool_connections
+        if pool_maxsize is None:
+            pool_maxsize = self.default_pool_maxsize
+            if governor is not None:
+                pool_maxsize = max(pool_maxsize, governor.maximum)
+        self.pool_maxsize = pool_maxsize
         self._logger = logging.getLogger('ravello')
         self._autologin = True
         self._connection = None
+        self._generation = 0
+        self._login_lock = threading.RLock()
         self._user_info = None
+        self._url_cache = {}
+        self._header_templates = None
+        self._send_settings = None
         self._set_url(url or self.default_url)
         # Get proxy setting from environment variables
-        self._proxies = urllib.getproxies()
+        self._proxies = getproxies()
         if proxy_url is not None:
             self._proxies = {"http": proxy_url, "https": proxy_url}
         self._eph_token = eph_token
@@ -249,6 +2329,16 @@ class RavelloClient(object):
         :class:`urllib.parse.SplitResult` instance."""
         return self._url
 
+    @property
+    def retries(self):
+        """The maximum number of retries for a request. This is a shorthand
+        for the ``retries`` attribute of :attr:`retry_policy`."""
+        return self.retry_policy.retries
+
+    @retries.setter
+    def retries(self, retries):
+        self.retry_policy.retries = retries
+
     @property
     def connected(self):
         """Whether or not the client is connected to the API."""
@@ -271,7 +2361,11 @@ class RavelloClient(object):
 
     @property
     def user_info(self):
-        """Return information about the current logged-in user."""
+        """Return information about the current logged-in user.
+
+        This is the entity returned by the login call, a dict. Earlier
+        versions returned the :class:`requests.Response` of that call.
+        """
         return self._user_info
 
     def _set_url(self, url):
@@ -279,6 +2373,7 @@ class RavelloClient(object):
             raise RuntimeError('cannot change URL when connected')
         self.default_url = url
         self._url = urlsplit2(url)
+        self._url_cache.clear()
 
     def connect(self, url=None, proxy_url=None, eph_token=None):
         """Connect to the API.
@@ -292,8 +2387,10 @@ class RavelloClient(object):
             self._proxies = {"http": proxy_url, "https": proxy_url}
         if eph_token is not None:
             self._eph_token = eph_token
+            self._header_templates = None
         if self._connection is not None:
             self._connection.proxies = self._proxies
+            self._send_settings = None
 
     def login(self, username=None, password=None, identity_domain=None):
         """Login to the API.
@@ -307,38 +2404,117 @@ class RavelloClient(object):
         When the organization of the user has an identity domain,
         the user must specify it or include it in the username: <identity_domain>/<username>.
         When the organization doesnt have an identity domain use only the username.
+
+        Calling this method without arguments when the client is already
+        logged in does nothing, so it is safe to call from many threads at
+        the same time. Passing credentials to a logged in client raises a
+        :class:`RuntimeError`.
         """
-        if self.logged_in:
-            raise RuntimeError('already logged in')
-        if username is not None:
-            self._username = username
-        if identity_domain is not None:
-            self._identity_domain = identity_domain
-        if password is not None:
-            self._password = password
-        self._login()
-
-    def _login(self):
-        if not self.have_credentials and not self.have_eph_access_token:
-            raise RuntimeError('no credentials or ephemeral access token set')
-        self._connection = requests.Session()
-        self._connection.proxies = self._proxies
-        self._connection.stream = True
-        self._connection.redirects = self.redirects
-        self._autologin = False
-        if self.have_credentials:
-            self._logger.debug('performing a username/password login')
-            if self._identity_domain is not None:
-                auth = '{0}:{1}'.format(self._identity_domain + "/" + self._username, self._password)
+        with self._login_lock:
+            if self.logged_in:
+                if username is None and password is None and identity_domain is None:
+                    return
+                raise RuntimeError('already logged in')
+            if username is not None:
+                self._username = username
+            if identity_domain is not None:
+                self._identity_domain = identity_domain
+            if password is not None:
+                self._password = password
+            self._login()
+
+    def _login(self, generation=None):
+        # Log in and publish the resulting session. If *generation* is given,
+        # this is a re-login after a 401 on a session of that generation. In
+        # that case only the first thread logs in, and the others return as
+        # soon as it is done and use the new session.
+        with self._login_lock:
+            if generation is not None and generation != self._generation:
+                return
+            if not self.have_credentials and not self.have_eph_access_token:
+                raise RuntimeError('no credentials or ephemeral access token set')
+            # Keep using the existing session (and its connection pool) on
+            # a re-login. The new session cookie replaces the expired one.
+            session = self._connection or self._new_session()
+            saved = self._saved_session() if self._generation == 0 else None
+            if saved is not None:
+                self._logger.debug('using a saved session')
+                for cookie in saved['cookies']:
+                    session.cookies.set(cookie['name'], cookie['value'],
+                                        domain=cookie['domain'], path=cookie['path'])
+                self._user_info = saved['user_info']
+            elif self.have_credentials:
+                self._logger.debug('performing a username/password login')
+                headers = [('Authorization', self._basic_auth())]
+                try:
+                    response = self._request('POST', '/login', b'', headers, session=session)
+                except Exception:
+                    session.close()
+                    self._connection = None
+                    raise
+                self._user_info = response.entity
+                self._save_session([{'name': cookie.name, 'value': cookie.value,
+                                     'domain': cookie.domain, 'path': cookie.path}
+                                    for cookie in session.cookies])
             else:
-                auth = '{0}:{1}'.format(self._username, self._password)
-            auth = base64.b64encode(auth.encode('ascii')).decode('ascii')
-            headers = [('Authorization', 'Basic {0}'.format(auth))]
-            response = self._request('POST', '/login', b'', headers)
-            self._user_info = response
+                self._logger.debug('using ephemeral access based session')
+            self._connection = session
+            self._generation += 1
+
+    def _session_key(self):
+        # The key of the session of this client in the session store.
+        username = self._username
+        if self._identity_domain is not None:
+            username = '{0}/{1}'.format(self._identity_domain, username)
+        return '{0}@{1}{2}'.format(username, self._url.netloc, self._url.path)
+
+    def _saved_session(self):
+        # Return the saved session for a username/password login, or None.
+        if self.session_store is None or not self.have_credentials:
+            return
+        try:
+            return self.session_store.load(self._session_key())
+        except EnvironmentError as e:
+            self._logger.warning('cannot load saved session: {0!s}'.format(e))
+
+    def _save_session(self, cookies):
+        if self.session_store is None:
+            return
+        try:
+            self.session_store.save(self._session_key(), cookies, self._user_info)
+        except EnvironmentError as e:
+            self._logger.warning('cannot save session: {0!s}'.format(e))
+
+    def _forget_session(self):
+        if self.session_store is None or not self.have_credentials:
+            return
+        try:
+            self.session_store.delete(self._session_key())
+        except EnvironmentError as e:
+            self._logger.warning('cannot remove saved session: {0!s}'.format(e))
+
+    def _basic_auth(self):
+        # Return the Authorization header for a username/password login.
+        if self._identity_domain is not None:
+            auth = '{0}:{1}'.format(self._identity_domain + "/" + self._username, self._password)
         else:
-            self._logger.debug('using ephemeral access based session')
-        self._autologin = True
+            auth = '{0}:{1}'.format(self._username, self._password)
+        auth = base64.b64encode(auth.encode('ascii')).decode('ascii')
+        return 'Basic {0}'.format(auth)
+
+    def _new_session(self):
+        # Create a session with keep-alive connection pools sized according
+        # to pool_connections / pool_maxsize. Retries are done by _request().
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.proxies = self._proxies
+        session.stream = True
+        session.max_redirects = self.redirects
+        self._send_settings = None
+        return session
 
     def logout(self):
         """Logout from the API.
@@ -347,18 +2523,62 @@ class RavelloClient(object):
         """
         if self.logged_in:
             self.request('POST', '/logout')
-        self._connection = None
+        self._forget_session()
+        self.close()
+
+    def warm_up(self, background=False):
+        """Log in and open a connection to the API ahead of the first call.
+
+        A saved session (see the *session_store* argument to the
+        constructor) is checked as well, and replaced by a new login if it
+        has expired. If *background* is true, this is done in a daemon
+        thread, which is returned, so that a program can do other work in
+        the meantime. Errors in the background are only logged; the next
+        call will then fail or log in again as usual.
+
+        The request for :attr:`warm_up_path` bypasses the response cache,
+        since a cached response would not warm up anything.
+        """
+        if not background:
+            self.request('GET', self.warm_up_path, cache=False)
+            return
+        def warm_up():
+            try:
+                self.request('GET', self.warm_up_path, cache=False)
+            except Exception as e:
+                self._logger.debug('warm up failed: {0!s}'.format(e))
+        thread = threading.Thread(target=warm_up)
+        thread.daemon = True
+        thread.start()
+        return thread
 
     def close(self):
         """Close the connection to the API."""
-        if not self.connected:
-            return
-        self._connection = None
+        with self._login_lock:
+            if not self.connected:
+                return
+            self._connection.close()
+            self._connection = None
+
+    def stats(self):
+        """Return the request statistics per endpoint, or None if they are
+        not collected. See :meth:`StatsCollector.snapshot`."""
+        if self.stats_collector is None:
+            return None
+        return self.stats_collector.snapshot()
+
+    def _call_hooks(self, hooks, *args):
+        # Call the instrumentation *hooks*. They must not break requests.
+        for hook in hooks:
+            try:
+                hook(*args)
+            except Exception:
+                self._logger.exception('instrumentation hook {0!r} failed'.format(hook))
 
     # The request() method is the main function. All other methods are a small
     # shim on top of this.
 
-    def request(self, method, path, entity=None, headers=None):
+    def request(self, method, path, entity=None, headers=None, cache=True):
         """Issues a request to the API.
 
         The parsed entity is returned, or a :class:`RavelloError` exception is
@@ -366,96 +2586,375 @@ class RavelloClient(object):
 
         This method can be used in case a certain API call has not yet been
         added as a method.
+
+        If *cache* is false, the :attr:`response_cache` is not used to answer
+        a GET, so that the current state is returned. The response still
+        updates the cache.
         """
-        body = json.dumps(entity).encode('utf-8') if entity is not None else b''
+        body = self._encode_entity(entity)
+        if self.response_cache is not None and method == 'GET' and cache:
+            cached = self.response_cache.get(path, body)
+            if cached is not None:
+                return cached
         headers = headers if headers is not None else []
+        if self.coalesce and method in _coalesced_methods:
+            return self._single_flight(method, path, body, headers)
         response = self._request(method, path, body, headers)
         return response.entity
 
-    def _request(self, method, path, body=b'', headers=None):
+    def _single_flight(self, method, path, body, headers):
+        # Make a request, unless an identical one is in flight already. In
+        # that case, wait for it, and return a copy of its entity.
+        key = _flight_key(method, path, body, headers)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(threading.Event())
+            else:
+                flight.followers += 1
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return _copy_entity(flight.entity)
+        entity = None
+        try:
+            entity = self._request(method, path, body, headers).entity
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            # Copy the entity before the caller gets it, and may modify it.
+            if flight.followers and flight.error is None:
+                flight.entity = _copy_entity(entity)
+            flight.done.set()
+        return entity
+
+    def _encode_entity(self, entity):
+        # Return the request body for *entity*.
+        if entity is None:
+            return b''
+        if isinstance(entity, (Record, Application)):
+            entity = entity.to_dict()
+        return self.codec.encode(entity)
+
+    def _prepare_url(self, abpath):
+        # Parsing, IDNA-encoding and requoting the URL is the most expensive
+        # part of preparing a request. The result only depends on the URL so
+        # it is cached.
+        url = self._url_cache.get(abpath)
+        if url is None:
+            prepared = requests.PreparedRequest()
+            prepared.prepare_url(abpath, None)
+            url = prepared.url
+            if len(self._url_cache) >= self._url_cache_size:
+                self._url_cache.clear()
+            self._url_cache[abpath] = url
+        return url
+
+    def _header_template(self, body):
+        # Return the default headers for a request with or without a body.
+        if self._header_templates is None:
+            hdict = {'Accept': 'application/json', 'Connection': 'keep-alive'}
+            if self._eph_token is not None:
+                hdict['X-Ephemeral-Token-Authorization'] = self._eph_token
+            withbody = hdict.copy()
+            withbody['Content-Type'] = 'application/json;charset=utf-8'
+            self._header_templates = (hdict, withbody)
+        return self._header_templates[bool(body)]
+
+    def _session_settings(self, session, abpath):
+        # Resolving proxies and CA bundles scans the environment, which
+        # requests would otherwise do on every send(). The API host does not
+        # change while connected, so resolve them once per session. The
+        # same goes for the session headers (User-Agent, Accept-Encoding and
+        # any the user added), which Request.prepare() would merge. Both are
+        # published as one tuple, so that concurrent requests never see one
+        # without the other.
+        cached = self._send_settings
+        if cached is None:
+            settings = session.merge_environment_settings(
+                    abpath, self._proxies, True, None, None)
+            headers = CaseInsensitiveDict(
+                    (key, value) for key, value in session.headers.items() if value is not None)
+            cached = self._send_settings = (settings, headers)
+        return cached
+
+    def _prepare(self, method, abpath, body, hdict, cookies, defaults):
+        # Build a PreparedRequest directly. This is what Request.prepare()
+        # does for our limited set of inputs (a bytes body, plain headers and
+        # a cookie jar), without re-parsing the URL and re-encoding the body
+        # on every call. The *defaults* are the session headers returned by
+        # _session_settings().
+        req = requests.PreparedRequest()
+        req.method = method
+        req.url = self._prepare_url(abpath)
+        req.headers = defaults.copy()
+        req.headers.update(hdict)
+        if body:
+            req.body = body
+            req.headers['Content-Length'] = str(len(body))
+        elif method not in ('GET', 'HEAD'):
+            req.headers['Content-Length'] = '0'
+        req.prepare_cookies(cookies)
+        return req
+
+    def _build_request(self, path, body, headers):
+        # Return the path relative to the server, the absolute URL and the
+        # headers for a request. Shared with AsyncRavelloClient.
         rpath = self._url.path + path
         abpath = self.default_url + path
-        hdict = {'Accept': 'application/json'}
-        if self._eph_token is not None:
-            hdict['X-Ephemeral-Token-Authorization'] = self._eph_token
-        if body:
-            hdict['Content-Type'] = 'application/json;charset=utf-8'
+        hdict = self._header_template(body).copy()
         if isinstance(headers, dict):
             hdict.update(headers)
         elif isinstance(headers, list):
             for key, value in headers:
                 hdict[key] = value
-        retries = 0
-        while retries <= self.retries:
-            if not self.logged_in and (self.have_credentials or self.have_eph_access_token) and self._autologin:
-                self._login()
+        return rpath, abpath, hdict
+
+    def _parse_entity(self, ctype, content):
+        # Parse the response body *content* according to its content type.
+        if ctype == 'application/json':
+            return self.codec.decode(content)
+        elif ctype == 'text/plain':
+            return content.decode('iso-8859-1')
+        return None
+
+    def _check_response(self, method, path, status, reason, headers, entity,
+                        relogin=True, response=None):
+        # Check a response and return its entity, annotated with "_href".
+        # HTTP errors are raised as requests.HTTPError. If the session has
+        # expired and *relogin* is set, _RELOGIN is returned instead. Shared
+        # with AsyncRavelloClient so that both map responses the same way.
+        rpath = self._url.path + path
+        if 200 <= status < 299:
+            if isinstance(entity, dict) and entity.get('id'):
+                if headers.get('Content-Location'):
+                    href = urlsplit2(headers.get('Content-Location')).path
+                elif headers.get('Location'):
+                    href = urlsplit2(headers.get('Location')).path
+                elif method == 'POST':
+                    # missing Location header e.g. with /pubkeys
+                    href = '{0}/{1}'.format(rpath, entity['id'])
+                else:
+                    href = rpath
+                entity['_href'] = href[len(self._url.path):]
+            elif isinstance(entity, list):
+                for elem in entity:
+                    self._annotate_element(path, elem)
+        elif 300 <= status < 399:
+            loc = headers.get('Location')
+            if loc is None:
+                raise RavelloError('no location for {0} response'.format(status))
+            if not loc.startswith('/'):
+                url = urlsplit2(loc)
+                if url.netloc != self._url.netloc:
+                    raise RavelloError('will not chase referral to {0}'.format(loc))
+        elif status == 401:
+            if not relogin:
+                _raise_for_status(status, reason, self.default_url + path, response)
+            elif self._autologin:
+                if not self.retries:
+                    _raise_for_status(status, reason, self.default_url + path, response)
+                return _RELOGIN
+        elif status == 404:
+            entity = None
+        else:
+            _raise_for_status(status, reason, self.default_url + path, response)
+        return entity
+
+    def _conditional(self, method, path, hdict, stream=False):
+        # Return the cached validators for a GET of *path*, and the request
+        # headers with the conditions added.
+        if self.validator_cache is None or method != 'GET' or stream:
+            return None, hdict
+        validators = self.validator_cache.lookup(path)
+        if validators is None:
+            return None, hdict
+        hdict = dict(hdict)
+        hdict.update(self.validator_cache.conditions(validators))
+        return validators, hdict
+
+    def _update_caches(self, method, path, body, status, headers, entity, size):
+        # Update the caches with a response that was read in full.
+        if self.validator_cache is not None:
+            self.validator_cache.update(method, path, status, headers, entity)
+        if self.response_cache is not None:
+            self.response_cache.update(method, path, body, status, entity, size)
+
+    def _annotate_element(self, path, elem):
+        # Add "_href" to an element of the list at *path*.
+        if 'id' in elem:
+            elem['_href'] = '{0}/{1}'.format(path, elem['id'])
+
+    def _send(self, session, method, path, abpath, body, hdict, stream):
+        # Send a request and return the response and its body. If *stream*
+        # is set, the body of a successful JSON response is not read, and
+        # None is returned instead.
+        breaker = self.circuit_breaker
+        governor = self.governor
+        if governor is not None:
+            governor.acquire()
+        # Ask the breaker once the request has a slot, so that a probe is
+        # not held by a request that is still waiting.
+        try:
+            probe = breaker.allow() if breaker is not None else False
+        except Exception:
+            if governor is not None:
+                governor.release(None)
+            raise
+        if self.on_request:
+            self._call_hooks(self.on_request, method, path)
+        tracer = self.tracer
+        if tracer is not None:
+            span = tracer.start('{0} {1}'.format(method, _path_template(path)), path=path)
+        sent = _monotonic()
+        congested = failed = False
+        status = error = None
+        received = 0
+        try:
+            settings, defaults = self._session_settings(session, abpath)
+            req = self._prepare(method, abpath, body, hdict, session.cookies, defaults)
+            try:
+                response = session.send(req, timeout=self.timeout, **settings)
+            except requests.exceptions.Timeout:
+                congested = failed = True
+                raise
+            except requests.exceptions.ConnectionError:
+                failed = True
+                raise
+            status = response.status_code
+            congested = status in ConcurrencyGovernor.congestion_statuses
+            failed = status in CircuitBreaker.failure_statuses
+            if stream and 200 <= status < 300 and \
+                    response.headers.get('Content-Type') == 'application/json':
+                received = int(response.headers.get('Content-Length') or 0)
+                return response, None
+            # Always read the full body and release the connection, so that
+            # it goes back to the pool and is reused for the next request.
+            try:
+                content = response.content
+            finally:
+                response.close()
+            received = len(content)
+            return response, content
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = _monotonic() - sent
+            if governor is not None:
+                governor.release(elapsed, congested)
+            if breaker is not None:
+                breaker.record(failed, probe)
+            if self.on_response:
+                self._call_hooks(self.on_response, method, path, status, elapsed,
+                                 len(body), received, error)
+            if tracer is not None:
+                span.attributes.update(status=status, bytes_sent=len(body),
+                                       bytes_received=received)
+                tracer.finish(span, error)
+
+    def _retrying(self, method, path, attempt, delay, reason, debug):
+        # Log a retry and call the on_retry hooks.
+        if debug:
+            self._logger.debug('retrying in {0:.2f} seconds'.format(delay))
+        if self.on_retry:
+            self._call_hooks(self.on_retry, method, path, attempt, delay, reason)
+
+    def _request(self, method, path, body=b'', headers=None, session=None, stream=False):
+        # The *session* argument is only passed by _login(), for the login
+        # request itself, before the session is published. If *stream* is
+        # set, the body of a successful JSON response is not read, and the
+        # response is returned with an entity of _STREAM. The caller must
+        # then read the body and close the response.
+        rpath, abpath, hdict = self._build_request(path, body, headers)
+        validators, hdict = self._conditional(method, path, hdict, stream)
+        login_session = session
+        policy = self.retry_policy
+        # Formatting the debug messages is not free, so only do it when they
+        # are logged.
+        debug = self._logger.isEnabledFor(logging.DEBUG)
+        start_time = time.time()
+        attempt = 0
+        while True:
+            # Read the generation before the session, so that a concurrent
+            # re-login can only make us re-login once too often, not miss it.
+            generation = self._generation
+            session = login_session or self._connection
+            if session is None and self._autologin \
+                    and (self.have_credentials or self.have_eph_access_token):
+                self._login(generation)
+                generation = self._generation
+                session = self._connection
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve(method, path)
+                if wait:
+                    if debug:
+                        self._logger.debug('rate limited, waiting {0:.2f} seconds'.format(wait))
+                    time.sleep(wait)
             try:
-                self._logger.debug('request: {0} {1}'.format(method, rpath))
-                req = requests.Request(method, abpath, data=body, headers=hdict, cookies=self._connection.cookies).prepare()
-                response = self._connection.send(req, timeout=self.timeout)
+                if debug:
+                    self._logger.debug('request: {0} {1}'.format(method, rpath))
+                response, content = self._send(session, method, path, abpath, body, hdict, stream)
                 status = response.status_code
                 ctype = response.headers.get('Content-Type')
-                if ctype == 'application/json':
-                    entity = response.json()
-                elif ctype == 'text/plain':
-                    entity = response.text
-                else:
-                    entity = None
-                self._logger.debug('response: {0} ({1})'.format(status, ctype))
-                if 200 <= status < 299:
-                    if isinstance(entity, dict) and entity.get('id'):
-                        if response.headers.get('Content-Location'):
-                            href = urlsplit2(response.headers.get('Content-Location')).path
-                        elif response.headers.get('Location'):
-                            href = urlsplit2(response.headers.get('Location')).path
-                        elif method == 'POST':
-                            # missing Location header e.g. with /pubkeys
-                            href = '{0}/{1}'.format(abpath, entity['id'])
-                        else:
-                            href = abpath
-                        entity['_href'] = href[len(self._url.path):]
-                    elif isinstance(entity, list):
-                        for elem in entity:
-                            if 'id' in elem:
-                                elem['_href'] = '{0}/{1}'.format(path, elem['id'])
-                elif 300 <= status < 399:
-                    loc = response.headers.get('Location')
-                    if loc is None:
-                        raise RavelloError('no location for {0} response'.format(status))
-                    if loc.startswith('/'):
-                        rpath = loc
-                    else:
-                        url = urlsplit2(loc)
-                        if url.netloc != self._url.netloc:
-                            raise RavelloError('will not chase referral to {0}'.format(loc))
-                        rpath = url.path
-                elif status == 401:
-                    if path == '/login':
-                        self.close()
-                        response.raise_for_status()
-                    elif self._autologin:
-                        if not self.retries:
-                            response.raise_for_status()
-                        self._login()
-                        retries += 1
-                        continue
-                elif status == 404:
-                    entity = None
-                else:
-                    response.raise_for_status()
-                response.entity = entity
-            except (requests.exceptions.Timeout, ValueError) as e:
-                self._logger.debug('error: {0!s}'.format(e))
-                self.close()
-                if not _idempotent(method) or not self.retries:
-                    self._logger.debug('not retrying {0} request'.format(method))
-                    raise e
-                retries += 1
+                if content is None:
+                    if debug:
+                        self._logger.debug('response: {0} ({1}), streaming'.format(status, ctype))
+                    response.entity = _STREAM
+                    return response
+                if validators is not None and status == 304:
+                    if debug:
+                        self._logger.debug('response: 304, using cached entity')
+                    response.entity = self.validator_cache.hit(path, validators)
+                    return response
+                entity = self._parse_entity(ctype, content)
+                if debug:
+                    self._logger.debug('response: {0} ({1})'.format(status, ctype))
+            except policy.exceptions as e:
+                # The connection pool discards the failed connection. The
+                # session itself stays usable, and may be in use by other
+                # threads, so it is not closed here.
+                if debug:
+                    self._logger.debug('error: {0!s}'.format(e))
+                if not policy.retry_exception(method, e):
+                    if debug:
+                        self._logger.debug('not retrying {0} request'.format(method))
+                    raise
+                delay = policy.delay(attempt, time.time() - start_time)
+                if delay is None:
+                    raise RavelloError('maximum number of retries reached')
+                self._retrying(method, path, attempt, delay, e, debug)
+                time.sleep(delay)
+                attempt += 1
                 continue
-            break
-        if retries > self.retries:
-            raise RavelloError('maximum number of retries reached')
-        return response
+            if policy.retry_status(method, status):
+                delay = policy.delay(attempt, time.time() - start_time, response.headers)
+                if delay is not None:
+                    self._retrying(method, path, attempt, delay, status, debug)
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+            entity = self._check_response(method, path, status, response.reason,
+                                          response.headers, entity,
+                                          login_session is None, response)
+            if entity is _RELOGIN:
+                if attempt >= policy.retries:
+                    raise RavelloError('maximum number of retries reached')
+                self._retrying(method, path, attempt, 0, status, debug)
+                self._login(generation)
+                attempt += 1
+                continue
+            if not stream:
+                self._update_caches(method, path, body, status, response.headers, entity,
+                                    len(content))
+            response.entity = entity
+            return response
 
     def reload(self, obj):
         """Reload the object *obj*.
@@ -466,7 +2965,16 @@ class RavelloClient(object):
         href = obj.get('_href')
         if href is None:
             raise RuntimeError('obj must have an "_href" key')
-        return self.request('GET', href)
+        return self.request('GET', href, cache=False)
+
+    @property
+    def poller(self):
+        """The :class:`Poller` of this client, which is created on first
+        use."""
+        with self._login_lock:
+            if self._poller is None:
+                self._poller = Poller(self)
+            return self._poller
 
     def wait_for(self, obj, cond, timeout=None):
         """Wait for a condition on *obj* to become true.
@@ -484,40 +2992,211 @@ class RavelloClient(object):
         constructor.
 
         If the condition does not become true before the timeout, a
-        :class:`RavelloError` exception is raised.
+        :class:`RavelloError` exception is raised. Otherwise the reloaded
+        object is returned.
+
+        The condition is checked by the :attr:`poller`, together with the
+        conditions that other threads are waiting for. Use
+        :meth:`Poller.watch` to wait for many conditions without blocking.
+        The object is reloaded every :attr:`Poller.interval` seconds at
+        first, and less often while it does not change, up to
+        :attr:`Poller.max_interval` seconds. Earlier versions reloaded the
+        object every 5 seconds and returned None.
         """
-        end_time = time.time() + timeout
-        while end_time > time.time():
-            obj = self.reload(obj)
-            if _match_filter(obj, cond):
-                break
-            time.sleep(5)
-        if end_time < time.time():
-            raise RavelloError('timeout waiting for condition')
+        return self.poller.watch(obj, cond, timeout).result()
+
+    def _wait_for_state(self, app, state):
+        # Return a future for all VMs of *app* to be in *state*. The VMs
+        # are not in the list entries, but their count of active VMs is,
+        # which rules out one of the states.
+        href = '/applications/{0}'.format(app)
+        def listed(entry):
+            active = (entry.get('deployment') or {}).get('totalActiveVms')
+            if active is None or state not in ('STARTED', 'STOPPED'):
+                return True
+            return active > 0 if state == 'STARTED' else active == 0
+        return self.poller.watch({'_href': href},
+                                 lambda obj: application_state(obj) == state, listed=listed)
+
+    def batch(self, calls, max_workers=None, progress=None):
+        """Run many API calls concurrently.
+
+        The *calls* parameter must be a sequence of calls. A call is a
+        ``(method, args)`` or ``(method, args, kwargs)`` tuple, where
+        *method* is the name of a method of this client, e.g.
+        ``('start_application', (app,))``.
+
+        The calls are run by a pool of *max_workers* threads, which defaults
+        to :attr:`default_batch_workers`, or to the maximum of the governor
+        if the client has one. The connection pool should be at least this
+        large, see the *pool_maxsize* argument to the constructor.
+
+        The return value is a list with a :class:`BatchResult` for each
+        call, in the same order as *calls*. A call that fails does not stop
+        the others; its exception is stored in the result instead.
+
+        If *progress* is provided, it is called as ``progress(done, total)``
+        each time a call completes.
+        """
+        calls = list(calls)
+        results = [None] * len(calls)
+        if not calls:
+            return results
+        pending = queue.Queue()
+        finished = queue.Queue()
+        for index, call in enumerate(calls):
+            pending.put((index, call))
+        tracer = self.tracer
+        parent = tracer.current() if tracer is not None else None
+        def worker():
+            if tracer is not None:
+                tracer.activate(parent)
+            while True:
+                try:
+                    index, call = pending.get_nowait()
+                except queue.Empty:
+                    return
+                method, args, kwargs = _split_call(call)
+                try:
+                    value = getattr(self, method)(*args, **kwargs)
+                except Exception as e:
+                    self._logger.debug('batch: {0}() failed: {1!s}'.format(method, e))
+                    result = BatchResult(call, None, e)
+                else:
+                    result = BatchResult(call, value, None)
+                finished.put((index, result))
+        nworkers = min(max_workers or self._batch_workers(), len(calls))
+        threads = [threading.Thread(target=worker) for i in range(nworkers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for done in range(1, len(calls)+1):
+            index, result = finished.get()
+            results[index] = result
+            if progress is not None:
+                progress(done, len(calls))
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _batch_workers(self):
+        # The default number of concurrent calls in batch().
+        if self.governor is not None:
+            return self.governor.maximum
+        return self.default_batch_workers
+
+    def map(self, method, args, max_workers=None, progress=None):
+        """Call *method* once for every element of *args*, concurrently.
+
+        The *method* parameter is the name of a method of this client. Each
+        element of *args* is a tuple with the arguments for one call, or a
+        single argument. For example::
+
+            client.map('set_application_expiration', [(app, req) for app in apps])
+
+        See :meth:`batch` for the other arguments and the return value.
+        """
+        calls = [(method, arg if isinstance(arg, tuple) else (arg,)) for arg in args]
+        return self.batch(calls, max_workers, progress)
+
+    def _list(self, path, filter=None):
+        # Return the list of objects at *path*, optionally filtered. This is
+        # used by all the mapped "get all" calls that accept a filter.
+        method, rpath, criteria = self._list_request(path, filter)
+        try:
+            objs = self.request(method, rpath, criteria)
+        except requests.HTTPError as e:
+            if rpath == path or not _filter_rejected(e):
+                raise
+            objs = None
+        if rpath != path:
+            if objs is None:
+                self._unfiltered_paths.add(path)
+                return self._list(path, filter)
+            self._annotate_list(path, objs)
+        if filter is not None:
+            objs = _match_filter(objs, filter)
+        if self.compact and objs:
+            objs = [Record(obj, path) for obj in objs]
+        return objs
+
+    def _list_request(self, path, filter):
+        # Return the method, path and entity of the request for the list at
+        # *path*: a filter call if the API can evaluate part of *filter*. A
+        # filter call that is not found or is rejected is not tried again for
+        # *path*.
+        if self.server_filters and path in self.filter_paths and \
+                path not in self._unfiltered_paths:
+            criteria = _compile_criteria(filter)
+            if criteria is not None:
+                return 'POST', path + '/filter', criteria
+        return 'GET', path, None
+
+    def _annotate_list(self, path, objs):
+        # Annotate the result of a filter call with the "_href" of the
+        # objects in the list at *path*.
+        for elem in objs:
+            self._annotate_element(path, elem)
+
+    def _iter(self, path, filter=None):
+        # Iterate over the list of objects at *path*, optionally filtered.
+        # The response is parsed as it comes in, so that only one object is
+        # in memory at a time. This is used by the mapped "iter" calls.
+        method, rpath, criteria = self._list_request(path, filter)
+        body = self._encode_entity(criteria)
+        try:
+            response = self._request(method, rpath, body, stream=True)
+        except requests.HTTPError as e:
+            if rpath == path or not _filter_rejected(e):
+                raise
+            response = None
+        if rpath != path and (response is None or response.entity is None):
+            self._unfiltered_paths.add(path)
+            for elem in self._iter(path, filter):
+                yield elem
+            return
+        match = compile_filter(filter) if filter is not None else None
+        if response.entity is not _STREAM:
+            if rpath != path:
+                self._annotate_list(path, response.entity)
+            for elem in response.entity or []:
+                if match is None or match(elem):
+                    yield Record(elem, path) if self.compact else elem
+            return
+        try:
+            parser = _JSONArrayParser(self.codec)
+            for chunk in response.iter_content(self._stream_chunk_size):
+                for elem in parser.feed(chunk):
+                    if not self.compact:
+                        self._annotate_element(path, elem)
+                    if match is None or match(elem):
+                        yield Record(elem, path) if self.compact else elem
+            parser.feed(b'', True)
+        finally:
+            response.close()
 
     # Mapped API calls below
 
-    def get_application_by_name(self, app_name, aspect=None):
-      
-        criteria = dict()
-        criteria['type'] = 'COMPLEX'
-        criteria['operator'] = 'And'
-        criteria['criteria'] = [1]
-        
-        criterion = dict()
-        criterion['type'] = 'SIMPLE'
-        criterion['operator'] = 'Equals'
-        criterion['propertyName'] = 'name'
-        criterion['operand'] = app_name
-        criteria['criteria'][0] = criterion
-         
-        apps = self.request('POST', '/applications/filter',criteria)
+    def get_application_by_name(self, app_name, aspect=None, lazy=False):
+        """Return the application named *app_name*.
+
+        The application is found with a filter call, and then loaded with
+        :meth:`get_application` and *aspect*, unless *aspect* is
+        "properties". If *lazy* is true, the properties returned by the
+        filter call are wrapped in an :class:`Application` instead, which
+        loads the other aspects when they are accessed.
+        """
+        criteria = _compile_criteria({'name': app_name})
+        apps = self.request('POST', '/applications/filter', criteria)
         if len(apps) == 0:
             raise RavelloError('app "{0}" not found'.format(app_name))
         if len(apps) > 1:
             raise RavelloError('multiple apps for name "{0}" found'.format(app_name))
+        self._annotate_list('/applications', apps)
         app = apps[0]
-        if aspect is not 'properties':
+        if lazy:
+            return Application(self, app)
+        if aspect != 'properties':
             app = self.get_application(app,aspect)
         return app
     
@@ -527,7 +3206,7 @@ class RavelloClient(object):
         The *aspect* parameter can be used to return the application only with
         the specified aspect (e.g., design, deployment, properties).
         """
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         if aspect is not None:
             app = '{0};{1}'.format(app, aspect)
         return self.request('GET', '/applications/{0}'.format(app))
@@ -538,10 +3217,16 @@ class RavelloClient(object):
         applications. See the description of the *cond* argument to
         :meth:`wait_for`.
         """
-        apps = self.request('GET', '/applications')
-        if filter is not None:
-            apps = _match_filter(apps, filter)
-        return apps
+        return self._list('/applications', filter)
+
+    def iter_applications(self, filter=None):
+        """Iterate over all applications.
+
+        Unlike :meth:`get_applications`, the response is parsed incrementally, and
+        only one object at a time is kept in memory. The *filter* argument
+        works as with :meth:`get_applications`.
+        """
+        return self._iter('/applications', filter)
 
     def create_application(self, app):
         """Create a new application.
@@ -579,7 +3264,7 @@ class RavelloClient(object):
 
     def delete_application(self, app):
         """Delete an application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         self.request('DELETE', '/applications/{0}'.format(app))
 
     def publish_application(self, app, req={"optimizationLevel":"COST_OPTIMIZED"}):
@@ -588,27 +3273,37 @@ class RavelloClient(object):
         The *req* parameter, if provided, must be a dict with publish
         parameters.
         """
-        if isinstance(app, dict):
+        if isinstance(app, _objects):
             app = app['id']
         self.request('POST', '/applications/{0}/publish'.format(app), req)
 
-    def start_application(self, app, req=None):
+    def start_application(self, app, req=None, wait=False):
         """Start the application with ID *app*.
 
         The *req* parameter, if provided, must be a dict with start
         parameters.
+
+        If *wait* is true, a :class:`concurrent.futures.Future` is returned
+        that completes when all VMs are started. See :meth:`Poller.watch`.
         """
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         self.request('POST', '/applications/{0}/start'.format(app), req)
+        if wait:
+            return self._wait_for_state(app, 'STARTED')
 
-    def stop_application(self, app, req=None):
+    def stop_application(self, app, req=None, wait=False):
         """Stop the application with ID *app*.
 
         The *req* parameter, if provided, must be a dict with stop
         parameters.
+
+        If *wait* is true, a :class:`concurrent.futures.Future` is returned
+        that completes when all VMs are stopped. See :meth:`Poller.watch`.
         """
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         self.request('POST', '/applications/{0}/stop'.format(app), req)
+        if wait:
+            return self._wait_for_state(app, 'STOPPED')
 
     def restart_application(self, app, req=None):
         """Restart the application with ID *app*.
@@ -616,12 +3311,12 @@ class RavelloClient(object):
         The *req* parameter, if provided, must be a dict with restart
         parameters.
         """
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         self.request('POST', '/applications/{0}/restart'.format(app), req)
 
     def publish_application_updates(self, app, autostart=True):
         """Publish updates for the application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         url = '/applications/{0}/publishUpdates'.format(app)
         if not autostart:
             url += '?startAllDraftVms=false'
@@ -632,18 +3327,18 @@ class RavelloClient(object):
 
         The *req* parameter must be a dict describing the new expiration.
         """
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         self.request('POST', '/applications/{0}/setExpiration'.format(app), req)
 
     def get_application_publish_locations(self, app, req=None):
         """Get a list of locations where *app* can be published."""
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         url = '/applications/{0}/publishLocations'.format(app)
         return self.request('GET', url, req)
 
     def get_blueprint_publish_locations(self, bp, req=None):
         """Get a list of locations where *bp* can be published."""
-        if isinstance(bp, dict): bp = bp['id']
+        if isinstance(bp, _objects): bp = bp['id']
         url = '/blueprints/{0}/publishLocations'.format(bp)
         return self.request('GET', url, req)
 
@@ -654,8 +3349,8 @@ class RavelloClient(object):
         The *aspect* parameter (design, deployment) can be used to return
         the vm as designed or as deployed in the cloud.
         """
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         if aspect is not None:
             app = '{0};{1}'.format(app, aspect)
         return self.request('GET', '/applications/{0}/vms/{1}'.format(app, vm))
@@ -667,58 +3362,65 @@ class RavelloClient(object):
         applications. See the description of the *cond* argument to
         :meth:`wait_for`.
         """
-        if isinstance(app, dict): app = app['id']
-        apps = self.request('GET', '/applications/{0};{1}/vms'.format(app,level))
-        if filter is not None:
-            apps = _match_filter(apps, filter)
-        return apps
+        if isinstance(app, _objects): app = app['id']
+        return self._list('/applications/{0};{1}/vms'.format(app,level), filter)
+
+    def iter_vms(self, app, filter=None, level='design'):
+        """Iterate over all vms (for a given app).
+
+        Unlike :meth:`get_vms`, the response is parsed incrementally, and
+        only one object at a time is kept in memory. The *filter* argument
+        works as with :meth:`get_vms`.
+        """
+        if isinstance(app, _objects): app = app['id']
+        return self._iter('/applications/{0};{1}/vms'.format(app,level), filter)
 
     def start_vm(self, app, vm):
         """Start the VM with ID *vm* in the application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         self.request('POST', '/applications/{0}/vms/{1}/start'.format(app, vm))
 
     def stop_vm(self, app, vm):
         """Stop the VM with ID *vm* in the application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         self.request('POST', '/applications/{0}/vms/{1}/stop'.format(app, vm))
 
     def poweroff_vm(self, app, vm):
         """Power off the VM with ID *vm* in the application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         self.request('POST', '/applications/{0}/vms/{1}/poweroff'.format(app, vm))
 
     def restart_vm(self, app, vm):
         """Restart the VM with ID *vm* in the application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         self.request('POST', '/applications/{0}/vms/{1}/restart'.format(app, vm))
 
     def redeploy_vm(self, app, vm):
         """Redeploy the VM with ID *vm* in the application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         self.request('POST', '/applications/{0}/vms/{1}/redeploy'.format(app, vm))
 
     def repair_vm(self, app, vm):
         """Repair the VM with ID *vm* in the application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         self.request('POST', '/applications/{0}/vms/{1}/repair'.format(app, vm))
 
     def reset_disks_vm(self, app, vm):
         """Resets each disk of the VM with ID *vm* in the application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         self.request('POST', '/applications/{0}/vms/{1}/resetDisks'.format(app, vm))
 
     def get_vnc_url(self, app, vm):
         """Get the VNC URL for the VM with ID *vm* in the application with ID *app*."""
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         headers = [('Accept', 'text/plain')]
         url = self.request('GET', '/applications/{0}/vms/{1}/vncUrl'.format(app, vm),
                            headers=headers)
@@ -734,7 +3436,7 @@ class RavelloClient(object):
         with the deployment optimizationLevel when querying for a design pricing.
         See the REST API docs for details on possible values.
         """
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         if mode =='design' and deployment_options == {}:
             raise RavelloError("Cannot query for detailed application charges with mode=design and no deployment_options")
         return self.request('POST', '/applications/{0}/calcPrice;{1}'.format(app, mode), deployment_options)
@@ -744,8 +3446,8 @@ class RavelloClient(object):
         *app* is the applicaiton/application-id of the VM
         *vm* is the VM/VM-id we're querying for
         """
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         return self.request('GET', '/applications/{0}/vms/{1}/fqdn;deployment'.format(app,vm))
 
     def get_vm_state(self, app, vm):
@@ -753,8 +3455,8 @@ class RavelloClient(object):
         *app* is the applicaiton/application-id of the VM
         *vm* is the VM/VM-id we're querying for
         """
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         return self.request('GET', '/applications/{0}/vms/{1}/state;deployment'.format(app,vm))
 
     def get_vm_public_ips(self, app, vm):
@@ -762,13 +3464,13 @@ class RavelloClient(object):
         *app* is the applicaiton/application-id of the VM
         *vm* is the VM/VM-id we're querying for
         """
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         return self.request('GET', '/applications/{0}/vms/{1}/publicIps;deployment'.format(app,vm))
 
     def is_application_published(self, app):
         """Is the application *app* published or draft?"""
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         return self.request('GET', '/applications/{0}/isPublished'.format(app))
 
     def add_library_vm_to_application(self, app, library_vm_id):
@@ -776,7 +3478,7 @@ class RavelloClient(object):
         *app* the application (object or ID) to add the library VM to
         *library_vm_id* the ID of the Library VM to add to the application
         """
-        if isinstance(app, dict): app = app['id']
+        if isinstance(app, _objects): app = app['id']
         return self.request('POST', '/applications/{0}/vms'.format(app), {'baseVmId':library_vm_id})
 
     def delete_vm_from_application(self, app, vm):
@@ -784,13 +3486,13 @@ class RavelloClient(object):
         *app* the application (object or ID) to delete the library VM from
         *vm* the VM to delete from the application
         """
-        if isinstance(app, dict): app = app['id']
-        if isinstance(vm, dict): vm = vm['id']
+        if isinstance(app, _objects): app = app['id']
+        if isinstance(vm, _objects): vm = vm['id']
         return self.request('DELETE', '/applications/{0}/vms/{1}'.format(app, vm))
 
     def get_blueprint(self, bp):
         """Return the blueprint with ID *bp*, or None if it does not exist."""
-        if isinstance(bp, dict): bp = bp['id']
+        if isinstance(bp, _objects): bp = bp['id']
         return self.request('GET', '/blueprints/{0}'.format(bp))
 
     def get_blueprints(self, filter=None):
@@ -800,10 +3502,16 @@ class RavelloClient(object):
         applications. See the description of the *cond* argument to
         :meth:`wait_for`.
         """
-        bps = self.request('GET', '/blueprints')
-        if filter is not None:
-            bps = _match_filter(bps, filter)
-        return bps
+        return self._list('/blueprints', filter)
+
+    def iter_blueprints(self, filter=None):
+        """Iterate over all blueprints.
+
+        Unlike :meth:`get_blueprints`, the response is parsed incrementally, and
+        only one object at a time is kept in memory. The *filter* argument
+        works as with :meth:`get_blueprints`.
+        """
+        return self._iter('/blueprints', filter)
 
     def create_blueprint(self, bp):
         """Create a new blueprint.
@@ -817,7 +3525,7 @@ class RavelloClient(object):
 
     def delete_blueprint(self, bp):
         """Delete the blueprint with ID *bp*."""
-        if isinstance(bp, dict): bp = bp['id']
+        if isinstance(bp, _objects): bp = bp['id']
         self.request('DELETE', '/blueprints/{0}'.format(bp))
 
     def get_detailed_charges_for_blueprint(self, bp, deployment_options = {}):
@@ -827,14 +3535,14 @@ class RavelloClient(object):
         with the deployment optimizationLevel when querying for a design pricing.
         See the REST API docs for details on possible values.
         """
-        if isinstance(bp, dict): bp = bp['id']
+        if isinstance(bp, _objects): bp = bp['id']
         if 'optimizationLevel' not in deployment_options:
             raise RavelloError("Cannot query for detailed blueprint charges with no optimizationLevel specified in deployment_options")
         return self.request('POST', '/blueprints/{0}/calcPrice'.format(bp), deployment_options)
 
     def get_image(self, img):
         """Return the image with ID *img*, or None if it does not exist."""
-        if isinstance(img, dict): img = img['id']
+        if isinstance(img, _objects): img = img['id']
         return self.request('GET', '/images/{0}'.format(img))
 
     def get_images(self, filter=None):
@@ -844,10 +3552,16 @@ class RavelloClient(object):
         images. See the description of the *cond* argument to
         :meth:`wait_for`.
         """
-        imgs = self.request('GET', '/images')
-        if filter is not None:
-            imgs = _match_filter(imgs, filter)
-        return imgs
+        return self._list('/images', filter)
+
+    def iter_images(self, filter=None):
+        """Iterate over all images.
+
+        Unlike :meth:`get_images`, the response is parsed incrementally, and
+        only one object at a time is kept in memory. The *filter* argument
+        works as with :meth:`get_images`.
+        """
+        return self._iter('/images', filter)
 
     def create_image(self, image):
         """Create a new image.
@@ -868,12 +3582,12 @@ class RavelloClient(object):
 
     def delete_image(self, img):
         """Delete the image with ID *img*."""
-        if isinstance(img, dict): img = img['id']
+        if isinstance(img, _objects): img = img['id']
         self.request('DELETE', '/images/{0}'.format(img))
 
     def get_diskimage(self, img):
         """Return the disk image with ID *img*, or None if it does not exist."""
-        if isinstance(img, dict): img = img['id']
+        if isinstance(img, _objects): img = img['id']
         return self.request('GET', '/diskImages/{0}'.format(img))
 
     def get_diskimages(self, filter=None):
@@ -883,10 +3597,16 @@ class RavelloClient(object):
         disk images. See the description of the *cond* argument to
         :meth:`wait_for`.
         """
-        imgs = self.request('GET', '/diskImages')
-        if filter is not None:
-            imgs = _match_filter(imgs, filter)
-        return imgs
+        return self._list('/diskImages', filter)
+
+    def iter_diskimages(self, filter=None):
+        """Iterate over all disk images.
+
+        Unlike :meth:`get_diskimages`, the response is parsed incrementally, and
+        only one object at a time is kept in memory. The *filter* argument
+        works as with :meth:`get_diskimages`.
+        """
+        return self._iter('/diskImages', filter)
 
     def create_diskimage(self, img):
         """Create a new disk image.
@@ -907,12 +3627,12 @@ class RavelloClient(object):
 
     def delete_diskimage(self, img):
         """Delete the image with ID *img*."""
-        if isinstance(img, dict): img = img['id']
+        if isinstance(img, _objects): img = img['id']
         self.request('DELETE', '/diskImages/{0}'.format(img))
 
     def get_keypair(self, kp):
         """Return the keypair with ID *kp*, or None if it does not exist."""
-        if isinstance(kp, dict): kp = kp['id']
+        if isinstance(kp, _objects): kp = kp['id']
         return self.request('GET', '/keypairs/{0}'.format(kp))
 
     def get_keypairs(self, filter=None):
@@ -922,10 +3642,16 @@ class RavelloClient(object):
         keypairs.  See the description of the *cond* argument to
         :meth:`wait_for`.
         """
-        kps = self.request('GET', '/keypairs')
-        if filter is not None:
-            kps = _match_filter(kps, filter)
-        return kps
+        return self._list('/keypairs', filter)
+
+    def iter_keypairs(self, filter=None):
+        """Iterate over all keypairs.
+
+        Unlike :meth:`get_keypairs`, the response is parsed incrementally, and
+        only one object at a time is kept in memory. The *filter* argument
+        works as with :meth:`get_keypairs`.
+        """
+        return self._iter('/keypairs', filter)
 
     def create_keypair(self, kp):
         """Create a new keypair.
@@ -946,7 +3672,7 @@ class RavelloClient(object):
 
     def delete_keypair(self, kp):
         """Delete the keypair with ID *kp*."""
-        if isinstance(kp, dict): kp = kp['id']
+        if isinstance(kp, _objects): kp = kp['id']
         self.request('DELETE', '/keypairs/{0}'.format(kp))
 
     def generate_keypair(self):
@@ -955,7 +3681,7 @@ class RavelloClient(object):
 
     def get_user(self, user):
         """Return the user with ID *user*, or None if it does not exist."""
-        if isinstance(user, dict): user = user['id']
+        if isinstance(user, _objects): user = user['id']
         return self.request('GET', '/users/{0}'.format(user))
 
     def get_users(self, filter=None):
@@ -964,10 +3690,16 @@ class RavelloClient(object):
         The *filter* argument can be used to return only a subset of the
         users. See the description of the *cond* argument to :meth:`wait_for`.
         """
-        users = self.request('GET', '/users')
-        if filter is not None:
-            users = _match_filter(users, filter)
-        return users
+        return self._list('/users', filter)
+
+    def iter_users(self, filter=None):
+        """Iterate over all users.
+
+        Unlike :meth:`get_users`, the response is parsed incrementally, and
+        only one object at a time is kept in memory. The *filter* argument
+        works as with :meth:`get_users`.
+        """
+        return self._iter('/users', filter)
 
     def invite_user(self, user):
         """Invite a new user.
@@ -993,7 +3725,7 @@ class RavelloClient(object):
 
     def delete_user(self, user):
         """Delete a user with ID *user*."""
-        if isinstance(user, dict): user = user['id']
+        if isinstance(user, _objects): user = user['id']
         self.request('DELETE', '/users/{0}'.format(user))
 
     def changepw_user(self, passwords, user):
@@ -1012,10 +3744,17 @@ class RavelloClient(object):
         applications. See the description of the *cond* argument to
         :meth:`wait_for`.
         """
-        billing = self.request('GET', '/billing')
-        if filter is not None:
-            billing = _match_filter(billing, filter)
-        return billing
+        return self._list('/billing', filter)
+
+    def iter_billing(self, filter=None):
+        """Iterate over all applications' charges incurred since
+        beginning of the month.
+
+        Unlike :meth:`get_billing`, the response is parsed incrementally, and
+        only one object at a time is kept in memory. The *filter* argument
+        works as with :meth:`get_billing`.
+        """
+        return self._iter('/billing', filter)
 
     def get_billing_for_month(self, year, month):
         """Return a list with all applications' charges incurred during the
@@ -1066,7 +3805,7 @@ class RavelloClient(object):
         The *org* parameter can be used to instead return details according to
         organization ID.
         """
-        if isinstance(org, dict): org = org['id']
+        if isinstance(org, _objects): org = org['id']
         if org is None:
             org = ''
         else:
@@ -1086,7 +3825,7 @@ class RavelloClient(object):
 
     def get_permgroup(self, pg):
         """Return the permission group with ID *pg*, or None if it does not exist."""
-        if isinstance(pg, dict): pg = pg['id']
+        if isinstance(pg, _objects): pg = pg['id']
         return self.request('GET', '/permissionsGroups/{0}'.format(pg))
 
     def get_permgroups(self, filter=None):
@@ -1096,10 +3835,16 @@ class RavelloClient(object):
         permission groups. See the description of the *cond* argument to
         :meth:`wait_for`.
         """
-        pgs = self.request('GET', '/permissionsGroups')
-        if filter is not None:
-            pgs = _match_filter(pgs, filter)
-        return pgs
+        return self._list('/permissionsGroups', filter)
+
+    def iter_permgroups(self, filter=None):
+        """Iterate over all permission groups.
+
+        Unlike :meth:`get_permgroups`, the response is parsed incrementally, and
+        only one object at a time is kept in memory. The *filter* argument
+        works as with :meth:`get_permgroups`.
+        """
+        return self._iter('/permissionsGroups', filter)
 
     def create_permgroup(self, pg):
         """Create a new permission group.
@@ -1125,12 +3870,12 @@ class RavelloClient(object):
 
     def delete_permgroup(self, pg):
         """Delete a permission group with ID *pg*."""
-        if isinstance(pg, dict): pg = pg['id']
+        if isinstance(pg, _objects): pg = pg['id']
         self.request('DELETE', '/permissionsGroups/{0}'.format(pg))
 
     def get_users_in_permgroup(self, pg):
         """List all of the users in a permission group."""
-        if isinstance(pg, dict): pg = pg['id']
+        if isinstance(pg, _objects): pg = pg['id']
         return self.request('GET', '/permissionsGroups/{0}/users'.format(pg))
 
     def add_user_to_permgroup(self, pg, user):
@@ -1138,7 +3883,7 @@ class RavelloClient(object):
 
         The *user* parameter must be a valid user id.
         """
-        if isinstance(pg, dict): pg = pg['id']
+        if isinstance(pg, _objects): pg = pg['id']
         req = {'userId': user}
         return self.request('POST', '/permissionsGroups/{0}/users'.format(pg), req)
 
@@ -1147,7 +3892,7 @@ class RavelloClient(object):
 
         The *user* parameter must be a valid user id.
         """
-        if isinstance(pg, dict): pg = pg['id']
+        if isinstance(pg, _objects): pg = pg['id']
         return self.request('DELETE', '/permissionsGroups/{0}/users/{1}'.format(pg, user))
 
     def get_permgroup_descriptors(self):
@@ -1187,7 +3932,7 @@ class RavelloClient(object):
         
         The *task_details* parameter is a dict describing the task to schedule
         """
-        if isinstance(application, dict): application = application['id']
+        if isinstance(application, _objects): application = application['id']
         return self.request('POST', '/applications/{0}/tasks'.format(application), task_details)
 
     def update_application_task(self, application, task, task_details):
@@ -1196,31 +3941,31 @@ class RavelloClient(object):
         The *task* parameter is the ID of the task to update
         The *task_details* parameter is a dict describing the task to schedule
         """
-        if isinstance(application, dict): application = application['id']
-        if isinstance(task, dict): task = task['id']
+        if isinstance(application, _objects): application = application['id']
+        if isinstance(task, _objects): task = task['id']
         
         return self.request('PUT', '/applications/{0}/tasks/{1}'.format(application ,task), task_details)
 
     def get_application_tasks(self, application):
         """Return a list of the application's scheduled tasks"""
-        if isinstance(application, dict): application = application['id']
+        if isinstance(application, _objects): application = application['id']
         return self.request('GET', '/applications/{0}/tasks'.format(application))
 
     def get_application_task(self, application, task):
         """Return a specific application's scheduled task"""
-        if isinstance(application, dict): application = application['id']
-        if isinstance(task, dict): task = task['id']
+        if isinstance(application, _objects): application = application['id']
+        if isinstance(task, _objects): task = task['id']
         return self.request('GET', '/applications/{0}/tasks/{1}'.format(application, task))
 
     def delete_application_task(self, application, task):
         """Delete a specific application's scheduled task"""
-        if isinstance(application, dict): application = application['id']
-        if isinstance(task, dict): task = task['id']
+        if isinstance(application, _objects): application = application['id']
+        if isinstance(task, _objects): task = task['id']
         return self.request('DELETE', '/applications/{0}/tasks/{1}'.format(application, task))
 
     def delete_application_tasks(self, application):
         """Delete all scheduled tasks of an application"""
-        if isinstance(application, dict): application = application['id']
+        if isinstance(application, _objects): application = application['id']
         return self.request('DELETE', '/applications/{0}/tasks'.format(application))
 
     def get_ephemeral_access_tokens(self):
@@ -1229,7 +3974,7 @@ class RavelloClient(object):
 
     def get_ephemeral_access_token(self, token):
         """Return a specific ephemeral access token"""
-        if isinstance(token, dict): token = token['id']
+        if isinstance(token, _objects): token = token['id']
         return self.request('GET', '/ephemeralAccessTokens/{0}'.format(token))
 
     def create_ephemeral_access_token(self, token_details):
@@ -1247,21 +3992,21 @@ class RavelloClient(object):
         The *token* parameter is the ID of the token to update
         The *token_details* parameter is a dict describing the updated token details
         """
-        if isinstance(token, dict): token = token['id']
+        if isinstance(token, _objects): token = token['id']
         return self.request('PUT', '/ephemeralAccessTokens/{0}'.format(token), token_details)
 
     def delete_ephemeral_access_token(self, token):
         """Deletes an existing ephemeral access token.
         The *token* parameter is the ID of the token to delete
         """
-        if isinstance(token, dict): token = token['id']
+        if isinstance(token, _objects): token = token['id']
         return self.request('DELETE', '/ephemeralAccessTokens/{0}'.format(token))
 
     def get_community(self, community):
         """Retrieves an existing community.
         The *community* parameter is the ID of the community to retrieve
         """
-        if isinstance(community, dict): community = community['id']
+        if isinstance(community, _objects): community = community['id']
         return self.request('GET', '/communities/{0}'.format(community))
 
     def get_communities(self):
@@ -1280,7 +4025,7 @@ class RavelloClient(object):
         """Retrieves an existing cost bucket.
         The *cost_bucket* parameter is the ID of the cost bucket to retrieve
         """
-        if isinstance(cost_bucket, dict): cost_bucket = cost_bucket['id']
+        if isinstance(cost_bucket, _objects): cost_bucket = cost_bucket['id']
         return self.request('GET', '/costBuckets/{0}'.format(cost_bucket))
 
     def create_cost_bucket(self, cost_bucket_details):
@@ -1297,7 +4042,7 @@ class RavelloClient(object):
         The *cost_bucket* parameter is the ID of the cost bucket to update
         The *cost_bucket_details* parameter is a dict describing the cost bucket details
         """
-        if isinstance(cost_bucket, dict): cost_bucket = cost_bucket['id']
+        if isinstance(cost_bucket, _objects): cost_bucket = cost_bucket['id']
         return self.request('PUT', '/costBuckets/{0}'.format(cost_bucket), cost_bucket_details)
 
     def associate_resource_to_cost_bucket(self, cost_bucket, resource_details):
@@ -1305,7 +4050,7 @@ class RavelloClient(object):
         The *cost_bucket* parameter is the ID of the cost bucket the resource will be associated to
         The *resource_details* parameter is a dict describing the resource to associate details
         """
-        if isinstance(cost_bucket, dict): cost_bucket = cost_bucket['id']
+        if isinstance(cost_bucket, _objects): cost_bucket = cost_bucket['id']
         return self.request('PUT', '/costBuckets/{0}/associateResource'.format(cost_bucket), resource_details)
 
     def describe_cost_bucket(self):
@@ -1317,14 +4062,15 @@ class RavelloClient(object):
         """Returns a single cost alert definition according to its ID.
         The *cost_alert_definition* parameter is the ID of the cost alert definition to retrieve
         """
-        if isinstance(cost_alert_definition, dict): cost_alert_definition = cost_alert_definition['id']
+        if isinstance(cost_alert_definition, _objects):
+            cost_alert_definition = cost_alert_definition['id']
         return self.request('GET', '/costAlertDefinitions/{0}'.format(cost_alert_definition))
 
     def get_cost_alert_definitions(self, cost_bucket):
         """Retrieves all the cost alert definitions for an existing cost bucket.
         The *cost_bucket* parameter is the ID of the cost bucket to retrieve
         """
-        if isinstance(cost_bucket, dict): cost_bucket = cost_bucket['id']
+        if isinstance(cost_bucket, _objects): cost_bucket = cost_bucket['id']
         return self.request('GET', '/costBuckets/{0}/costAlertDefinitions'.format(cost_bucket))
 
     def create_cost_alert_definition(self, cost_alert_definition_details):
@@ -1348,21 +4094,24 @@ class RavelloClient(object):
         The *cost_alert_definition* parameter is the ID of the cost alert definition to update
         The *cost_alert_definition_details* parameter is a dict describing the cost alert definition to update.
         """
-        if isinstance(cost_alert_definition, dict): cost_alert_definition = cost_alert_definition['id']
+        if isinstance(cost_alert_definition, _objects):
+            cost_alert_definition = cost_alert_definition['id']
         return self.request('PUT', '/costAlertDefinitions/{0}'.format(cost_alert_definition), cost_alert_definition_details)
 
     def delete_cost_alert_definition(self, cost_alert_definition):
         """Deletes a cost alert definition. The user should have the following permissions in order to complete this operation: DELETE permission on cost alert definitions, READ permission on the aggregation parent (the cost bucket or application's on which the alert is set) and READ permission on Billing Info.
         The *cost_alert_definition* parameter is the ID of the cost alert definition to delete
         """
-        if isinstance(cost_alert_definition, dict): cost_alert_definition = cost_alert_definition['id']
+        if isinstance(cost_alert_definition, _objects):
+            cost_alert_definition = cost_alert_definition['id']
         return self.request('DELETE', '/costAlertDefinitions/{0}'.format(cost_alert_definition))
 
     def get_users_of_cost_alert_definition(self, cost_alert_definition):
         """Returns list of all the recipients of a specific cost alert definition.
         The *cost_alert_definition* parameter is the ID of the cost alert definition to retrieve
         """
-        if isinstance(cost_alert_definition, dict): cost_alert_definition = cost_alert_definition['id']
+        if isinstance(cost_alert_definition, _objects):
+            cost_alert_definition = cost_alert_definition['id']
         return self.request('GET', '/costAlertDefinitions/{0}/users'.format(cost_alert_definition))
 
     def add_user_to_cost_alert_definition(self, cost_alert_definition, user):
@@ -1370,8 +4119,9 @@ class RavelloClient(object):
         The *cost_alert_definition* parameter is the ID of the cost alert definition to add the user to
         The *user* parameter is the ID of the user to add to the cost alert definition
         """
-        if isinstance(cost_alert_definition, dict): cost_alert_definition = cost_alert_definition['id']
-        if isinstance(user, dict): user = user['id']
+        if isinstance(cost_alert_definition, _objects):
+            cost_alert_definition = cost_alert_definition['id']
+        if isinstance(user, _objects): user = user['id']
         return self.request('POST', '/costAlertDefinitions/{0}/users/{1}'.format(cost_alert_definition, user))
 
     def remove_user_from_cost_alert_definition(self, cost_alert_definition, user):
@@ -1379,8 +4129,9 @@ class RavelloClient(object):
         The *cost_alert_definition* parameter is the ID of the cost alert definition to remove the user from
         The *user* parameter is the ID of the user to remove from the cost alert definition
         """
-        if isinstance(cost_alert_definition, dict): cost_alert_definition = cost_alert_definition['id']
-        if isinstance(user, dict): user = user['id']
+        if isinstance(cost_alert_definition, _objects):
+            cost_alert_definition = cost_alert_definition['id']
+        if isinstance(user, _objects): user = user['id']
         return self.request('DELETE', '/costAlertDefinitions/{0}/users/{1}'.format(cost_alert_definition, user))
 
     def get_shares(self, request=None):
@@ -1413,5 +4164,936 @@ class RavelloClient(object):
         """Delete Share Data by ID.
         Unshare specific resource.
         """
-        if isinstance(share, dict): share = share['id']
+        if isinstance(share, _objects): share = share['id']
         return self.request('DELETE', '/shares/{0}'.format(share))
+
+
+class _PooledClient(object):
+    """A client in a :class:`ClientPool`."""
+
+    __slots__ = ('key', 'client', 'leases', 'last_used')
+
+    def __init__(self, key, client):
+        self.key = key
+        self.client = client
+        self.leases = 0
+        self.last_used = _monotonic()
+
+
+class ClientPool(object):
+    """A pool of logged in clients, one per account.
+
+    Programs that work for many accounts, possibly with many tasks per
+    account, can get a client from the pool for each task instead of
+    creating and logging in a new client every time. Clients are shared by
+    the tasks of the same account, which is identified by the API URL, the
+    identity domain, the username or ephemeral access token, and the
+    password. A client is only shared with tasks that present the same
+    password, which the pool keeps a digest of.
+
+    At most *maxsize* clients are kept. If the pool is full, the least
+    recently used client that is not in use is closed to make room for a new
+    one, and if all clients are in use, :meth:`acquire` waits until one is
+    released. Clients that were not used for *idle_timeout* seconds are
+    closed. The remaining keyword arguments are passed to
+    :class:`RavelloClient` when a client is created.
+
+    The number of clients that were created is available as
+    :attr:`created`.
+    """
+
+    client_class = RavelloClient
+    default_maxsize = 16
+    default_idle_timeout = 300
+
+    def __init__(self, maxsize=None, idle_timeout=None, **kwargs):
+        self.maxsize = maxsize if maxsize is not None else self.default_maxsize
+        self.idle_timeout = idle_timeout if idle_timeout is not None \
+                else self.default_idle_timeout
+        self.kwargs = kwargs
+        self.created = 0
+        # key -> _PooledClient, in least recently used order.
+        self._entries = OrderedDict()
+        self._leased = {}
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, entry):
+        del self._entries[entry.key]
+        entry.client.close()
+
+    def _evict_idle(self):
+        now = _monotonic()
+        for entry in list(self._entries.values()):
+            if not entry.leases and now - entry.last_used > self.idle_timeout:
+                self._evict(entry)
+
+    def _evict_lru(self):
+        for entry in self._entries.values():
+            if not entry.leases:
+                self._evict(entry)
+                return True
+        return False
+
+    def acquire(self, username=None, password=None, url=None, identity_domain=None,
+                eph_token=None):
+        """Return a logged in client for an account.
+
+        The client must be returned to the pool with :meth:`release`. If the
+        pool has a client for the account and *password*, it is reused.
+        """
+        key = (url or self.client_class.default_url, identity_domain, username or eph_token,
+               _digest(password) if password is not None else None)
+        with self._cond:
+            while True:
+                self._evict_idle()
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._entries[key] = entry
+                    break
+                if len(self._entries) < self.maxsize or self._evict_lru():
+                    client = self.client_class(username, password, url=url,
+                                               eph_token=eph_token,
+                                               identity_domain=identity_domain,
+                                               **self.kwargs)
+                    entry = self._entries[key] = _PooledClient(key, client)
+                    self.created += 1
+                    break
+                self._cond.wait()
+            entry.leases += 1
+            self._leased[id(entry.client)] = entry
+        client = entry.client
+        try:
+            # Tasks that get the client concurrently share one login.
+            client.login()
+        except Exception:
+            self.release(client)
+            raise
+        return client
+
+    def release(self, client):
+        """Return *client*, obtained with :meth:`acquire`, to the pool."""
+        with self._cond:
+            entry = self._leased[id(client)]
+            entry.leases -= 1
+            if not entry.leases:
+                del self._leased[id(client)]
+            entry.last_used = _monotonic()
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def client(self, *args, **kwargs):
+        """A context manager that acquires a client, and releases it at the
+        end of the block. The arguments are those of :meth:`acquire`."""
+        client = self.acquire(*args, **kwargs)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def close(self):
+        """Close all clients."""
+        with self._cond:
+            for entry in list(self._entries.values()):
+                self._evict(entry)
+
+
+class Inventory(object):
+    """An in-memory inventory of the applications of *client* and their
+    VMs, with indexes for fast lookups.
+
+    Call :meth:`refresh` to load or update the inventory. A refresh lists
+    the applications, and only fetches the applications that are new or
+    whose entry in the list changed, for example because its last update
+    time did, concurrently with :meth:`RavelloClient.batch`. Lookups never
+    make API calls.
+
+    Applications are indexed by ID, name (case insensitive), state (see
+    :func:`application_state`), owner and region, and VMs by ID and name.
+    An inventory can be shared by multiple threads. It cannot be used with
+    :class:`~ravello_async.AsyncRavelloClient`.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.fetched = 0
+        self._lock = threading.Lock()
+        self._summaries = {}
+        self._apps = {}
+        self._indexes = {}
+        self._vms = {}
+
+    def refresh(self):
+        """Update the inventory. Return the number of applications that
+        were fetched."""
+        summaries = dict((summary['id'], summary) for summary in self.client.get_applications())
+        apps = dict((ident, app) for ident, app in self._apps.items() if ident in summaries)
+        known = {}
+        changed = []
+        for ident, summary in summaries.items():
+            if ident in apps and self._summaries.get(ident) == summary:
+                known[ident] = summary
+            else:
+                changed.append(ident)
+        results = self.client.map('get_application', changed)
+        for ident, result in zip(changed, results):
+            if result.error is not None:
+                # Keep the old version, and fetch it again next time.
+                self.client._logger.debug('inventory: cannot fetch application {0}: {1!s}'
+                                          .format(ident, result.error))
+            elif result.result is None:
+                apps.pop(ident, None)
+            else:
+                apps[ident] = result.result
+                known[ident] = summaries[ident]
+        indexes, vms = self._build_indexes(apps)
+        with self._lock:
+            self._summaries = known
+            self._apps = apps
+            self._indexes = indexes
+            self._vms = vms
+            self.fetched = len(changed)
+        return len(changed)
+
+    def _build_indexes(self, apps):
+        indexes = dict((name, {}) for name in ('name', 'state', 'owner', 'region'))
+        vms = {'id': {}, 'name': {}}
+        def add(index, key, value):
+            if key is not None:
+                index.setdefault(key, []).append(value)
+        for app in apps.values():
+            deployment = app.get('deployment') or {}
+            add(indexes['name'], app['name'].lower(), app)
+            state = application_state(app)
+            for state in state if isinstance(state, list) else [state]:
+                add(indexes['state'], state, app)
+            add(indexes['owner'], app.get('owner'), app)
+            add(indexes['region'], deployment.get('regionName'), app)
+            for vm in deployment.get('vms', []):
+                vms['id'][vm['id']] = (app, vm)
+                add(vms['name'], vm['name'].lower(), (app, vm))
+        return indexes, vms
+
+    def __len__(self):
+        return len(self._apps)
+
+    def __iter__(self):
+        return iter(list(self._apps.values()))
+
+    def __contains__(self, app):
+        if isinstance(app, _objects):
+            app = app['id']
+        return app in self._apps
+
+    def get(self, app):
+        """Return the application with ID *app*, or None."""
+        return self._apps.get(app)
+
+    def find(self, name):
+        """Return the application named *name*, ignoring case, or None.
+        A :class:`RavelloError` is raised if there are multiple."""
+        apps = self._indexes.get('name', {}).get(name.lower(), [])
+        if len(apps) > 1:
+            raise RavelloError('multiple apps for name "{0}" found'.format(name))
+        return apps[0] if apps else None
+
+    def by_state(self, state):
+        """Return the applications that have VMs in state *state*."""
+        return list(self._indexes.get('state', {}).get(state, []))
+
+    def by_owner(self, owner):
+        """Return the applications owned by *owner*."""
+        return list(self._indexes.get('owner', {}).get(owner, []))
+
+    def by_region(self, region):
+        """Return the applications deployed in region *region*, e.g. "Virginia"."""
+        return list(self._indexes.get('region', {}).get(region, []))
+
+    def get_vm(self, vm):
+        """Return a ``(app, vm)`` tuple for the deployed VM with ID *vm*, or
+        None."""
+        return self._vms.get('id', {}).get(vm)
+
+    def find_vms(self, name):
+        """Return a list of ``(app, vm)`` tuples for the deployed VMs named
+        *name*, ignoring case."""
+        return list(self._vms.get('name', {}).get(name.lower(), []))
+
+
+class LocalStore(object):
+    """A local store of the applications, images, disk images and keypairs
+    of *client*, kept in the SQLite database *filename*.
+
+    The store lets short-lived processes, like CLI commands and cron jobs,
+    resolve names without listing a whole collection on every run. A
+    collection is listed the first time it is needed, and saved with the time
+    at which it was listed. The entities are encoded with the codec of
+    *client*, saved compressed, and indexed by name.
+
+    Lookups are answered from the database. When a collection is older than
+    *max_age* seconds, it is listed again in a background thread and the
+    saved entities are used in the meantime. A lookup for a name that is not
+    saved lists the collection again first, in case the entity is new.
+
+    The entities are kept per user and API endpoint, so a database can be
+    shared by different accounts, and by concurrent processes.
+    """
+
+    collections = ('applications', 'images', 'diskimages', 'keypairs')
+    default_max_age = 300
+
+    _schema = """
+        CREATE TABLE IF NOT EXISTS listings (
+            scope TEXT, collection TEXT, updated REAL,
+            PRIMARY KEY (scope, collection));
+        CREATE TABLE IF NOT EXISTS entities (
+            scope TEXT, collection TEXT, id TEXT, name TEXT, payload BLOB,
+            PRIMARY KEY (scope, collection, id));
+        CREATE INDEX IF NOT EXISTS entities_name ON entities (scope, collection, name);
+    """
+
+    def __init__(self, client, filename, max_age=None):
+        if sqlite3 is None:
+            raise RavelloError('the sqlite3 module is not available')
+        self.client = client
+        self.filename = filename
+        self.max_age = max_age if max_age is not None else self.default_max_age
+        self._lock = threading.Lock()
+        self._threads = {}
+        with self._transaction() as db:
+            db.executescript(self._schema)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # Connections cannot be shared between threads, so use one per call.
+        db = sqlite3.connect(self.filename, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _scope(self):
+        # Clients that use an ephemeral access token have no username, and
+        # are told apart by a digest of their token.
+        user = self.client._username
+        if user is None and self.client._eph_token is not None:
+            user = 'token:{0}'.format(_digest(self.client._eph_token))
+        return '{0}@{1}'.format(user or '', self.client.url.netloc)
+
+    def _check_collection(self, collection):
+        if collection not in self.collections:
+            raise ValueError('unknown collection: {0}'.format(collection))
+
+    def age(self, collection):
+        """Return the number of seconds since *collection* was listed, or
+        None if it was never listed."""
+        self._check_collection(collection)
+        with self._transaction() as db:
+            row = db.execute('SELECT updated FROM listings WHERE scope = ? AND collection = ?',
+                             (self._scope(), collection)).fetchone()
+        return time.time() - row[0] if row else None
+
+    def refresh(self, collection):
+        """List *collection* and save it. Return the list."""
+        self._check_collection(collection)
+        entities = getattr(self.client, 'get_{0}'.format(collection))()
+        entities = [entity.to_dict() if isinstance(entity, Record) else entity
+                    for entity in entities]
+        encode = self.client.codec.encode
+        rows = [(str(entity['id']), entity.get('name'),
+                 sqlite3.Binary(zlib.compress(encode(entity))))
+                for entity in entities]
+        scope = self._scope()
+        with self._transaction() as db:
+            db.execute('DELETE FROM entities WHERE scope = ? AND collection = ?',
+                       (scope, collection))
+            db.executemany('INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)',
+                           [(scope, collection) + row for row in rows])
+            db.execute('INSERT OR REPLACE INTO listings VALUES (?, ?, ?)',
+                       (scope, collection, time.time()))
+        return entities
+
+    def _refresh_quietly(self, collection):
+        try:
+            self.refresh(collection)
+        except Exception as e:
+            self.client._logger.debug('store: cannot refresh {0}: {1!s}'.format(collection, e))
+
+    def _revalidate(self, collection):
+        with self._lock:
+            thread = self._threads.get(collection)
+            if thread is not None and thread.is_alive():
+                return
+            thread = threading.Thread(target=self._refresh_quietly, args=(collection,))
+            thread.daemon = True
+            self._threads[collection] = thread
+        thread.start()
+
+    def _ensure(self, collection):
+        # Make sure *collection* is saved. Return True if it was just listed.
+        age = self.age(collection)
+        if age is None:
+            self.refresh(collection)
+            return True
+        if age > self.max_age:
+            self._revalidate(collection)
+        return False
+
+    def _select(self, collection, name=None):
+        query = 'SELECT payload FROM entities WHERE scope = ? AND collection = ?'
+        args = (self._scope(), collection)
+        if name is not None:
+            query += ' AND name = ?'
+            args += (name,)
+        with self._transaction() as db:
+            rows = db.execute(query, args).fetchall()
+        decode = self.client.codec.decode
+        return [decode(zlib.decompress(bytes(row[0]))) for row in rows]
+
+    def list(self, collection):
+        """Return the saved entities of *collection*."""
+        self._ensure(collection)
+        return self._select(collection)
+
+    def find(self, collection, name):
+        """Return the saved entity of *collection* named *name*, or None."""
+        listed = self._ensure(collection)
+        entities = self._select(collection, name)
+        if not entities and not listed:
+            self.refresh(collection)
+            entities = self._select(collection, name)
+        return entities[0] if entities else None
+
+    def get_id(self, collection, name):
+        """Return the ID of the entity of *collection* named *name*, or None."""
+        entity = self.find(collection, name)
+        return entity['id'] if entity else None
+
+    def load(self, collection, name):
+        """Load the entity of *collection* named *name* from the API, or
+        return None if there is no such entity.
+
+        The ID is looked up in the store. If the entity was deleted since
+        the collection was saved, the collection is listed again.
+        """
+        getter = getattr(self.client, 'get_{0}'.format(collection[:-1]))
+        entity = self.find(collection, name)
+        if entity is None:
+            return
+        loaded = getter(entity['id'])
+        if loaded is None:
+            self.refresh(collection)
+            entities = self._select(collection, name)
+            loaded = getter(entities[0]['id']) if entities else None
+        return loaded
+
+    def wait(self, timeout=None):
+        """Wait for background refreshes to finish."""
+        with self._lock:
+            threads = list(self._threads.values())
+        for thread in threads:
+            thread.join(timeout)
+
+
+class SessionStore(object):
+    """A file that keeps the sessions of logged in clients, so that new
+    processes can reuse them instead of logging in again.
+
+    A session is the session cookies and the user information that were
+    returned by the login, and is saved per user and API endpoint. Sessions
+    older than *max_age* seconds are not reused.
+
+    The file, *filename*, defaults to :attr:`default_filename`. It contains
+    credentials, so it is created readable by its owner only, and on POSIX
+    systems it is ignored if it can be accessed by others.
+    """
+
+    default_filename = '~/.ravello_sessions'
+    default_max_age = 3600
+
+    def __init__(self, filename=None, max_age=None):
+        self.filename = os.path.expanduser(filename or self.default_filename)
+        self.max_age = max_age if max_age is not None else self.default_max_age
+        self._logger = logging.getLogger('ravello')
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return {}
+        if os.name == 'posix' and st.st_mode & 0o077:
+            self._logger.warning('ignoring session store {0}: it is accessible by others'
+                                 .format(self.filename))
+            return {}
+        try:
+            with open(self.filename) as fin:
+                sessions = json.load(fin)
+        except (IOError, ValueError):
+            return {}
+        return sessions if isinstance(sessions, dict) else {}
+
+    def _write(self, sessions):
+        # Write a new file and rename it, so that readers never see a
+        # partial file. A temporary file that was left behind is removed
+        # first, since opening it would keep its mode.
+        tmpname = '{0}.{1}.tmp'.format(self.filename, os.getpid())
+        try:
+            os.remove(tmpname)
+        except OSError:
+            pass
+        fd = os.open(tmpname, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as fout:
+            json.dump(sessions, fout)
+        if os.name != 'posix' and os.path.exists(self.filename):
+            os.remove(self.filename)
+        os.rename(tmpname, self.filename)
+
+    def load(self, key):
+        """Return the session saved under *key*, or None."""
+        with self._lock:
+            session = self._read().get(key)
+        if session is None or time.time() - session.get('saved', 0) > self.max_age:
+            return
+        return session
+
+    def save(self, key, cookies, user_info):
+        """Save a session under *key*.
+
+        The *cookies* parameter is a list of dicts with the "name", "value",
+        "domain" and "path" of the session cookies.
+        """
+        with self._lock:
+            sessions = self._read()
+            sessions[key] = {'cookies': cookies, 'user_info': user_info, 'saved': time.time()}
+            self._write(sessions)
+
+    def delete(self, key):
+        """Remove the session saved under *key*, if any."""
+        with self._lock:
+            sessions = self._read()
+            if sessions.pop(key, None) is not None:
+                self._write(sessions)
+
+
+class _Watch(object):
+    """A condition that is waited for by a :class:`Poller`."""
+
+    __slots__ = ('obj', 'href', 'match', 'keys', 'listed', 'future', 'deadline', 'interval',
+                 'due', 'last')
+
+    def __init__(self, obj, match, future, deadline, interval, listed=None):
+        self.obj = obj
+        self.href = obj['_href']
+        self.match = match
+        # The keys that a dict condition tests, if they can be tested on
+        # the entries of a list call.
+        spec = match.spec
+        if isinstance(spec, dict) and not any(isinstance(value, dict) for value in spec.values()):
+            self.keys = set(spec)
+        else:
+            self.keys = None
+        self.listed = listed
+        self.future = future
+        self.deadline = deadline
+        self.interval = interval
+        self.due = _monotonic()
+        self.last = None
+
+
+def _resolve(future, result=None, error=None):
+    """Complete *future*, unless it is done or was cancelled."""
+    if future.done() or not future.set_running_or_notify_cancel():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class Poller(object):
+    """Wait for conditions on many objects at the same time.
+
+    The :meth:`watch` method registers a condition on an object and returns
+    a :class:`concurrent.futures.Future`. A single background thread checks
+    all pending conditions, and stops when there are none left.
+
+    When the conditions of at least :attr:`list_threshold` objects of one of
+    the collections in :attr:`list_paths` are due to be checked, the
+    collection is listed once instead, and dict conditions that only test
+    keys in the list entries are checked against them. Other conditions can
+    be given a check on the list entry as well, see :meth:`watch`. Objects
+    are only reloaded to confirm a match, and for the remaining conditions.
+    The reloads are made concurrently, see :meth:`RavelloClient.map`.
+
+    Each object is checked every *interval* seconds at first. The interval
+    grows by half every time the object did not change, up to *max_interval*
+    seconds, and starts over when it changes.
+
+    The number of list calls and reloads are available as :attr:`lists` and
+    :attr:`reloads`.
+    """
+
+    list_paths = ('/applications', '/blueprints', '/images', '/diskImages')
+    list_threshold = 2
+    default_interval = 2
+    default_max_interval = 30
+
+    def __init__(self, client, interval=None, max_interval=None):
+        self.client = client
+        self.interval = interval if interval is not None else self.default_interval
+        self.max_interval = max_interval if max_interval is not None \
+                else self.default_max_interval
+        self.lists = 0
+        self.reloads = 0
+        self._watches = []
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len([watch for watch in self._watches if not watch.future.done()])
+
+    def watch(self, obj, cond, timeout=None, listed=None):
+        """Wait for condition *cond* on *obj* to become true.
+
+        The arguments are those of :meth:`RavelloClient.wait_for`. The
+        returned future completes with the reloaded object when the
+        condition is true. If the condition does not become true before the
+        timeout, or the object does not exist (anymore), it completes with a
+        :class:`RavelloError`. Cancelling the future stops the wait.
+
+        If *listed* is provided, it is called with the entry of the object in
+        a list call, and must return False if the condition cannot be true
+        yet, so that the object is not reloaded. This allows callable
+        conditions to be checked with list calls.
+        """
+        if obj.get('_href') is None:
+            raise RuntimeError('obj must have an "_href" key')
+        if timeout is None:
+            timeout = self.client.timeout
+        future = Future()
+        watch = _Watch(obj, compile_filter(cond), future, _monotonic() + timeout,
+                       self.interval, listed)
+        with self._cond:
+            self._watches.append(watch)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def touch(self, href):
+        """Check the conditions on the object with "_href" *href* now,
+        for example because it is known to have changed."""
+        with self._cond:
+            for watch in self._watches:
+                if watch.href == href:
+                    watch.due = _monotonic()
+                    watch.interval = self.interval
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._watches = [watch for watch in self._watches if not watch.future.done()]
+                if not self._watches:
+                    self._thread = None
+                    return
+                now = _monotonic()
+                wakeup = min(min(watch.due, watch.deadline) for watch in self._watches)
+                if wakeup > now:
+                    self._cond.wait(wakeup - now)
+                    continue
+                due = [watch for watch in self._watches
+                       if watch.due <= now or watch.deadline <= now]
+                pending = list(self._watches)
+            try:
+                self._check(due, pending, now)
+            except Exception as e:
+                # Do not let a bug leave the futures hanging.
+                for watch in due:
+                    _resolve(watch.future, error=e)
+
+    def _listable(self, watch):
+        # Return the collection to list to check *watch*, or None.
+        collection = watch.href.rsplit('/', 1)[0]
+        if (watch.keys is not None or watch.listed is not None) \
+                and collection in self.list_paths:
+            return collection
+
+    def _check(self, due, pending, now):
+        # Check the conditions of the *due* watches. When a collection is
+        # listed, the other *pending* watches on it are checked as well,
+        # since that is free.
+        groups = {}
+        reload = []
+        for watch in due:
+            if watch.deadline <= now:
+                _resolve(watch.future, error=RavelloError('timeout waiting for condition'))
+                continue
+            collection = self._listable(watch)
+            if collection is not None:
+                groups.setdefault(collection, []).append(watch)
+            else:
+                reload.append(watch)
+        due = set(due)
+        for watch in pending:
+            collection = self._listable(watch)
+            if collection in groups and watch not in due and not watch.future.done():
+                groups[collection].append(watch)
+        for collection, group in groups.items():
+            if len(group) < self.list_threshold:
+                reload.extend(watch for watch in group if watch in due)
+                continue
+            self.lists += 1
+            try:
+                entries = self.client.request('GET', collection, cache=False) or []
+            except Exception as e:
+                self.client._logger.debug('poller: cannot list {0}: {1!s}'
+                                          .format(collection, e))
+                reload.extend(group)
+                continue
+            entries = dict((entry.get('_href'), entry) for entry in entries)
+            for watch in group:
+                entry = entries.get(watch.href)
+                # Confirm a match with the full object. An object that is
+                # not listed or lacks keys is checked the same way.
+                if entry is None:
+                    reload.append(watch)
+                elif watch.listed is not None:
+                    if watch.listed(entry):
+                        reload.append(watch)
+                    else:
+                        self._reschedule(watch, entry)
+                elif not watch.keys <= set(entry) or watch.match(entry):
+                    reload.append(watch)
+                else:
+                    self._reschedule(watch, entry)
+        if not reload:
+            return
+        self.reloads += len(reload)
+        results = self.client.map('reload', [watch.obj for watch in reload])
+        for watch, result in zip(reload, results):
+            if result.error is not None:
+                _resolve(watch.future, error=result.error)
+            elif result.result is None:
+                _resolve(watch.future, error=RavelloError('object {0} not found'
+                                                          .format(watch.href)))
+            elif watch.match(result.result):
+                _resolve(watch.future, result.result)
+            else:
+                self._reschedule(watch, result.result)
+
+    def _reschedule(self, watch, obj):
+        if obj != watch.last:
+            watch.interval = self.interval
+        else:
+            watch.interval = min(watch.interval * 1.5, self.max_interval)
+        watch.last = obj
+        watch.due = _monotonic() + watch.interval
+
+
+def _notification_app(notification):
+    """Return the ID of the application that *notification* is about, or
+    None. It is in "appId", or in the "eventProperties"."""
+    app = notification.get('appId')
+    if app is None:
+        for prop in notification.get('eventProperties') or []:
+            if str(prop.get('key', '')).lower().replace('_', '') == 'appid':
+                app = prop.get('value')
+                break
+    return int(app) if isinstance(app, _string_types) and app.isdigit() else app
+
+
+class _Subscription(object):
+    """A callback of a :class:`ChangeFeed`."""
+
+    __slots__ = ('callback', 'app', 'event_types', 'levels')
+
+    def __init__(self, callback, app, event_types, levels):
+        self.callback = callback
+        self.app = app
+        self.event_types = set(event_types) if event_types is not None else None
+        self.levels = set(levels) if levels is not None else None
+
+    def matches(self, notification, app):
+        return (self.app is None or self.app == app) \
+                and (self.event_types is None
+                     or notification.get('eventType') in self.event_types) \
+                and (self.levels is None
+                     or notification.get('notificationLevel') in self.levels)
+
+
+class ChangeFeed(object):
+    """A feed of the notifications of the API, to react to changes without
+    reloading every object.
+
+    Every :meth:`poll` searches the notifications with
+    :meth:`RavelloClient.search_notifications` since the previous poll. The
+    *query* parameter can add criteria to the search, like an "appId". Each
+    search starts *overlap* seconds before the previous one ended, so that
+    notifications that are stored late are not missed. Notifications that
+    were seen already, and those from before the feed was created, are
+    skipped.
+
+    New notifications are passed to the callbacks registered with
+    :meth:`subscribe`. They also affect the application they are about:
+    its cached validators are removed (see :class:`ValidatorCache`), and the
+    conditions that the client's :class:`Poller` waits for on it are checked
+    right away.
+
+    Call :meth:`start` to poll every *interval* seconds in a background
+    thread.
+    """
+
+    default_interval = 10
+    default_overlap = 60
+    max_results = 1000
+
+    def __init__(self, client, interval=None, overlap=None, query=None):
+        self.client = client
+        self.interval = interval if interval is not None else self.default_interval
+        self.overlap = overlap if overlap is not None else self.default_overlap
+        self.query = dict(query or {})
+        self.notifications = 0
+        # The creation time, and the end of the previous search, in
+        # milliseconds.
+        self._created = self._since = int(time.time() * 1000)
+        # Seen notification -> its time in milliseconds.
+        self._seen = {}
+        self._subscriptions = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def subscribe(self, callback, app=None, event_types=None, levels=None):
+        """Call *callback* with every new notification.
+
+        The notifications can be limited to those about application *app*,
+        to those with an "eventType" in *event_types*, and to those with a
+        "notificationLevel" (e.g. "ERROR") in *levels*. The return value can
+        be passed to :meth:`unsubscribe`.
+        """
+        if isinstance(app, _objects):
+            app = app['id']
+        subscription = _Subscription(callback, app, event_types, levels)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a callback that was added with :meth:`subscribe`."""
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def wait(self, app=None, event_types=None, levels=None):
+        """Return a :class:`concurrent.futures.Future` for the next
+        notification. The arguments are those of :meth:`subscribe`."""
+        future = Future()
+        subscription = []
+        def callback(notification):
+            # This may be called before subscribe() returns.
+            if subscription:
+                self.unsubscribe(subscription[0])
+            _resolve(future, notification)
+        subscription.append(self.subscribe(callback, app, event_types, levels))
+        return future
+
+    def poll(self):
+        """Search the new notifications and dispatch them. Return a list
+        with the new notifications, oldest first."""
+        now = int(time.time() * 1000)
+        start = self._since - int(self.overlap * 1000)
+        query = dict(self.query)
+        query['dateRange'] = {'startTime': start, 'endTime': now}
+        query['maxResults'] = self.max_results
+        result = self.client.search_notifications(query) or []
+        if isinstance(result, dict):
+            result = result.get('notification') or []
+        if len(result) >= self.max_results:
+            self.client._logger.warning('change feed: {0} notifications in {1} seconds, '
+                                        'some may be missed'.format(len(result),
+                                                                    (now - start) / 1000))
+        new = []
+        for notification in result:
+            key = json.dumps(notification, sort_keys=True)
+            if key in self._seen:
+                continue
+            stamp = notification.get('eventTimeStamp') or now
+            self._seen[key] = stamp
+            if stamp >= self._created:
+                new.append(notification)
+        self._seen = dict((key, stamp) for key, stamp in self._seen.items() if stamp >= start)
+        self._since = now
+        new.sort(key=lambda notification: notification.get('eventTimeStamp') or 0)
+        for notification in new:
+            self._dispatch(notification)
+        self.notifications += len(new)
+        return new
+
+    def _dispatch(self, notification):
+        app = _notification_app(notification)
+        if app is not None:
+            href = '/applications/{0}'.format(app)
+            if self.client.validator_cache is not None:
+                self.client.validator_cache.invalidate(href)
+            if self.client._poller is not None:
+                self.client._poller.touch(href)
+        with self._lock:
+            callbacks = [subscription.callback for subscription in self._subscriptions
+                         if subscription.matches(notification, app)]
+        # A failing subscriber must not keep the others from being called.
+        for callback in callbacks:
+            try:
+                callback(notification)
+            except Exception:
+                self.client._logger.exception('change feed subscriber {0!r} failed'
+                                              .format(callback))
+
+    def start(self):
+        """Start polling in a background thread."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop polling in the background."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopped.set()
+        thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self.client._logger.debug('change feed: poll failed: {0!s}'.format(e))
+            self._stopped.wait(self.interval)
+
+
+# Methods that are not traced. The HTTP requests made by request() are
+# traced, and the iter_*() methods return a generator.
+_untraced_methods = ('connect', 'close', 'stats', 'request')
+
+def _trace_methods(cls):
+    """Wrap the public methods of *cls* with :func:`_traced`."""
+    for name, func in list(vars(cls).items()):
+        if name.startswith('_') or name.startswith('iter_') or name in _untraced_methods:
+            continue
+        if inspect.isfunction(func):
+            setattr(cls, name, _traced(func))
+
+_trace_methods(RavelloClient)
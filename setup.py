@@ -17,6 +17,7 @@
 from __future__ import absolute_import, print_function
 
 import os
+import sys
 from setuptools import setup
 
 
@@ -36,18 +37,25 @@ version_info = {
         'Operating System :: POSIX',
         'Operating System :: MacOS :: MacOS X',
         'Operating System :: Microsoft :: Windows',
-        'Programming Language :: Python :: 2.6',
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3.3',
         'Programming Language :: Python :: 3.4'
     ]
 }
 
+# The asyncio client uses async/await, which does not byte-compile on
+# older versions.
+py_modules = ['ravello_sdk', 'ravello_cli']
+if sys.version_info >= (3, 5):
+    py_modules.append('ravello_async')
+
 if __name__ == '__main__':
     setup(
         package_dir={'': 'lib'},
-        py_modules=['ravello_sdk', 'ravello_cli'],
-        install_requires=['six', 'docopt', 'requests>=2.6.0'],
+        py_modules=py_modules,
+        install_requires=['six', 'docopt', 'requests>=2.6.0',
+                          'futures; python_version < "3"'],
+        extras_require={'orjson': ['orjson'], 'ujson': ['ujson']},
         name= version_info['name'],
         version= version_info['version'],
         description= version_info['description'],
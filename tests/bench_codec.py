@@ -0,0 +1,124 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the JSON codecs on application payloads.
+
+Encodes and decodes a full application (with the design and deployment
+aspects) with every installed codec, and compares the throughput with the
+previous ``json.dumps(...).encode()`` / ``json.loads(....decode())`` path.
+
+Usage: python bench_codec.py [vms] [count]
+"""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import json
+import time
+
+testdir = os.path.split(os.path.abspath(__file__))[0]
+sys.path.insert(0, os.path.join(os.path.split(testdir)[0], 'lib'))
+
+from ravello_sdk import RavelloError, get_codec
+
+
+def make_vm(ident):
+    """Return a VM the way the API returns it in an application design."""
+    return {
+        'id': ident, 'name': 'vm{0}'.format(ident),
+        'description': 'Application server {0}'.format(ident),
+        'baseVmId': 3125300, 'os': 'linux_manuel', 'numCpus': 4,
+        'memorySize': {'unit': 'GB', 'value': 8},
+        'stopTimeOut': 300, 'bootOrder': ['DISK', 'CDROM'],
+        'hardDrives': [{'id': ident * 10 + i, 'name': 'disk{0}'.format(i), 'index': i,
+                        'type': 'DISK', 'controller': 'virtio', 'boot': i == 0,
+                        'size': {'unit': 'GB', 'value': 20},
+                        'baseDiskImageId': 3145765, 'controllerIndex': 0,
+                        'controllerPciSlot': 0} for i in range(3)],
+        'networkConnections': [{
+            'id': ident * 10 + i, 'name': 'eth{0}'.format(i),
+            'device': {'index': i, 'deviceType': 'virtio', 'useAutomaticMac': True,
+                       'mac': '2c:c2:60:{0:02x}:{1:02x}:{2:02x}'.format(ident % 256, i, 7)},
+            'ipConfig': {'id': ident * 10 + i, 'hasPublicIp': i == 0,
+                         'autoIpConfig': {'allocatedIp': '10.0.{0}.{1}'.format(i, ident % 250),
+                                          'reservedIp': '10.0.{0}.{1}'.format(i, ident % 250)}},
+        } for i in range(2)],
+        'suppliedServices': [{'id': ident * 10 + i, 'name': name, 'external': True,
+                              'portRange': str(port), 'protocol': 'TCP',
+                              'ip': '10.0.0.{0}'.format(ident % 250)}
+                             for i, (name, port) in enumerate([('ssh', 22), ('http', 80),
+                                                               ('https', 443)])],
+        'keypairId': 1234, 'hostnames': ['vm{0}.localdomain'.format(ident)],
+        'state': 'STARTED', 'loadingStatus': 'DONE', 'loadingPercentage': 100,
+        'externalFqdn': 'vm{0}-app-xyz.srv.ravcloud.com'.format(ident),
+        'creationTime': 1420070400000 + ident, 'cpuIds': [],
+    }
+
+
+def make_application(vms):
+    """Return an application with *vms* VMs in its design and deployment."""
+    network = {'subnets': [{'id': 1, 'net': '10.0.0.0', 'mask': '255.255.255.0',
+                            'ipVersion': 'IPV4'}],
+               'services': {'dhcpServers': [{'id': 2, 'ip': '10.0.0.2',
+                                             'ipRangeStart': '10.0.0.3',
+                                             'ipRangeEnd': '10.0.0.254'}]}}
+    return {
+        'id': 3125123, 'name': 'benchmark application', 'owner': 'Test User',
+        'creationTime': 1420070400000, 'published': True, 'version': 12,
+        'design': {'vms': [make_vm(i) for i in range(vms)], 'network': network,
+                   'stopVmsByOrder': False},
+        'deployment': {'vms': [make_vm(i) for i in range(vms)], 'network': network,
+                       'cloud': 'AMAZON', 'regionName': 'Virginia',
+                       'totalActiveVms': vms, 'totalErrorVms': 0,
+                       'expirationTime': 1420074000000},
+    }
+
+
+def legacy_encode(entity):
+    return json.dumps(entity).encode('utf-8')
+
+
+def legacy_decode(content):
+    return json.loads(content.decode('utf-8'))
+
+
+def measure(func, arg, count):
+    start = time.time()
+    for i in range(count):
+        func(arg)
+    return count / (time.time() - start)
+
+
+def main():
+    vms = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    app = make_application(vms)
+    content = legacy_encode(app)
+    print('payload:  {0} VMs, {1} bytes'.format(vms, len(content)))
+    before = (measure(legacy_encode, app, count), measure(legacy_decode, content, count))
+    print('{0:8s}  encode {1:7.0f}/s  decode {2:7.0f}/s'.format('legacy', *before))
+    for name in ('json', 'ujson', 'orjson'):
+        try:
+            codec = get_codec(name)
+        except RavelloError:
+            print('{0:8s}  not installed'.format(name))
+            continue
+        after = (measure(codec.encode, app, count), measure(codec.decode, content, count))
+        print('{0:8s}  encode {1:7.0f}/s  decode {2:7.0f}/s  speedup {3:.2f}x / {4:.2f}x'
+              .format(name, after[0], after[1], after[0] / before[0], after[1] / before[1]))
+
+
+if __name__ == '__main__':
+    main()
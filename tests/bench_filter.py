@@ -0,0 +1,114 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark local filtering of large lists.
+
+Filters a list of applications with several filters, with the previous
+recursive implementation of ``_match_filter`` and with a compiled filter,
+on dicts and on compact records.
+
+Usage: python bench_filter.py [count] [rounds]
+"""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import time
+
+testdir = os.path.split(os.path.abspath(__file__))[0]
+sys.path.insert(0, os.path.join(os.path.split(testdir)[0], 'lib'))
+
+from ravello_sdk import Record, compile_filter, In, Range, Not, Or
+
+
+def legacy_match_filter(obj, flt):
+    """The recursive _match_filter() before filters were compiled."""
+    if isinstance(obj, list):
+        return [ob for ob in obj if legacy_match_filter(ob, flt)]
+    if callable(flt):
+        return flt(obj)
+    elif not isinstance(flt, dict):
+        raise TypeError('expecting a callable or a dict')
+    for fkey, fval in flt.items():
+        obval = obj.get(fkey)
+        if obval is None:
+            return False
+        elif isinstance(fval, dict):
+            if not isinstance(obval, dict) or not legacy_match_filter(obval, fval):
+                return False
+        elif callable(fval):
+            if not fval(obval):
+                return False
+        elif fval != obval:
+            return False
+    return True
+
+
+def make_application(ident):
+    """Return an application the way the "get all" call returns it."""
+    return {'id': ident, 'name': 'app{0}'.format(ident),
+            'description': 'Application {0}'.format(ident),
+            'owner': 'user{0}'.format(ident % 20), 'published': ident % 3 != 0,
+            'creationTime': 1420070400000 + ident * 1000,
+            'deployment': {'cloud': ('AMAZON', 'GOOGLE')[ident % 2],
+                           'regionName': ('Virginia', 'Oregon', 'Frankfurt')[ident % 3],
+                           'totalActiveVms': ident % 7}}
+
+
+# Filters that the previous implementation supports, and the compiled
+# engine with the new operators.
+filters = [
+    ('equals', {'owner': 'user3', 'published': True}),
+    ('nested', {'deployment': {'cloud': 'GOOGLE', 'regionName': 'Oregon'}}),
+    ('callable', {'creationTime': lambda t: t > 1420070400000 + 25000000}),
+    ('in', {'owner': In('user1', 'user2', 'user3')}),
+    ('range', {'deployment': {'totalActiveVms': Range(2, 4)}}),
+]
+compound = ('compound', Or({'owner': 'user1'}, {'published': Not(True)}))
+
+
+def measure(func, rounds):
+    start = time.time()
+    for i in range(rounds):
+        result = func()
+    return (time.time() - start) / rounds, len(result)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    apps = [make_application(i) for i in range(count)]
+    records = [Record(make_application(i), '/applications') for i in range(count)]
+    print('{0} applications, {1} rounds'.format(count, rounds))
+    print('{0:10s}  {1:>8s}  {2:>8s}  {3:>8s}  {4:>8s}'.format(
+            'filter', 'legacy', 'compiled', 'records', 'speedup'))
+    for name, flt in filters + [compound]:
+        if name == 'compound':
+            legacy = None
+        else:
+            legacy, matches = measure(lambda: legacy_match_filter(apps, flt), rounds)
+        match = compile_filter(flt)
+        compiled, compiled_matches = measure(lambda: match.select(apps), rounds)
+        recorded, record_matches = measure(lambda: match.select(records), rounds)
+        assert legacy is None or matches == compiled_matches
+        assert compiled_matches == record_matches
+        print('{0:10s}  {1:>8s}  {2:7.1f}ms  {3:7.1f}ms  {4:>8s}'.format(
+                name, '{0:7.1f}ms'.format(legacy * 1000) if legacy else '-',
+                compiled * 1000, recorded * 1000,
+                '{0:.2f}x'.format(legacy / compiled) if legacy else '-'))
+
+
+if __name__ == '__main__':
+    main()
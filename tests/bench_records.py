@@ -0,0 +1,75 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the memory used by list results, with and without compact mode.
+
+Lists a large number of VMs from a local stand-in server with a regular and
+with a compact client, and measures the memory that the result takes with
+tracemalloc. This requires Python 3.4+.
+
+Usage: python bench_records.py [count]
+"""
+
+from __future__ import absolute_import, print_function
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+testdir = os.path.split(os.path.abspath(__file__))[0]
+sys.path.insert(0, os.path.join(os.path.split(testdir)[0], 'lib'))
+
+from support import StandInServer, json_response
+from ravello_sdk import RavelloClient
+from bench_codec import make_vm
+
+
+def measure(client, count):
+    """Return the time to list *count* VMs, and the memory the list takes."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    vms = client.get_vms(1)
+    elapsed = time.time() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(vms) == count
+    return elapsed, current, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    content = json_response([make_vm(i) for i in range(count)])
+    server = StandInServer().start()
+    server.route('GET', '/applications/1;design/vms', lambda *args: content)
+    print('payload:  {0} VMs, {1} bytes'.format(count, len(content[2])))
+    results = []
+    for compact in (False, True):
+        client = RavelloClient('user', 'pass', url=server.url, compact=compact)
+        client.login()
+        results.append(measure(client, count))
+        client.close()
+        name = 'compact' if compact else 'dicts'
+        elapsed, current, peak = results[-1]
+        print('{0:8s}  {1:6.2f} s  result {2:7.1f} MB  peak {3:7.1f} MB'
+              .format(name, elapsed, current / 1e6, peak / 1e6))
+    print('result memory reduced {0:.2f}x'.format(results[0][1] / results[1][1]))
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the request path against a local stand-in server.
+
+Compares the number of requests per second of the previous request path (a
+fresh ``requests.Request(...).prepare()`` per call on a default session)
+with the pooled, prepared-request path of :class:`RavelloClient`.
+
+Usage: python bench_transport.py [count]
+"""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import time
+
+testdir = os.path.split(os.path.abspath(__file__))[0]
+sys.path.insert(0, os.path.join(os.path.split(testdir)[0], 'lib'))
+
+import requests
+
+from support import StandInServer
+from ravello_sdk import RavelloClient
+
+
+def legacy_requests(server, count):
+    """Issue *count* GETs the way _request() used to."""
+    session = requests.Session()
+    session.stream = True
+    url = server.url + '/applications/1'
+    for i in range(count):
+        hdict = {'Accept': 'application/json'}
+        req = requests.Request('GET', url, data=b'', headers=hdict,
+                               cookies=session.cookies).prepare()
+        response = session.send(req, timeout=60)
+        response.json()
+
+
+def client_requests(server, count):
+    """Issue *count* GETs through RavelloClient."""
+    client = RavelloClient('user', 'pass', url=server.url)
+    client.login()
+    for i in range(count):
+        client.get_application(1)
+    client.close()
+
+
+def measure(func, server, count):
+    start = time.time()
+    func(server, count)
+    return count / (time.time() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    server = StandInServer()
+    server.route('GET', '/applications/\\d+', lambda *args: {'id': 1, 'name': 'app'})
+    server.start()
+    try:
+        # Warm up both paths once before measuring.
+        legacy_requests(server, 10)
+        client_requests(server, 10)
+        before = measure(legacy_requests, server, count)
+        after = measure(client_requests, server, count)
+    finally:
+        server.stop()
+    print('requests: {0}'.format(count))
+    print('before:   {0:.0f} req/s'.format(before))
+    print('after:    {0:.0f} req/s'.format(after))
+    print('speedup:  {0:.2f}x'.format(after / before))
+
+
+if __name__ == '__main__':
+    main()
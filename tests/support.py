@@ -15,15 +15,25 @@
 from __future__ import absolute_import, print_function
 
 import os
+import re
 import sys
+import json
 import logging
 import base64
+import threading
 
 try:
     from configparser import ConfigParser
 except ImportError:
     from ConfigParser import ConfigParser
 
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
 if sys.version_info[:2] >= (2,7):
     import unittest
 else:
@@ -33,7 +43,8 @@ SkipTest = unittest.SkipTest
 
 from ravello_sdk import RavelloClient
 
-__all__ = ['UnitTest', 'IntegrationTest', 'SkipTest', 'unittest']
+__all__ = ['UnitTest', 'IntegrationTest', 'StandInServer', 'json_response',
+           'SkipTest', 'unittest']
 
 
 def setup_logging():
@@ -104,3 +115,132 @@ class IntegrationTest(UnitTest):
     def tearDown(self):
         self.client.logout()
         self.client.close()
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Request handler for :class:`StandInServer`."""
+
+    protocol_version = 'HTTP/1.1'
+    # Send the headers and the body in a single segment.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.standin._new_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, headers, body = self.server.standin._handle(self.command, self.path,
+                                                            self.headers, body)
+        self.send_response(status)
+        chunked = False
+        for key, value in headers:
+            self.send_header(key, value)
+            chunked = chunked or (key, value) == ('Transfer-Encoding', 'chunked')
+        if not chunked:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        if not chunked:
+            self.wfile.write(body)
+            return
+        for pos in range(0, len(body), self.server.standin.chunk_size):
+            chunk = body[pos:pos+self.server.standin.chunk_size]
+            self.wfile.write('{0:x}\r\n'.format(len(chunk)).encode('ascii') + chunk + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients closing kept-alive connections are not an error.
+        pass
+
+
+class StandInServer(object):
+    """A local stand-in for the Ravello API.
+
+    The server listens on a random port on the loopback interface, speaks
+    HTTP/1.1 with keep-alive, and dispatches requests to handlers that are
+    registered with :meth:`route`. A handler is called with the method, the
+    path (relative to the API root), the request headers and the request
+    body, and must return a ``(status, headers, body)`` tuple or a JSON
+    serializable entity. A ``/login`` handler that hands out a session cookie
+    is always installed. A response with a ``Transfer-Encoding: chunked``
+    header is sent in chunks of *chunk_size* bytes.
+    """
+
+    root = '/api/v1'
+    chunk_size = 1000
+
+    def __init__(self):
+        self.routes = []
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.route('POST', '/login', self.login)
+        self.route('POST', '/logout', lambda *args: (200, [], b''))
+
+    @property
+    def url(self):
+        """The API URL of the server."""
+        return 'http://127.0.0.1:{0}{1}'.format(self._server.server_port, self.root)
+
+    def route(self, method, path, handler):
+        """Register *handler* for *method* on paths matching regex *path*."""
+        self.routes.insert(0, (method, re.compile(path + '$'), handler))
+
+    def login(self, method, path, headers, body):
+        """Default ``/login`` handler."""
+        if not headers.get('Authorization', '').startswith('Basic '):
+            return 401, [], b''
+        return json_response({'id': 1, 'name': 'test'},
+                             headers=[('Set-Cookie', 'JSESSIONID=standin; Path=/')])
+
+    def start(self):
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+        self._server.standin = self
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _new_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def _handle(self, method, path, headers, body):
+        if path.startswith(self.root):
+            path = path[len(self.root):]
+        with self._lock:
+            self.requests.append((method, path))
+        for rmethod, regex, handler in self.routes:
+            if rmethod == method and regex.match(path):
+                break
+        else:
+            return 404, [], b''
+        result = handler(method, path, headers, body)
+        if not isinstance(result, tuple):
+            result = json_response(result)
+        return result
+
+
+def json_response(entity, status=200, headers=None):
+    """Return a response tuple for a :class:`StandInServer` handler."""
+    headers = list(headers or [])
+    headers.append(('Content-Type', 'application/json'))
+    return status, headers, json.dumps(entity).encode('utf-8')
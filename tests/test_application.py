@@ -0,0 +1,109 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+from support import *
+from ravello_sdk import *
+
+
+class TestApplication(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.server.route('POST', '/applications/filter', self.filter_applications)
+        self.server.route('GET', '/applications/1(;\\w+)?', self.get_application)
+        self.server.route('GET', '/applications/2(;\\w+)?', lambda *args: (404, [], b''))
+        self.client = RavelloClient('user', 'pass', url=self.server.url)
+        self.client.login()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def filter_applications(self, method, path, headers, body):
+        return [{'id': 1, 'name': 'app1', 'owner': 'Test User'}]
+
+    def get_application(self, method, path, headers, body):
+        app = {'id': 1, 'name': 'app1', 'owner': 'Test User'}
+        aspect = path.partition(';')[2]
+        vms = [{'id': 10, 'name': 'web', 'state': 'STARTED',
+                'networkConnections': [{'ipConfig': {'publicIp': '1.2.3.4'}},
+                                       {'ipConfig': {}}]},
+               {'id': 11, 'name': 'db', 'state': 'STOPPED'}]
+        if aspect in ('', 'design'):
+            app['design'] = {'vms': [dict(vm, state=None) for vm in vms]}
+        if aspect in ('', 'deployment'):
+            app['deployment'] = {'vms': vms}
+        return app
+
+    def requests(self):
+        return [request for request in self.server.requests if request[1] != '/login']
+
+    def test_by_name(self):
+        app = self.client.get_application_by_name('app1', lazy=True)
+        self.assertIsInstance(app, Application)
+        self.assertEqual((app['id'], app['name'], app.properties['owner']),
+                         (1, 'app1', 'Test User'))
+        self.assertEqual(self.requests(), [('POST', '/applications/filter')])
+        self.assertEqual(len(app.design['vms']), 2)
+        self.assertEqual(app.vms[0]['name'], 'web')
+        self.assertEqual(app['deployment']['vms'][1]['state'], 'STOPPED')
+        self.assertEqual(self.requests()[1:], [('GET', '/applications/1;design'),
+                                               ('GET', '/applications/1;deployment')])
+
+    def test_reload_by_name(self):
+        app = self.client.get_application_by_name('app1', lazy=True)
+        self.assertEqual(app['_href'], '/applications/1')
+        self.assertEqual(self.client.reload(app)['name'], 'app1')
+        self.assertEqual(self.requests()[1:], [('GET', '/applications/1')])
+
+    def test_views(self):
+        app = Application(self.client, 1)
+        self.assertEqual(self.requests(), [])
+        self.assertEqual(sorted(app.state), ['STARTED', 'STOPPED'])
+        self.assertEqual(app.public_ips, [('web', '1.2.3.4')])
+        self.assertEqual(app['name'], 'app1')
+        self.assertEqual(self.requests(), [('GET', '/applications/1;deployment'),
+                                           ('GET', '/applications/1;properties')])
+        self.assertIs(app.vms, app.vms)
+        app.reload()
+        self.assertEqual(app.public_ips, [('web', '1.2.3.4')])
+        self.assertEqual(len(self.requests()), 3)
+
+    def test_use_as_object(self):
+        app = Application(self.client, 1)
+        self.assertEqual(self.client.get_application(app, 'properties')['name'], 'app1')
+        expected = self.get_application('GET', '/applications/1', {}, b'')
+        expected['_href'] = '/applications/1'
+        self.assertEqual(app.to_dict(), expected)
+        self.assertIn('deployment', app)
+        self.assertNotIn('state', app)
+        self.assertEqual(app.get('state'), None)
+
+    def test_not_found(self):
+        app = Application(self.client, 2)
+        self.assertRaises(RavelloError, lambda: app.design)
+
+    def test_not_lazy(self):
+        app = self.client.get_application_by_name('app1', 'properties')
+        self.assertEqual((app['name'], app['owner']), ('app1', 'Test User'))
+        self.assertEqual(app['_href'], '/applications/1')
+        self.assertNotIn('design', app)
+        app = self.client.get_application_by_name('app1', 'design')
+        self.assertIn('design', app)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,359 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+import time
+import inspect
+import threading
+
+import requests
+
+from support import *
+from ravello_sdk import *
+from ravello_async import AsyncRavelloClient
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class TestAsyncClient(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.route('POST', '/login', self.login)
+        self.server.route('GET', '/applications', self.get_applications)
+        self.server.route('POST', '/applications', self.create_application)
+        self.server.route('GET', '/applications/\\d+', self.get_application)
+        self.server.route('POST', '/applications/\\d+/start', lambda *args: (202, [], b''))
+        self.server.route('GET', '/applications/\\d+/vms/\\d+/vncUrl',
+                          lambda *args: (200, [('Content-Type', 'text/plain')], b'vnc://url'))
+        self.server.route('GET', '/broken', lambda *args: (500, [], b''))
+        self.server.route('GET', '/throttled', self.throttled)
+        self.server.start()
+        self.lock = threading.Lock()
+        self.logins = 0
+        self.token = None
+        self.throttles = 2
+        self.client = AsyncRavelloClient('user', 'pass', url=self.server.url)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def login(self, method, path, headers, body):
+        with self.lock:
+            self.logins += 1
+            self.token = 'session{0}'.format(self.logins)
+        cookie = 'JSESSIONID={0}; Path=/'.format(self.token)
+        return json_response({'id': 1}, headers=[('Set-Cookie', cookie)])
+
+    def authorized(self, headers):
+        with self.lock:
+            return headers.get('Cookie') == 'JSESSIONID={0}'.format(self.token)
+
+    def get_applications(self, method, path, headers, body):
+        if not self.authorized(headers):
+            return 401, [], b''
+        return [{'id': 1, 'name': 'app1'}, {'id': 2, 'name': 'app2'}]
+
+    def get_application(self, method, path, headers, body):
+        if not self.authorized(headers):
+            return 401, [], b''
+        ident = int(path.split('/')[-1])
+        if ident >= 100:
+            return 404, [], b''
+        return {'id': ident, 'name': 'app{0}'.format(ident)}
+
+    def create_application(self, method, path, headers, body):
+        app = json.loads(body.decode('utf-8'))
+        app['id'] = 3
+        return app
+
+    def throttled(self, method, path, headers, body):
+        with self.lock:
+            self.throttles -= 1
+            if self.throttles >= 0:
+                return 429, [('Retry-After', '0')], b''
+        return {'id': 1}
+
+    def test_mapped_methods(self):
+        async def main():
+            apps = await self.client.get_applications()
+            self.assertEqual([app['_href'] for app in apps],
+                             ['/applications/1', '/applications/2'])
+            apps = await self.client.get_applications({'name': 'app2'})
+            self.assertEqual(len(apps), 1)
+            app = await self.client.get_application(1)
+            self.assertEqual(app, {'id': 1, 'name': 'app1', '_href': '/applications/1'})
+            self.assertIsNone(await self.client.get_application(100))
+            app = await self.client.create_application({'name': 'app3'})
+            self.assertEqual(app['_href'], '/applications/3')
+            self.assertIsNone(await self.client.start_application(app))
+            url = await self.client.get_vnc_url(1, 2)
+            self.assertEqual(url, 'vnc://url')
+            app = await self.client.reload(app)
+            self.assertEqual(app['name'], 'app3')
+            await self.client.close()
+        run(main())
+
+    def test_same_as_sync(self):
+        sync = RavelloClient('user', 'pass', url=self.server.url)
+        exc = self.assertRaises(requests.HTTPError, sync.request, 'GET', '/broken')
+        async def main():
+            self.assertEqual(sync.get_applications(), await self.client.get_applications())
+            with self.assertRaisesRegex(requests.HTTPError, '500') as cm:
+                await self.client.request('GET', '/broken')
+            self.assertEqual(str(exc), str(cm.exception))
+            await self.client.close()
+        run(main())
+        sync.close()
+
+    def test_concurrent(self):
+        async def main():
+            apps = await asyncio.gather(*[self.client.get_application(i % 50) for i in range(200)])
+            self.assertEqual([app['id'] for app in apps], [i % 50 for i in range(200)])
+            # Expire the session: all coroutines get a 401, one logs in again.
+            self.token = 'expired'
+            apps = await asyncio.gather(*[self.client.get_application(i) for i in range(50)])
+            self.assertEqual(len(apps), 50)
+            await self.client.close()
+        run(main())
+        self.assertEqual(self.logins, 2)
+        self.assertLessEqual(self.server.connections, self.client.pool_maxsize)
+
+    def test_keepalive(self):
+        async def main():
+            for i in range(10):
+                await self.client.get_application(1)
+            await self.client.close()
+        run(main())
+        self.assertEqual(self.server.connections, 1)
+
+    def test_wait_for(self):
+        async def main():
+            app = await self.client.get_application(1)
+            reloaded = await self.client.wait_for(app, {'name': 'app1'}, timeout=10)
+            self.assertEqual(reloaded, app)
+            self.assertIsNot(reloaded, app)
+            with self.assertRaisesRegex(RavelloError, 'timeout'):
+                await self.client.wait_for(app, {'name': 'x'}, 0)
+            await self.client.close()
+        run(main())
+        self.assertRaises(TypeError, getattr, self.client, 'poller')
+
+    def test_by_name(self):
+        self.server.route('POST', '/applications/filter',
+                          lambda *args: [{'id': 1, 'name': 'app1'}])
+        async def main():
+            app = await self.client.get_application_by_name('app1', 'properties')
+            self.assertEqual(app['_href'], '/applications/1')
+            app = await self.client.reload(app)
+            await self.client.close()
+            return app
+        self.assertEqual(run(main())['name'], 'app1')
+
+    def test_batch(self):
+        async def main():
+            progress = []
+            results = await self.client.map('get_application', [1, 2, 100, 3], max_workers=2,
+                                            progress=lambda *args: progress.append(args))
+            await self.client.close()
+            return results, progress
+        results, progress = run(main())
+        self.assertEqual([result.result and result.result['id'] for result in results],
+                         [1, 2, None, 3])
+        self.assertEqual(progress, [(i, 4) for i in range(1, 5)])
+
+    def test_retry(self):
+        async def main():
+            entity = await self.client.request('GET', '/throttled')
+            self.assertEqual(entity['id'], 1)
+            await self.client.close()
+        run(main())
+        self.assertEqual(self.client.retry_policy.retry_count, 2)
+        self.assertEqual(self.client.retry_policy.backoff_time, 0)
+
+    def test_stats(self):
+        async def main():
+            await self.client.request('GET', '/throttled')
+            await self.client.get_application(1)
+            await self.client.close()
+        run(main())
+        stats = self.client.stats()
+        self.assertEqual(stats['GET /throttled']['statuses'], {429: 2, 200: 1})
+        self.assertEqual(stats['GET /throttled']['retries'], 2)
+        self.assertEqual(stats['GET /applications/{id}']['bytes_received'],
+                         len(b'{"id": 1, "name": "app1"}'))
+
+    def test_session_store(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        store = SessionStore(os.path.join(tmpdir, 'sessions'))
+        async def main(client):
+            await client.get_applications()
+            await client.close()
+        run(main(AsyncRavelloClient('user', 'pass', url=self.server.url, session_store=store)))
+        run(main(AsyncRavelloClient('user', 'pass', url=self.server.url, session_store=store)))
+        self.assertEqual(self.logins, 1)
+        self.token = 'expired'
+        run(main(AsyncRavelloClient('user', 'pass', url=self.server.url, session_store=store)))
+        self.assertEqual(self.logins, 2)
+
+    def test_iter(self):
+        self.server.route('GET', '/billing', lambda *args: json_response(
+                [{'id': i, 'charge': i * 0.5} for i in range(500)],
+                headers=[('Transfer-Encoding', 'chunked')]))
+        async def main():
+            apps = [app async for app in self.client.iter_applications()]
+            self.assertEqual(apps, await self.client.get_applications())
+            charges = [charge async for charge in
+                       self.client.iter_billing(lambda charge: charge['id'] % 2)]
+            self.assertEqual(len(charges), 250)
+            self.assertEqual(charges[-1], {'id': 499, 'charge': 249.5, '_href': '/billing/499'})
+            # An iterator that is closed early releases its connection.
+            it = self.client.iter_billing()
+            self.assertEqual((await it.__anext__())['id'], 0)
+            await it.aclose()
+            self.assertEqual(len(await self.client.get_billing()), 500)
+            self.assertEqual(self.client._connection.connections, 2)
+            await self.client.close()
+        run(main())
+
+    def test_validator_cache(self):
+        self.server.route('GET', '/etagged', lambda method, path, headers, body:
+                          (304, [], b'') if headers.get('If-None-Match') == '"1"'
+                          else json_response({'id': 1}, headers=[('ETag', '"1"')]))
+        client = AsyncRavelloClient('user', 'pass', url=self.server.url, validator_cache=True)
+        async def main():
+            first = await client.request('GET', '/etagged')
+            self.assertEqual(await client.request('GET', '/etagged'), first)
+            await client.close()
+        run(main())
+        self.assertEqual((client.validator_cache.hits, client.validator_cache.misses), (1, 1))
+
+    def test_coalesce(self):
+        self.client.coalesce = True
+        async def main():
+            await self.client.login()
+            apps = await asyncio.gather(*[self.client.get_application(1) for i in range(10)])
+            await self.client.close()
+            return apps
+        apps = run(main())
+        self.assertEqual(self.server.requests.count(('GET', '/applications/1')), 1)
+        self.assertEqual(self.client.coalesced, 9)
+        self.assertEqual(apps[0], apps[9])
+        self.assertIsNot(apps[0], apps[9])
+
+    def test_governor(self):
+        governor = ConcurrencyGovernor(initial=2, maximum=8)
+        client = AsyncRavelloClient('user', 'pass', url=self.server.url, governor=governor,
+                                    coalesce=False)
+        async def main():
+            await client.login()
+            apps = await asyncio.gather(*[client.get_application(1) for i in range(40)])
+            # The login, and at most the limit for the rest.
+            self.assertLessEqual(client._connection.connections, 1 + max(
+                    limit for when, limit in governor.history))
+            await client.close()
+            return apps
+        self.assertEqual(len(run(main())), 40)
+        self.assertEqual(governor.inflight, 0)
+        self.assertGreater(governor.limit, 2)
+
+    def test_governor_cancel(self):
+        self.server.route('GET', '/slow', lambda *args: (time.sleep(0.2), {'id': 1})[1])
+        governor = ConcurrencyGovernor(initial=1, maximum=1)
+        client = AsyncRavelloClient('user', 'pass', url=self.server.url, governor=governor,
+                                    coalesce=False)
+        async def main():
+            await client.login()
+            first = asyncio.ensure_future(client.request('GET', '/slow'))
+            second = asyncio.ensure_future(client.request('GET', '/slow'))
+            third = asyncio.ensure_future(client.request('GET', '/slow'))
+            await asyncio.sleep(0.05)
+            # The second waits for a slot when it is cancelled.
+            second.cancel()
+            entities = await asyncio.wait_for(asyncio.gather(first, third), 5)
+            self.assertTrue(second.cancelled())
+            await client.close()
+            return entities
+        self.assertEqual([entity['id'] for entity in run(main())], [1, 1])
+        self.assertEqual(governor.inflight, 0)
+        self.assertEqual(len(governor._waiters), 0)
+
+    def test_breaker_cancel(self):
+        self.server.route('GET', '/slow', lambda *args: (time.sleep(0.2), {'id': 1})[1])
+        governor = ConcurrencyGovernor(initial=1, maximum=1)
+        breaker = CircuitBreaker(min_requests=1, reset_timeout=0.05)
+        client = AsyncRavelloClient('user', 'pass', url=self.server.url, governor=governor,
+                                    circuit_breaker=breaker)
+        async def main():
+            await client.login()
+            first = asyncio.ensure_future(client.request('GET', '/slow'))
+            await asyncio.sleep(0.02)
+            breaker.record(True)
+            await asyncio.sleep(0.1)
+            self.assertEqual(breaker.state, 'half-open')
+            # The second waits for a slot when it is cancelled, and must not
+            # hold on to the probe.
+            second = asyncio.ensure_future(client.request('GET', '/slow'))
+            await asyncio.sleep(0.02)
+            second.cancel()
+            await first
+            entity = await client.request('GET', '/slow')
+            await client.close()
+            return entity
+        self.assertEqual(run(main())['id'], 1)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_tracer(self):
+        tracer = Tracer()
+        client = AsyncRavelloClient('user', 'pass', url=self.server.url, tracer=tracer)
+        async def main():
+            await client.login()
+            await asyncio.gather(client.get_application(1), client.get_application(2))
+            await client.close()
+        run(main())
+        spans = tracer.exporter.spans
+        self.assertEqual([(span.name, span.parent.name) for span in spans[:1]],
+                         [('POST /login', 'login')])
+        attempts = [span for span in spans if span.name == 'GET /applications/{id}']
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual([span.parent.name for span in attempts], ['get_application'] * 2)
+        self.assertIsNot(attempts[0].parent, attempts[1].parent)
+        self.assertIsNone(attempts[0].parent.parent)
+
+    def test_method_surface(self):
+        for name, value in vars(RavelloClient).items():
+            if name.startswith('_') or not inspect.isfunction(value):
+                continue
+            method = getattr(AsyncRavelloClient, name)
+            if name in AsyncRavelloClient._sync_methods or name.startswith('iter_'):
+                self.assertFalse(asyncio.iscoroutinefunction(method), name)
+            else:
+                self.assertTrue(asyncio.iscoroutinefunction(method), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import time
+import threading
+
+import requests
+
+from support import *
+from ravello_sdk import *
+
+
+class TestBatch(UnitTest):
+
+    delay = 0.05
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.route('POST', '/applications/\\d+/setExpiration', self.set_expiration)
+        self.server.route('GET', '/applications/\\d+', self.get_application)
+        self.server.start()
+        self.lock = threading.Lock()
+        self.inflight = self.max_inflight = 0
+        self.client = RavelloClient('user', 'pass', url=self.server.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def set_expiration(self, method, path, headers, body):
+        with self.lock:
+            self.inflight += 1
+            self.max_inflight = max(self.inflight, self.max_inflight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.inflight -= 1
+        if path.split('/')[2] == '13':
+            return 500, [], b''
+        return 200, [], b''
+
+    def get_application(self, method, path, headers, body):
+        return {'id': int(path.split('/')[-1])}
+
+    def test_map(self):
+        req = {'expirationFromNowSeconds': 3600}
+        progress = []
+        start = time.time()
+        results = self.client.map('set_application_expiration',
+                                  [(app, req) for app in range(40)], max_workers=8,
+                                  progress=lambda done, total: progress.append((done, total)))
+        elapsed = time.time() - start
+        self.assertEqual(len(results), 40)
+        self.assertEqual([result.call[1][0] for result in results], list(range(40)))
+        errors = [result for result in results if result.error is not None]
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].call[1][0], 13)
+        self.assertIsInstance(errors[0].error, requests.HTTPError)
+        self.assertEqual(progress, [(i, 40) for i in range(1, 41)])
+        self.assertLessEqual(self.max_inflight, 8)
+        self.assertLess(elapsed, 40 * self.delay / 2)
+
+    def test_batch(self):
+        calls = [('get_application', (1,)), ('get_application', (), {'app': 2}),
+                 ('get_application', ())]
+        results = self.client.batch(calls)
+        self.assertEqual(results[0].result['id'], 1)
+        self.assertEqual(results[1].result['id'], 2)
+        self.assertIsInstance(results[2].error, TypeError)
+        self.assertEqual(self.client.batch([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import time
+import requests
+
+from support import *
+from ravello_sdk import *
+
+
+class TestCircuitBreaker(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.status = 200
+        self.server.route('GET', '/applications/\\d+', self.get_application)
+        self.server.start()
+        self.breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, reset_timeout=0.2)
+        self.client = RavelloClient('user', 'pass', url=self.server.url, retries=0,
+                                    circuit_breaker=self.breaker)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def get_application(self, method, path, headers, body):
+        if self.status != 200:
+            return self.status, [], b''
+        return {'id': 1}
+
+    def test_trip(self):
+        # The login and a request succeed, half of four requests fail.
+        self.client.login()
+        self.client.get_application(1)
+        self.status = 503
+        self.assertRaises(requests.HTTPError, self.client.get_application, 1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertRaises(requests.HTTPError, self.client.get_application, 1)
+        self.assertEqual(self.breaker.state, 'open')
+        sent = len(self.server.requests)
+        exc = self.assertRaises(CircuitOpenError, self.client.get_application, 1)
+        self.assertIsInstance(exc, RavelloError)
+        self.assertEqual(len(self.server.requests), sent)
+        self.assertEqual((self.breaker.trips, self.breaker.rejected), (1, 1))
+
+    def test_recover(self):
+        self.client.login()
+        self.status = 500
+        for i in range(3):
+            self.assertRaises(requests.HTTPError, self.client.get_application, 1)
+        self.assertEqual(self.breaker.state, 'open')
+        time.sleep(0.25)
+        self.assertEqual(self.breaker.state, 'half-open')
+        # A failed probe opens the breaker again.
+        self.assertRaises(requests.HTTPError, self.client.get_application, 1)
+        self.assertEqual(self.breaker.state, 'open')
+        time.sleep(0.25)
+        self.status = 200
+        self.assertEqual(self.client.get_application(1)['id'], 1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.breaker.trips, 2)
+
+    def test_probes(self):
+        breaker = CircuitBreaker(min_requests=1, reset_timeout=0, probes=2)
+        breaker.record(True)
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+        self.assertRaises(CircuitOpenError, breaker.allow)
+        breaker.record(False, True)
+        self.assertEqual(breaker.state, 'half-open')
+        breaker.record(False, True)
+        self.assertEqual(breaker.state, 'closed')
+        self.assertFalse(breaker.allow())
+
+    def test_window(self):
+        breaker = CircuitBreaker(min_requests=2, window=0.1)
+        breaker.record(True)
+        time.sleep(0.15)
+        breaker.record(True)
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record(True)
+        self.assertEqual(breaker.state, 'open')
+
+    def test_client_errors(self):
+        # Responses with other errors show that the API is up.
+        self.client.login()
+        self.status = 404
+        for i in range(10):
+            self.client.get_application(1)
+        self.assertEqual(self.breaker.state, 'closed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import json
+import time
+
+from support import *
+from ravello_sdk import *
+from ravello_sdk import _path_template
+
+
+class TestResponseCache(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.keypairs = [{'id': 1, 'name': 'kp1'}]
+        self.server.route('GET', '/keypairs', lambda *args: self.keypairs)
+        self.server.route('PUT', '/keypairs/\\d+', self.update_keypair)
+        self.server.route('GET', '/images', lambda *args: [{'id': 2, 'name': 'img'}])
+        self.server.route('GET', '/applications', lambda *args: [])
+        self.server.route('GET', '/applications/\\d+/publishLocations', lambda *args: ['us', 'eu'])
+        self.server.start()
+        self.cache = ResponseCache()
+        self.client = RavelloClient('user', 'pass', url=self.server.url,
+                                    response_cache=self.cache)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def update_keypair(self, method, path, headers, body):
+        self.keypairs = [json.loads(body.decode('utf-8'))]
+        return self.keypairs[0]
+
+    def gets(self):
+        return len([req for req in self.server.requests if req[0] == 'GET'])
+
+    def test_hit(self):
+        kps = self.client.get_keypairs()
+        kps[0]['name'] = 'changed'
+        self.assertEqual(self.client.get_keypairs()[0]['name'], 'kp1')
+        self.client.get_application_publish_locations(1)
+        self.client.get_application_publish_locations(1)
+        self.client.get_applications()
+        self.client.get_applications()
+        self.assertEqual(self.gets(), 4)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_invalidate(self):
+        self.client.get_images()
+        kps = self.client.get_keypairs()
+        kps[0]['name'] = 'renamed'
+        self.client.update_keypair(kps[0])
+        self.assertEqual(self.client.get_keypairs()[0]['name'], 'renamed')
+        self.assertEqual(self.cache.invalidations, 1)
+        self.client.get_images()
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_reload(self):
+        self.server.route('GET', '/diskImages/\\d+', lambda *args: self.diskimage)
+        self.diskimage = {'id': 3, 'state': 'SAVING'}
+        cache = ResponseCache({'/diskImages/{id}': 300})
+        client = RavelloClient('user', 'pass', url=self.server.url, response_cache=cache)
+        img = client.get_diskimage(3)
+        self.diskimage = {'id': 3, 'state': 'DONE'}
+        self.assertEqual(client.get_diskimage(3)['state'], 'SAVING')
+        # A reload always sees the current state.
+        self.assertEqual(client.reload(img)['state'], 'DONE')
+        self.assertEqual(client.get_diskimage(3)['state'], 'DONE')
+        client.close()
+        # Objects are not cached by default.
+        self.assertEqual(self.client.get_diskimage(3)['state'], 'DONE')
+        self.diskimage = {'id': 3, 'state': 'SAVING'}
+        self.assertEqual(self.client.get_diskimage(3)['state'], 'SAVING')
+
+    def test_ttl(self):
+        cache = ResponseCache({'/keypairs': 0.2, '/images': None})
+        client = RavelloClient('user', 'pass', url=self.server.url, response_cache=cache)
+        client.get_keypairs()
+        client.get_keypairs()
+        client.get_images()
+        time.sleep(0.25)
+        client.get_keypairs()
+        self.assertEqual((cache.hits, cache.misses, cache.expirations), (1, 2, 1))
+        self.assertEqual(len(cache), 1)
+        client.close()
+
+    def test_bounds(self):
+        self.cache.maxsize = 1
+        self.client.get_keypairs()
+        self.client.get_images()
+        self.assertEqual((len(self.cache), self.cache.evictions), (1, 1))
+        size = self.cache.nbytes
+        self.cache.maxsize = 10
+        self.cache.maxbytes = size + 10
+        self.client.get_keypairs()
+        self.assertEqual((len(self.cache), self.cache.nbytes), (1, size))
+        self.assertEqual(self.cache.evictions, 2)
+        # Responses larger than maxbytes are not cached at all.
+        self.cache.maxbytes = size - 1
+        self.client.get_images()
+        self.assertEqual((len(self.cache), self.cache.evictions), (1, 2))
+
+    def test_path_template(self):
+        self.assertEqual(_path_template('/applications/12;deployment/vms/3?x=1'),
+                         '/applications/{id}/vms/{id}')
+        self.assertEqual(_path_template('/permissionsGroups/describe'),
+                         '/permissionsGroups/describe')
+
+
+if __name__ == '__main__':
+    unittest.main()
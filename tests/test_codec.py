@@ -0,0 +1,86 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from support import *
+from ravello_sdk import *
+
+
+class CountingCodec(JSONCodec):
+
+    def __init__(self):
+        self.encoded = self.decoded = 0
+
+    def encode(self, entity):
+        self.encoded += 1
+        return super(CountingCodec, self).encode(entity)
+
+    def decode(self, content):
+        self.decoded += 1
+        return super(CountingCodec, self).decode(content)
+
+
+class TestCodec(UnitTest):
+
+    entity = {'id': 1, 'name': u'été /app', 'ratio': 0.1, 'big': 2 ** 53,
+              'tags': [None, True, False], 'design': {'vms': [{'id': 2, 'cpus': 4}]}}
+
+    def check_codec(self, name):
+        try:
+            codec = get_codec(name)
+        except RavelloError:
+            raise SkipTest('{0} is not installed'.format(name))
+        self.assertEqual(codec.name, name)
+        body = codec.encode(self.entity)
+        self.assertIsInstance(body, bytes)
+        self.assertEqual(json.loads(body.decode('utf-8')), self.entity)
+        self.assertEqual(codec.decode(body), self.entity)
+        self.assertEqual(codec.decode(json.dumps(self.entity).encode('utf-8')), self.entity)
+        self.assertRaises(ValueError, codec.decode, b'{"id": ')
+
+    def test_json(self):
+        self.check_codec('json')
+
+    def test_orjson(self):
+        self.check_codec('orjson')
+
+    def test_ujson(self):
+        self.check_codec('ujson')
+
+    def test_get_codec(self):
+        self.assertIn(get_codec().name, ('orjson', 'ujson', 'json'))
+        self.assertRaises(RavelloError, get_codec, 'yaml')
+
+    def test_client_codec(self):
+        server = StandInServer()
+        server.route('POST', '/applications', lambda method, path, headers, body:
+                     dict(json.loads(body.decode('utf-8')), id=3))
+        server.start()
+        codec = CountingCodec()
+        client = RavelloClient('user', 'pass', url=server.url, codec=codec)
+        try:
+            app = client.create_application(self.entity['design'])
+            self.assertEqual(app['vms'], self.entity['design']['vms'])
+            self.assertEqual((codec.encoded, codec.decoded), (1, 2))
+        finally:
+            client.close()
+            server.stop()
+        self.assertEqual(RavelloClient(codec='json').codec.name, 'json')
+
+
+if __name__ == '__main__':
+    unittest.main()
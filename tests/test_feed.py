@@ -0,0 +1,163 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import, print_function
+
+import json
+import time
+import logging
+import threading
+
+from support import *
+from ravello_sdk import *
+
+
+class TestChangeFeed(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.route('POST', '/notifications/search', self.search)
+        self.server.route('GET', r'/applications/\d+', self.get_application)
+        self.server.start()
+        self.lock = threading.Lock()
+        self.notifications = []
+        self.queries = []
+        self.state = 'STOPPED'
+        self.client = RavelloClient('user', 'pass', url=self.server.url)
+        self.feed = ChangeFeed(self.client, interval=0.05)
+
+    def tearDown(self):
+        self.feed.stop()
+        self.client.close()
+        self.server.stop()
+
+    def search(self, method, path, headers, body):
+        query = json.loads(body.decode('utf-8'))
+        self.queries.append(query)
+        start, end = query['dateRange']['startTime'], query['dateRange']['endTime']
+        with self.lock:
+            return {'notification': [notification for notification in self.notifications
+                                     if start <= notification['eventTimeStamp'] <= end]}
+
+    def get_application(self, method, path, headers, body):
+        return {'id': 1, 'deployment': {'vms': [{'id': 1, 'state': self.state}]}}
+
+    def notify(self, event_type, app=1, level='INFO'):
+        notification = {'eventType': event_type, 'notificationLevel': level,
+                        'eventTimeStamp': int(time.time() * 1000),
+                        'eventProperties': [{'key': 'APP_ID', 'value': str(app)}]}
+        with self.lock:
+            self.notifications.append(notification)
+        return notification
+
+    def test_poll(self):
+        self.assertEqual(self.feed.poll(), [])
+        first = self.notify('VM_STARTED')
+        second = self.notify('APP_PUBLISHED', app=2)
+        self.assertEqual(self.feed.poll(), [first, second])
+        # The windows overlap, but notifications are only returned once.
+        self.assertEqual(self.feed.poll(), [])
+        self.assertEqual(self.feed.notifications, 2)
+        self.assertEqual(self.queries[2]['dateRange']['startTime'],
+                         self.queries[1]['dateRange']['endTime'] - 60000)
+        self.assertEqual(self.queries[2]['maxResults'], 1000)
+
+    def test_old_notifications(self):
+        old = self.notify('APP_PUBLISHED')
+        old['eventTimeStamp'] -= 1000
+        feed = ChangeFeed(self.client)
+        future = feed.wait(app=1)
+        self.assertEqual(feed.poll(), [])
+        self.assertFalse(future.done())
+        new = self.notify('APP_PUBLISHED')
+        new['eventTimeStamp'] = max(new['eventTimeStamp'], feed._created)
+        self.assertEqual(feed.poll(), [new])
+        self.assertEqual(future.result(0), new)
+
+    def test_subscribe(self):
+        received = []
+        errors = []
+        self.feed.subscribe(received.append)
+        subscription = self.feed.subscribe(errors.append, app={'id': 1}, levels=['ERROR'])
+        self.feed.poll()
+        self.notify('VM_STARTED')
+        error = self.notify('VM_FAILED', level='ERROR')
+        self.notify('VM_FAILED', app=2, level='ERROR')
+        self.feed.poll()
+        self.assertEqual(len(received), 3)
+        self.assertEqual(errors, [error])
+        self.feed.unsubscribe(subscription)
+        self.notify('VM_REPAIR_FAILED', level='ERROR')
+        self.feed.poll()
+        self.assertEqual((len(received), len(errors)), (4, 1))
+
+    def test_failing_subscriber(self):
+        def fail(notification):
+            raise ValueError('bad subscriber')
+        received = []
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        logger = logging.getLogger('ravello')
+        logger.addHandler(handler)
+        try:
+            self.feed.subscribe(fail)
+            self.feed.subscribe(received.append)
+            self.feed.poll()
+            self.notify('VM_STARTED')
+            self.feed.poll()
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith('change feed subscriber'))
+
+    def test_wait(self):
+        future = self.feed.wait(app=1, event_types=['APP_PUBLISHED'])
+        self.feed.start()
+        self.notify('VM_STARTED')
+        notification = self.notify('APP_PUBLISHED')
+        self.assertEqual(future.result(10), notification)
+        self.assertEqual(self.feed._subscriptions, [])
+
+    def test_wake_poller(self):
+        poller = self.client.poller
+        poller.interval = poller.max_interval = 60
+        future = poller.watch({'_href': '/applications/1'},
+                              lambda app: application_state(app) == 'STARTED')
+        # Wait for the first check.
+        for i in range(100):
+            if poller._watches[0].last is not None:
+                break
+            time.sleep(0.01)
+        self.feed.start()
+        self.state = 'STARTED'
+        self.notify('VM_STARTED')
+        # The poller would wait for a minute without the notification.
+        self.assertEqual(application_state(future.result(10)), 'STARTED')
+        self.assertEqual(poller.reloads, 2)
+
+    def test_validator_cache(self):
+        self.client.validator_cache = ValidatorCache()
+        self.client.validator_cache.update('GET', '/applications/1', 200,
+                                           {'ETag': '"1"'}, {'id': 1})
+        self.assertIsNotNone(self.client.validator_cache.lookup('/applications/1'))
+        self.notify('APP_UPDATED')
+        self.feed.poll()
+        self.assertIsNone(self.client.validator_cache.lookup('/applications/1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
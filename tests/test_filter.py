@@ -0,0 +1,190 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import json
+import requests
+
+from support import *
+from ravello_sdk import *
+from ravello_sdk import _compile_criteria
+
+
+def equals(name, operand):
+    return {'type': 'SIMPLE', 'operator': 'Equals', 'propertyName': name, 'operand': operand}
+
+
+class TestServerFilter(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.apps = [{'id': i, 'name': 'app{0}'.format(i), 'owner': 'user{0}'.format(i % 2),
+                      'deployment': {'cloud': 'AMAZON' if i < 5 else 'GOOGLE'}}
+                     for i in range(1, 9)]
+        self.criteria = []
+        self.server.route('GET', '/applications', lambda *args: self.apps)
+        self.server.route('POST', '/applications/filter', self.filter_applications)
+        self.server.route('GET', '/blueprints', lambda *args: [{'id': 1, 'name': 'bp1'}])
+        self.client = RavelloClient('user', 'pass', url=self.server.url, server_filters=True)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def filter_applications(self, method, path, headers, body):
+        # Evaluate only the top-level "Equals" criteria, like a partial
+        # implementation. The client filters the result locally as well.
+        criteria = json.loads(body.decode('utf-8'))
+        self.criteria.append(criteria)
+        apps = self.apps
+        for criterion in criteria['criteria']:
+            if criterion['type'] == 'SIMPLE' and criterion['operator'] == 'Equals' \
+                    and '.' not in criterion['propertyName']:
+                apps = [app for app in apps
+                        if app.get(criterion['propertyName']) == criterion['operand']]
+        return apps
+
+    def test_compile(self):
+        self.assertEqual(_compile_criteria({'name': 'app1', 'deployment': {'cloud': 'AMAZON'}}),
+                         {'type': 'COMPLEX', 'operator': 'And', 'criteria': [
+                             equals('name', 'app1'), equals('deployment.cloud', 'AMAZON')]})
+        criteria = _compile_criteria({'owner': In('a', 'b'), 'name': Contains('web'),
+                                      'creationTime': Range(10, None)})['criteria']
+        criteria.sort(key=lambda criterion: criterion.get('propertyName', ''))
+        self.assertEqual(criteria, [
+            {'type': 'COMPLEX', 'operator': 'Or', 'criteria': [equals('owner', 'a'),
+                                                               equals('owner', 'b')]},
+            {'type': 'SIMPLE', 'operator': 'GreaterThanOrEquals',
+             'propertyName': 'creationTime', 'operand': 10},
+            {'type': 'SIMPLE', 'operator': 'Contains', 'propertyName': 'name', 'operand': 'web'}])
+        self.assertIsNone(_compile_criteria(lambda app: True))
+        self.assertIsNone(_compile_criteria({'name': lambda name: True, 'tags': ['a']}))
+
+    def test_operators(self):
+        self.assertTrue(In(1, 2)(2))
+        self.assertFalse(In(1, 2)(3))
+        self.assertTrue(Contains('pp')('app'))
+        self.assertTrue(Contains('a')(['a', 'b']))
+        self.assertFalse(Contains('a')(1))
+        self.assertTrue(Range(1, 3)(3))
+        self.assertFalse(Range(None, 3)(4))
+        self.assertFalse(Range(1)('a'))
+
+    def test_server_side(self):
+        apps = self.client.get_applications({'owner': 'user1', 'deployment': {'cloud': 'GOOGLE'}})
+        self.assertEqual([app['id'] for app in apps], [5, 7])
+        self.assertEqual(apps[0]['_href'], '/applications/5')
+        self.assertIn(('POST', '/applications/filter'), self.server.requests)
+        self.assertNotIn(('GET', '/applications'), self.server.requests)
+
+    def test_multiple_operators(self):
+        apps = self.client.get_applications({'id': Range(2, 6), 'owner': In('user0'),
+                                             'name': Contains('app')})
+        self.assertEqual([app['id'] for app in apps], [2, 4, 6])
+
+    def test_iter(self):
+        apps = list(self.client.iter_applications({'owner': 'user0', 'id': lambda i: i > 4}))
+        self.assertEqual([app['id'] for app in apps], [6, 8])
+        self.assertEqual(apps[0]['_href'], '/applications/6')
+        self.assertEqual(len(self.criteria), 1)
+
+    def test_local(self):
+        apps = self.client.get_applications(lambda app: app['id'] == 3)
+        self.assertEqual([app['id'] for app in apps], [3])
+        self.assertEqual(self.criteria, [])
+        # Server filters are opt-in.
+        client = RavelloClient('user', 'pass', url=self.server.url)
+        self.assertEqual(len(client.get_applications({'owner': 'user0'})), 4)
+        self.assertEqual(self.criteria, [])
+        client.close()
+
+    def test_not_supported(self):
+        for i in range(2):
+            self.assertEqual(len(self.client.get_blueprints({'name': 'bp1'})), 1)
+        self.assertEqual(self.server.requests.count(('POST', '/blueprints/filter')), 1)
+        self.assertEqual(len(list(self.client.iter_blueprints({'name': 'bp1'}))), 1)
+
+    def test_rejected(self):
+        self.server.route('POST', '/applications/filter', lambda *args: (400, [], b''))
+        apps = self.client.get_applications({'deployment': {'cloud': 'GOOGLE'}})
+        self.assertEqual([app['id'] for app in apps], [5, 6, 7, 8])
+        self.assertEqual(len(list(self.client.iter_applications({'owner': 'user0'}))), 4)
+        self.assertEqual(self.server.requests.count(('POST', '/applications/filter')), 1)
+        # Other errors are not hidden.
+        self.server.route('POST', '/blueprints/filter', lambda *args: (500, [], b''))
+        self.client.retries = 0
+        self.assertRaises(requests.HTTPError, self.client.get_blueprints, {'name': 'bp1'})
+        self.server.route('POST', '/blueprints/filter', lambda *args: (405, [], b''))
+        self.assertEqual(len(list(self.client.iter_blueprints({'name': 'bp1'}))), 1)
+
+
+class TestCompileFilter(UnitTest):
+
+    apps = [{'id': 1, 'name': 'web', 'owner': 'admin', 'published': True,
+             'deployment': {'cloud': 'AMAZON', 'totalActiveVms': 2}},
+            {'id': 2, 'name': 'db', 'owner': 'user', 'published': False,
+             'deployment': {'cloud': 'GOOGLE', 'totalActiveVms': 0}},
+            {'id': 3, 'name': 'test', 'owner': 'user'}]
+
+    def select(self, flt):
+        ids = [app['id'] for app in compile_filter(flt).select(self.apps)]
+        records = [Record(app, '/applications') for app in self.apps]
+        self.assertEqual([app['id'] for app in compile_filter(flt).select(records)], ids)
+        return ids
+
+    def test_dict(self):
+        self.assertEqual(self.select({'owner': 'user'}), [2, 3])
+        self.assertEqual(self.select({'owner': 'user', 'published': False}), [2])
+        self.assertEqual(self.select({'deployment': {'cloud': 'GOOGLE'}}), [2])
+        self.assertEqual(self.select({'name': 'none'}), [])
+        self.assertEqual(self.select({'missing': 'x'}), [])
+        self.assertEqual(self.select({'owner': None}), [])
+        self.assertEqual(self.select({'owner': {'name': 'admin'}}), [])
+        self.assertEqual(self.select({}), [1, 2, 3])
+
+    def test_callables(self):
+        # All keys are matched, not just the ones up to the first callable.
+        self.assertEqual(self.select({'id': lambda i: i > 1, 'name': 'test'}), [3])
+        self.assertEqual(self.select({'id': Range(1, 2), 'owner': In('user')}), [2])
+        self.assertEqual(self.select({'deployment': {'totalActiveVms': Range(1)}}), [1])
+        self.assertEqual(self.select(lambda app: app['name'].startswith('d')), [2])
+
+    def test_compound(self):
+        self.assertEqual(self.select(Or({'name': 'web'}, {'name': 'test'})), [1, 3])
+        self.assertEqual(self.select(And({'owner': 'user'}, lambda app: 'deployment' in app)), [2])
+        self.assertEqual(self.select(Not({'owner': 'user'})), [1])
+        self.assertEqual(self.select({'owner': Not('admin')}), [2, 3])
+        self.assertEqual(self.select({'name': Or('web', Contains('es'))}), [1, 3])
+        self.assertEqual(self.select({'deployment': Or({'cloud': 'AMAZON'},
+                                                      {'totalActiveVms': 0})}), [1, 2])
+
+    def test_compiled(self):
+        match = compile_filter({'owner': 'user'})
+        self.assertIs(compile_filter(match), match)
+        self.assertTrue(match(self.apps[1]))
+        self.assertFalse(match(self.apps[0]))
+        self.assertEqual(compile_filter(And(match, {'id': 3})).select(self.apps), [self.apps[2]])
+        self.assertRaises(TypeError, compile_filter, 'owner')
+        self.assertEqual(_compile_criteria(And({'name': 'web'}, lambda app: True, match)),
+                         {'type': 'COMPLEX', 'operator': 'And',
+                          'criteria': [equals('name', 'web')]})
+        self.assertEqual(_compile_criteria(match),
+                         {'type': 'COMPLEX', 'operator': 'And',
+                          'criteria': [equals('owner', 'user')]})
+        self.assertIsNone(_compile_criteria(Or({'name': 'web'}, {'name': 'db'})))
+
+
+if __name__ == '__main__':
+    unittest.main()
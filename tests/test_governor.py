@@ -0,0 +1,114 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import time
+import threading
+
+from support import *
+from ravello_sdk import *
+
+
+class TestConcurrencyGovernor(UnitTest):
+
+    def test_aimd(self):
+        governor = ConcurrencyGovernor(initial=4, maximum=10)
+        for i in range(4):
+            self.assertTrue(governor.try_acquire())
+        self.assertFalse(governor.try_acquire())
+        self.assertFalse(governor.acquire(timeout=0.01))
+        # A round of responses at a stable latency raises the limit by about 1.
+        for i in range(4):
+            governor.release(0.1)
+        governor.acquire()
+        governor.release(0.1)
+        self.assertEqual(governor.limit, 5)
+        # Congestion halves the limit, once per round.
+        governor.acquire()
+        governor.acquire()
+        governor.release(0.1, congested=True)
+        governor.release(0.1, congested=True)
+        self.assertEqual(governor.limit, 2)
+        self.assertEqual([limit for when, limit in governor.history], [4, 5, 2])
+        self.assertEqual(governor.inflight, 0)
+
+    def test_latency(self):
+        governor = ConcurrencyGovernor(initial=2, tolerance=2.0)
+        for i in range(10):
+            governor.acquire()
+            governor.release(0.1)
+        limit = governor.limit
+        # A rising latency stops the increase.
+        for i in range(20):
+            governor.acquire()
+            governor.release(1.0)
+        self.assertEqual(governor.limit, limit)
+        self.assertGreater(governor.latency, 0.2)
+
+    def test_bounds(self):
+        governor = ConcurrencyGovernor(initial=2, minimum=2, maximum=3)
+        for i in range(100):
+            governor.acquire()
+            governor.release(0.1)
+        self.assertEqual(governor.limit, 3)
+        governor.acquire()
+        governor.release(0.1, congested=True)
+        self.assertEqual(governor.limit, 2)
+
+    def test_waiters(self):
+        governor = ConcurrencyGovernor(initial=1)
+        governor.acquire()
+        woken = []
+        self.assertFalse(governor.try_acquire(lambda: woken.append(1)))
+        thread = threading.Thread(target=governor.acquire)
+        thread.start()
+        governor.release(0.1)
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(woken, [1])
+
+    def test_client(self):
+        server = StandInServer()
+        lock = threading.Lock()
+        state = {'inflight': 0, 'peak': 0, 'served': 0}
+        def get_application(method, path, headers, body):
+            with lock:
+                state['served'] += 1
+                if state['inflight'] >= 6:
+                    return 503, [], b''
+                state['inflight'] += 1
+                state['peak'] = max(state['peak'], state['inflight'])
+            time.sleep(0.01)
+            with lock:
+                state['inflight'] -= 1
+            return {'id': 1}
+        server.route('GET', '/applications/\\d+', get_application)
+        server.start()
+        governor = ConcurrencyGovernor(initial=2, maximum=16)
+        client = RavelloClient('user', 'pass', url=server.url, governor=governor,
+                               retry_policy=RetryPolicy(retries=10, backoff=0.01))
+        results = client.map('get_application', range(300))
+        client.close()
+        server.stop()
+        self.assertTrue(all(result.error is None for result in results))
+        self.assertEqual(client.pool_maxsize, 16)
+        # The limit went up, and was cut back on the 503s.
+        self.assertGreater(max(limit for when, limit in governor.history), 6)
+        self.assertLess(governor.limit, 16)
+        self.assertLessEqual(state['peak'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import, print_function
+
+import re
+
+from support import *
+from ravello_sdk import *
+
+
+def make_app(ident, name, version=1, owner='alice', region='Virginia', states=('STARTED',)):
+    vms = [{'id': ident*10+i, 'name': 'vm{0}'.format(i), 'state': state}
+           for i, state in enumerate(states)]
+    return {'id': ident, 'name': name, 'owner': owner, 'version': version,
+            'deployment': {'regionName': region, 'vms': vms}}
+
+
+class TestInventory(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.apps = {1: make_app(1, 'Web'),
+                     2: make_app(2, 'db', owner='bob', region='Ashburn',
+                                 states=('STOPPED', 'STARTED'))}
+        self.server.route('GET', '/applications', self.get_applications)
+        self.server.route('GET', r'/applications/\d+', self.get_application)
+        self.client = RavelloClient('user', 'pass', url=self.server.url)
+        self.inventory = Inventory(self.client)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def get_applications(self, method, path, headers, body):
+        return [dict((key, app[key]) for key in ('id', 'name', 'owner', 'version'))
+                for app in self.apps.values()]
+
+    def get_application(self, method, path, headers, body):
+        ident = int(re.search(r'\d+', path).group(0))
+        if ident not in self.apps:
+            return 404, [], b''
+        return self.apps[ident]
+
+    def fetches(self):
+        return sorted(path for method, path in self.server.requests
+                      if re.match(r'/applications/\d+$', path))
+
+    def test_lookups(self):
+        self.assertEqual(self.inventory.refresh(), 2)
+        inventory = self.inventory
+        self.assertEqual(len(inventory), 2)
+        self.assertIn(1, inventory)
+        self.assertIn({'id': 2}, inventory)
+        self.assertNotIn(3, inventory)
+        self.assertEqual(inventory.get(1)['name'], 'Web')
+        self.assertIsNone(inventory.get(3))
+        self.assertEqual(inventory.find('WEB')['id'], 1)
+        self.assertIsNone(inventory.find('nope'))
+        self.assertEqual(sorted(app['id'] for app in inventory.by_state('STARTED')), [1, 2])
+        self.assertEqual([app['id'] for app in inventory.by_state('STOPPED')], [2])
+        self.assertEqual([app['id'] for app in inventory.by_owner('bob')], [2])
+        self.assertEqual([app['id'] for app in inventory.by_region('Virginia')], [1])
+        self.assertEqual(inventory.by_region('Frankfurt'), [])
+        app, vm = inventory.get_vm(21)
+        self.assertEqual((app['id'], vm['state']), (2, 'STARTED'))
+        self.assertIsNone(inventory.get_vm(99))
+        self.assertEqual(sorted(app['id'] for app, vm in inventory.find_vms('VM0')), [1, 2])
+
+    def test_incremental_refresh(self):
+        self.inventory.refresh()
+        self.assertEqual(self.fetches(), ['/applications/1', '/applications/2'])
+        del self.server.requests[:]
+        self.assertEqual(self.inventory.refresh(), 0)
+        self.assertEqual(self.server.requests, [('GET', '/applications')])
+        del self.server.requests[:]
+        self.apps[2] = make_app(2, 'db', version=2, owner='carol')
+        self.apps[3] = make_app(3, 'new')
+        del self.apps[1]
+        self.assertEqual(self.inventory.refresh(), 2)
+        self.assertEqual(self.fetches(), ['/applications/2', '/applications/3'])
+        self.assertEqual(sorted(app['id'] for app in self.inventory), [2, 3])
+        self.assertIsNone(self.inventory.find('web'))
+        self.assertEqual(self.inventory.by_owner('bob'), [])
+        self.assertEqual([app['id'] for app in self.inventory.by_owner('carol')], [2])
+
+    def test_duplicate_names(self):
+        self.apps[3] = make_app(3, 'WEB')
+        self.inventory.refresh()
+        self.assertRaises(RavelloError, self.inventory.find, 'web')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import json
+import requests
+
+from support import *
+from ravello_sdk import *
+from ravello_sdk import _JSONArrayParser
+
+
+class TestJSONArrayParser(UnitTest):
+
+    def parse(self, data, size, codec=None):
+        parser = _JSONArrayParser(codec)
+        elements = []
+        for pos in range(0, len(data), size):
+            elements.extend(parser.feed(data[pos:pos+size]))
+        elements.extend(parser.feed(b'', True))
+        return elements
+
+    def test_chunks(self):
+        value = [{'id': 1, 'name': u'été ☃'}, 12345, -1.5e3, 'x,]', [], None,
+                 True, {'nested': [1, {'a': '}'}]}, 'a\\"]\\\\', {'b': '\\"}'}]
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        for size in (1, 2, 3, 7, len(data)):
+            self.assertEqual(self.parse(data, size), value)
+        self.assertEqual(self.parse(b' [ ] ', 1), [])
+
+    def test_codec(self):
+        decoded = []
+        class Codec(JSONCodec):
+            def decode(self, content):
+                decoded.append(content)
+                return JSONCodec.decode(self, content)
+        value = [{'id': i, 'vms': [{'name': 'vm{0}'.format(j)} for j in range(100)]}
+                 for i in range(3)]
+        data = json.dumps(value).encode('utf-8')
+        self.assertEqual(self.parse(data, 7, Codec()), value)
+        # Each element is decoded once, as a whole.
+        self.assertEqual(len(decoded), 3)
+
+    def test_errors(self):
+        for data in (b'{"id": 1}', b'[1, 2', b'[1 2]', b'[1,, 2]', b'[1] 2', b''):
+            self.assertRaises(ValueError, self.parse, data, 2)
+
+
+class TestIterators(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.apps = [{'id': i, 'name': 'app{0}'.format(i)} for i in range(1000)]
+        self.server.route('GET', '/applications', lambda *args: self.apps)
+        self.server.route('GET', '/billing', lambda *args: json_response(
+                self.apps, headers=[('Transfer-Encoding', 'chunked')]))
+        self.server.route('GET', '/images', lambda *args: (404, [], b''))
+        self.server.route('GET', '/keypairs', lambda *args: (500, [], b''))
+        self.client = RavelloClient('user', 'pass', url=self.server.url)
+        self.client._stream_chunk_size = 4096
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_iter(self):
+        apps = list(self.client.iter_applications())
+        self.assertEqual(apps, self.client.get_applications())
+        self.assertEqual(apps[10]['_href'], '/applications/10')
+        apps = list(self.client.iter_billing({'name': 'app42'}))
+        self.assertEqual(apps, [{'id': 42, 'name': 'app42', '_href': '/billing/42'}])
+        self.assertEqual(list(self.client.iter_images()), [])
+        self.assertRaises(requests.HTTPError, list, self.client.iter_keypairs())
+
+    def test_early_exit(self):
+        for app in self.client.iter_applications():
+            break
+        # The partially read connection is closed, and a new one is used.
+        self.assertEqual(len(self.client.get_applications()), 1000)
+        self.assertEqual(self.server.connections, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
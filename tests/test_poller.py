@@ -0,0 +1,153 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import, print_function
+
+import re
+import threading
+
+from concurrent.futures import wait
+
+from support import *
+from ravello_sdk import *
+
+
+class TestPoller(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.route('GET', '/applications', self.get_applications)
+        self.server.route('GET', r'/applications/\d+', self.get_application)
+        self.server.route('POST', r'/applications/\d+/(start|stop)', self.start_stop)
+        self.server.start()
+        self.lock = threading.Lock()
+        self.apps = dict((i, {'id': i, 'name': 'app{0}'.format(i), 'published': False,
+                              'deployment': {'vms': [{'id': 1, 'state': 'STOPPED'}]}})
+                         for i in range(1, 21))
+        self.client = RavelloClient('user', 'pass', url=self.server.url)
+        self.poller = self.client.poller
+        self.poller.interval = 0.01
+        self.poller.max_interval = 0.05
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def get_applications(self, method, path, headers, body):
+        with self.lock:
+            return [{'id': app['id'], 'name': app['name'], 'published': app['published'],
+                     'deployment': {'totalActiveVms': len([vm for vm in app['deployment']['vms']
+                                                           if vm['state'] == 'STARTED'])}}
+                    for app in self.apps.values()]
+
+    def get_application(self, method, path, headers, body):
+        with self.lock:
+            app = self.apps.get(int(path.split('/')[-1]))
+            if app is None:
+                return 404, [], b''
+            return app
+
+    def start_stop(self, method, path, headers, body):
+        ident, action = re.match(r'/applications/(\d+)/(\w+)', path).groups()
+        state = 'STARTED' if action == 'start' else 'STOPPED'
+        # The state changes after the call returns.
+        def change():
+            with self.lock:
+                self.apps[int(ident)]['deployment']['vms'][0]['state'] = state
+        threading.Timer(0.05, change).start()
+        return 202, [], b''
+
+    def count(self, method, path):
+        return len([req for req in self.server.requests if req == (method, path)])
+
+    def reloads(self):
+        return len([req for req in self.server.requests
+                    if re.match(r'/applications/\d+$', req[1])])
+
+    def test_list_calls(self):
+        # Register all at once, like a single thread would.
+        with self.poller._cond:
+            futures = [self.poller.watch({'_href': '/applications/{0}'.format(i)},
+                                         {'published': True}, timeout=10)
+                       for i in self.apps]
+        self.assertEqual(len(self.poller), 20)
+        def publish():
+            with self.lock:
+                for app in self.apps.values():
+                    app['published'] = True
+        threading.Timer(0.1, publish).start()
+        done, pending = wait(futures, timeout=10)
+        self.assertEqual(len(done), 20)
+        self.assertEqual(futures[0].result()['deployment']['vms'][0]['state'], 'STOPPED')
+        # The apps are only reloaded to confirm the match.
+        self.assertEqual(self.reloads(), 20)
+        self.assertEqual(self.poller.reloads, 20)
+        self.assertGreater(self.poller.lists, 1)
+        self.assertEqual(self.count('GET', '/applications'), self.poller.lists)
+        self.assertEqual(len(self.poller), 0)
+
+    def test_wait(self):
+        futures = [self.client.start_application(app, wait=True) for app in (1, 2)]
+        apps = [future.result(10) for future in futures]
+        self.assertEqual([application_state(app) for app in apps], ['STARTED', 'STARTED'])
+        future = self.client.stop_application(1, wait=True)
+        self.assertEqual(application_state(future.result(10)), 'STOPPED')
+        self.assertIsNone(self.client.stop_application(2))
+
+    def test_wait_list_calls(self):
+        with self.poller._cond:
+            futures = [self.client.start_application(app, wait=True) for app in self.apps]
+        done, pending = wait(futures, timeout=10)
+        self.assertEqual(len(done), 20)
+        self.assertEqual(application_state(futures[0].result()), 'STARTED')
+        # The state is only in the full object, but the list rules out
+        # apps without active VMs.
+        self.assertGreater(self.poller.lists, 0)
+        self.assertEqual(self.reloads(), 20)
+
+    def test_wait_for(self):
+        app = self.client.get_application(1)
+        self.client.start_application(app)
+        # The timeout defaults to the client timeout.
+        app = self.client.wait_for(app, lambda app: application_state(app) == 'STARTED')
+        self.assertEqual(application_state(app), 'STARTED')
+        exc = self.assertRaises(RavelloError, self.client.wait_for, app, {'name': 'x'}, 0.1)
+        self.assertEqual(str(exc), 'timeout waiting for condition')
+        del self.apps[1]
+        exc = self.assertRaises(RavelloError, self.client.wait_for, app, {'name': 'x'}, 10)
+        self.assertEqual(str(exc), 'object /applications/1 not found')
+
+    def test_adaptive_interval(self):
+        self.poller.interval = 0.1
+        self.poller.max_interval = 0.3
+        future = self.poller.watch({'_href': '/applications/1'}, {'name': 'x'}, timeout=1.5)
+        self.assertRaises(RavelloError, future.result, 10)
+        # Without backoff this would have been 15 reloads.
+        self.assertLess(self.poller.reloads, 9)
+
+    def test_cancel(self):
+        future = self.poller.watch({'_href': '/applications/1'}, {'name': 'x'}, timeout=10)
+        self.assertTrue(future.cancel())
+        self.assertTrue(future.cancelled())
+        for i in range(100):
+            if self.poller._thread is None:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(len(self.poller), 0)
+        self.assertIsNone(self.poller._thread)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import, print_function
+
+import threading
+
+from support import *
+from ravello_sdk import *
+
+
+class TestClientPool(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.route('GET', '/applications', lambda *args: [{'id': 1, 'name': 'app1'}])
+        self.server.start()
+        self.pool = ClientPool(maxsize=4)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+    def logins(self):
+        return self.server.requests.count(('POST', '/login'))
+
+    def client(self, username, password='pass'):
+        return self.pool.client(username, password, url=self.server.url)
+
+    def test_shared_logins(self):
+        for i in range(100):
+            with self.client('user{0}'.format(i % 4)) as client:
+                self.assertTrue(client.logged_in)
+                client.get_applications()
+        self.assertEqual(self.logins(), 4)
+        self.assertEqual(self.pool.created, 4)
+        self.assertEqual(len(self.pool), 4)
+
+    def test_concurrent(self):
+        def run(i):
+            with self.client('user{0}'.format(i % 2)) as client:
+                client.get_applications()
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.logins(), 2)
+
+    def test_evict_lru(self):
+        for i in range(5):
+            with self.client('user{0}'.format(i)):
+                pass
+        self.assertEqual(len(self.pool), 4)
+        # user0 was evicted, user1 is still in the pool.
+        with self.client('user1'):
+            pass
+        self.assertEqual(self.logins(), 5)
+        with self.client('user0'):
+            pass
+        self.assertEqual(self.logins(), 6)
+
+    def test_full(self):
+        clients = [self.pool.acquire('user{0}'.format(i), 'pass', self.server.url)
+                   for i in range(4)]
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(
+                self.pool.acquire('user4', 'pass', self.server.url)))
+        thread.start()
+        thread.join(0.2)
+        self.assertEqual(acquired, [])
+        self.pool.release(clients[2])
+        thread.join()
+        self.assertEqual(len(acquired), 1)
+        self.assertFalse(clients[2].logged_in)
+        self.assertTrue(clients[0].logged_in)
+
+    def test_idle(self):
+        with self.client('user') as client:
+            pass
+        self.pool.idle_timeout = 0
+        with self.client('user') as client2:
+            pass
+        self.assertFalse(client is client2)
+        self.assertFalse(client.logged_in)
+        self.assertEqual(self.logins(), 2)
+
+    def test_password(self):
+        with self.client('user') as client:
+            # Logging in again is a no-op, with other credentials an error.
+            client.login()
+            self.assertRaises(RuntimeError, client.login, 'user', 'other')
+        with self.client('user', 'other') as client2:
+            self.assertFalse(client is client2)
+        with self.client('user') as client3:
+            self.assertTrue(client is client3)
+        self.assertEqual(self.pool.created, 2)
+        self.assertEqual(self.logins(), 2)
+
+    def test_login_failure(self):
+        self.server.route('POST', '/login', lambda *args: (401, [], b''))
+        self.assertRaises(Exception, self.pool.acquire, 'user', 'wrong', self.server.url)
+        # The client is not in use, and can be evicted.
+        self.assertEqual(self.pool._leased, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import time
+import threading
+
+from support import *
+from ravello_sdk import *
+
+
+class TestTokenBucket(UnitTest):
+
+    def test_burst(self):
+        bucket = TokenBucket(10, burst=3)
+        self.assertTrue(all(bucket.try_acquire() for i in range(3)))
+        self.assertFalse(bucket.try_acquire())
+        self.assertFalse(bucket.acquire(timeout=0.01))
+        start_time = time.time()
+        self.assertTrue(bucket.acquire(timeout=1))
+        self.assertAlmostEqual(time.time() - start_time, 0.1, delta=0.05)
+
+    def test_reserve(self):
+        bucket = TokenBucket(100, burst=1)
+        waits = [bucket.reserve() for i in range(5)]
+        self.assertEqual(waits[0], 0)
+        for i in range(1, 5):
+            self.assertAlmostEqual(waits[i], i / 100.0, delta=0.005)
+        self.assertLess(bucket.tokens, -3)
+        self.assertEqual(bucket.reserve(1, max_wait=0.01), None)
+        bucket.release(4)
+        self.assertTrue(bucket.tokens > -0.1)
+
+    def test_threads(self):
+        bucket = TokenBucket(200, burst=10)
+        def worker():
+            for i in range(10):
+                bucket.acquire()
+        threads = [threading.Thread(target=worker) for i in range(5)]
+        start_time = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 50 tokens, of which 10 are available immediately.
+        self.assertAlmostEqual(time.time() - start_time, 0.2, delta=0.1)
+
+
+class TestRateLimiter(UnitTest):
+
+    def test_classify(self):
+        limiter = RateLimiter()
+        self.assertEqual(limiter.classify('GET', '/applications/1'), 'read')
+        self.assertEqual(limiter.classify('POST', '/applications/1/start'), 'action')
+        self.assertEqual(limiter.classify('POST', '/applications/1/vms/2/resetDisks'), 'action')
+        self.assertEqual(limiter.classify('GET', '/billing?year=2015&month=1'), 'billing')
+        self.assertEqual(limiter.classify('POST', '/applications'), 'write')
+        self.assertEqual(limiter.classify('PUT', '/applications/1'), 'write')
+
+    def test_limits(self):
+        limiter = RateLimiter(limits={'action': (10, 1), 'billing': 1})
+        self.assertTrue(limiter.try_acquire('POST', '/applications/1/stop'))
+        self.assertFalse(limiter.try_acquire('POST', '/applications/1/start'))
+        # Other endpoint classes are not limited.
+        self.assertTrue(all(limiter.try_acquire('GET', '/applications') for i in range(100)))
+        self.assertTrue(limiter.acquire('POST', '/applications/1/start', timeout=0.5))
+        self.assertEqual(limiter.waits, 1)
+        self.assertGreater(limiter.wait_time, 0.05)
+
+    def test_all_or_nothing(self):
+        limiter = RateLimiter(rate=1, burst=2, limits={'read': (1, 1)})
+        self.assertTrue(limiter.try_acquire('GET', '/applications'))
+        self.assertFalse(limiter.try_acquire('GET', '/applications'))
+        # The global token was given back when the read budget ran out.
+        self.assertGreaterEqual(limiter.bucket.tokens, 0.99)
+        self.assertTrue(limiter.try_acquire('PUT', '/applications/1'))
+
+    def test_client(self):
+        server = StandInServer()
+        server.route('GET', '/applications', lambda *args: [])
+        server.start()
+        limiter = RateLimiter(rate=50, burst=1)
+        client = RavelloClient('user', 'pass', url=server.url, rate_limiter=limiter)
+        start_time = time.time()
+        for i in range(10):
+            client.get_applications()
+        # The login and 10 requests, of which the first is sent immediately.
+        self.assertGreaterEqual(time.time() - start_time, 0.19)
+        self.assertEqual(limiter.waits, 10)
+        client.close()
+        server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from support import *
+from ravello_sdk import *
+
+
+class TestRecords(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.apps = [{'id': i, 'name': 'app{0}'.format(i), 'owner': 'Test User',
+                      'deployment': {'cloud': 'AMAZON', 'totalActiveVms': i}}
+                     for i in range(1, 4)]
+        self.server.route('GET', '/applications', lambda *args: self.apps)
+        self.server.route('GET', '/applications/\\d+', lambda method, path, headers, body:
+                          self.apps[int(path.split('/')[-1]) - 1])
+        self.server.route('PUT', '/applications/\\d+', self.update_application)
+        self.server.route('GET', '/billing', lambda *args: json_response(
+                [{'id': i, 'charge': 0.5} for i in range(100)],
+                headers=[('Transfer-Encoding', 'chunked')]))
+        self.updates = []
+        self.client = RavelloClient('user', 'pass', url=self.server.url, compact=True)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def update_application(self, method, path, headers, body):
+        self.updates.append(json.loads(body.decode('utf-8')))
+        return self.updates[-1]
+
+    def test_record(self):
+        apps = self.client.get_applications()
+        self.assertEqual([type(app) for app in apps], [Record] * 3)
+        app = apps[1]
+        self.assertEqual(app['name'], 'app2')
+        self.assertEqual(app.name, 'app2')
+        self.assertEqual(app['_href'], '/applications/2')
+        self.assertEqual(app.get('state', 'none'), 'none')
+        self.assertIn('owner', app)
+        self.assertIn('_href', app)
+        self.assertNotIn('state', app)
+        self.assertEqual(app.deployment['cloud'], 'AMAZON')
+        self.assertRaises(KeyError, lambda: app['state'])
+        self.assertRaises(AttributeError, lambda: app.state)
+        expected = dict(self.apps[1], _href='/applications/2')
+        self.assertEqual(app.to_dict(), expected)
+        self.assertEqual(app, expected)
+        self.assertEqual(sorted(app), sorted(expected))
+        self.assertEqual(len(app), len(expected))
+
+    def test_shared(self):
+        apps = self.client.get_applications()
+        self.assertIs(apps[0]._shape, apps[2]._shape)
+        self.assertIs(apps[0].owner, apps[2].owner)
+        self.assertIs(apps[0].deployment['cloud'], apps[2].deployment['cloud'])
+        self.assertFalse(hasattr(apps[0], '__dict__'))
+
+    def test_filter(self):
+        apps = self.client.get_applications({'name': 'app3'})
+        self.assertEqual([app.id for app in apps], [3])
+        apps = self.client.get_applications(lambda app: app['id'] > 1)
+        self.assertEqual([app.id for app in apps], [2, 3])
+
+    def test_use_as_object(self):
+        app = self.client.get_applications()[0]
+        self.assertEqual(self.client.get_application(app)['id'], 1)
+        self.assertEqual(self.client.reload(app)['name'], 'app1')
+        self.client.update_application(app)
+        self.assertEqual(self.updates[0]['name'], 'app1')
+
+    def test_iter(self):
+        charges = list(self.client.iter_billing())
+        self.assertEqual(len(charges), 100)
+        self.assertEqual(charges[99]['_href'], '/billing/99')
+        self.assertIs(charges[0]._shape, charges[99]._shape)
+
+    def test_default(self):
+        client = RavelloClient('user', 'pass', url=self.server.url)
+        self.assertEqual(type(client.get_applications()[0]), dict)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
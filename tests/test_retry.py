@@ -0,0 +1,118 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import time
+import requests
+
+from support import *
+from ravello_sdk import *
+
+
+class TestRetryPolicy(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.failures = []
+        self.server.route('GET', '/applications', self.get_applications)
+        self.server.route('POST', '/applications', self.create_application)
+        self.policy = RetryPolicy(retries=3, backoff=0.001)
+        self.client = RavelloClient('user', 'pass', url=self.server.url,
+                                    retry_policy=self.policy)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def get_applications(self, method, path, headers, body):
+        if self.failures:
+            failure = self.failures.pop(0)
+            if failure is None:
+                raise RuntimeError('dropping connection')
+            return failure
+        return [{'id': 1, 'name': 'app1'}]
+
+    def create_application(self, method, path, headers, body):
+        if self.failures:
+            return self.failures.pop(0)
+        return {'id': 2, 'name': 'app2'}
+
+    def test_retry_status(self):
+        self.failures = [(503, [], b''), (502, [], b''), (504, [], b'')]
+        apps = self.client.get_applications()
+        self.assertEqual(apps[0]['id'], 1)
+        self.assertEqual(self.policy.retry_count, 3)
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_retries_exhausted(self):
+        self.failures = [(503, [], b'')] * 4
+        exc = self.assertRaises(requests.HTTPError, self.client.get_applications)
+        self.assertTrue(str(exc).startswith('503 Server Error'))
+        self.assertEqual(self.policy.retry_count, 3)
+        self.assertEqual(self.policy.giveup_count, 1)
+
+    def test_not_idempotent(self):
+        self.failures = [(503, [], b'')]
+        self.assertRaises(requests.HTTPError, self.client.create_application, {'name': 'app2'})
+        self.assertEqual(self.policy.retry_count, 0)
+        # Throttled requests were not processed, so they are always retried.
+        self.failures = [(429, [], b'')]
+        app = self.client.create_application({'name': 'app2'})
+        self.assertEqual(app['id'], 2)
+        self.assertEqual(self.policy.retry_count, 1)
+
+    def test_retry_after(self):
+        self.failures = [(429, [('Retry-After', '1')], b'')]
+        start_time = time.time()
+        self.client.get_applications()
+        self.assertGreaterEqual(time.time() - start_time, 1)
+        self.assertEqual(self.policy.backoff_time, 1)
+        headers = {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+        self.assertEqual(self.policy.retry_after(headers), 0)
+        self.assertEqual(self.policy.retry_after({}), None)
+
+    def test_budget(self):
+        self.policy.budget = 0.5
+        self.failures = [(503, [('Retry-After', '1')], b'')]
+        self.assertRaises(requests.HTTPError, self.client.get_applications)
+        self.assertEqual(self.policy.retry_count, 0)
+        self.assertEqual(self.policy.giveup_count, 1)
+
+    def test_backoff(self):
+        policy = RetryPolicy(retries=10, backoff=1, max_backoff=4, budget=100)
+        delays = [policy.delay(attempt, 0) for attempt in range(10)]
+        self.assertTrue(all(0 <= delay <= min(4, 2 ** i) for i, delay in enumerate(delays)))
+        self.assertEqual(policy.retry_count, 10)
+        self.assertAlmostEqual(policy.backoff_time, sum(delays))
+        self.assertEqual(policy.delay(10, 0), None)
+
+    def test_connection_error(self):
+        # A handler that raises drops the connection without a response.
+        self.failures = [None]
+        self.assertEqual(self.client.get_applications()[0]['id'], 1)
+        self.assertEqual(self.policy.retry_count, 1)
+        self.failures = [None] * 4
+        self.assertRaises(RavelloError, self.client.get_applications)
+        self.assertEqual(self.policy.giveup_count, 1)
+
+    def test_retries_shorthand(self):
+        client = RavelloClient(retries=5)
+        self.assertEqual(client.retry_policy.retries, 5)
+        client.retries = 0
+        self.assertEqual(client.retry_policy.retries, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import, print_function
+
+import os
+import stat
+import shutil
+import tempfile
+import threading
+
+from support import *
+from ravello_sdk import *
+
+
+class TestSessionStore(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.route('POST', '/login', self.login)
+        self.server.route('GET', '/applications', self.get_applications)
+        self.server.route('GET', '/events', self.get_applications)
+        self.server.start()
+        self.lock = threading.Lock()
+        self.logins = 0
+        self.token = None
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = SessionStore(os.path.join(self.tmpdir, 'sessions'))
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def login(self, method, path, headers, body):
+        with self.lock:
+            self.logins += 1
+            self.token = 'session{0}'.format(self.logins)
+        return json_response({'id': 1, 'name': 'user'},
+                             headers=[('Set-Cookie', 'JSESSIONID={0}; Path=/'.format(self.token))])
+
+    def get_applications(self, method, path, headers, body):
+        with self.lock:
+            if headers.get('Cookie') != 'JSESSIONID={0}'.format(self.token):
+                return 401, [], b''
+        return [{'id': 1, 'name': 'app1'}]
+
+    def new_client(self, username='user'):
+        return RavelloClient(username, 'pass', url=self.server.url, session_store=self.store)
+
+    def test_reuse_session(self):
+        client = self.new_client()
+        client.get_applications()
+        client.close()
+        self.assertEqual(self.logins, 1)
+        self.assertEqual(stat.S_IMODE(os.stat(self.store.filename).st_mode), 0o600)
+        client = self.new_client()
+        client.login()
+        self.assertEqual(client.user_info['name'], 'user')
+        self.assertEqual(client.get_applications()[0]['id'], 1)
+        client.close()
+        self.assertEqual(self.logins, 1)
+        # Sessions are saved per user.
+        client = self.new_client('other')
+        client.get_applications()
+        client.close()
+        self.assertEqual(self.logins, 2)
+
+    def test_expired_session(self):
+        client = self.new_client()
+        client.get_applications()
+        client.close()
+        # The server forgets the session: the client logs in again.
+        self.token = 'expired'
+        client = self.new_client()
+        self.assertEqual(client.get_applications()[0]['id'], 1)
+        self.assertEqual(self.logins, 2)
+        self.assertEqual(self.store.load(client._session_key())['cookies'][0]['value'],
+                         'session2')
+        client.close()
+        # Too old sessions are not used.
+        self.store.max_age = -1
+        client = self.new_client()
+        client.get_applications()
+        client.close()
+        self.assertEqual(self.logins, 3)
+        self.assertEqual(self.server.requests.count(('POST', '/login')), 3)
+
+    def test_logout(self):
+        self.server.route('POST', '/logout', lambda *args: (200, [], b''))
+        client = self.new_client()
+        client.login()
+        self.assertIsNotNone(self.store.load(client._session_key()))
+        client.logout()
+        self.assertIsNone(self.store.load(client._session_key()))
+
+    def test_permissions(self):
+        client = self.new_client()
+        client.login()
+        client.close()
+        os.chmod(self.store.filename, 0o644)
+        self.assertIsNone(self.store.load(client._session_key()))
+
+    def test_stale_tempfile(self):
+        tmpname = '{0}.{1}.tmp'.format(self.store.filename, os.getpid())
+        with open(tmpname, 'w'):
+            pass
+        os.chmod(tmpname, 0o644)
+        client = self.new_client()
+        client.login()
+        client.close()
+        self.assertEqual(stat.S_IMODE(os.stat(self.store.filename).st_mode), 0o600)
+        self.assertIsNotNone(self.store.load(client._session_key()))
+
+    def test_warm_up(self):
+        client = self.new_client()
+        thread = client.warm_up(background=True)
+        thread.join()
+        self.assertTrue(client.logged_in)
+        self.assertEqual(self.server.requests[-1], ('GET', '/events'))
+        client.get_applications()
+        client.close()
+        self.assertEqual(self.logins, 1)
+
+    def test_warm_up_uncached(self):
+        client = RavelloClient('user', 'pass', url=self.server.url,
+                               response_cache=ResponseCache())
+        client.warm_up()
+        client.warm_up()
+        client.close()
+        self.assertEqual(self.server.requests.count(('GET', '/events')), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import logging
+
+from support import *
+from ravello_sdk import *
+
+
+class TestStats(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.failures = []
+        self.server.route('GET', '/applications/\\d+', self.get_application)
+        self.server.route('POST', '/applications/\\d+/vms/\\d+/start',
+                          lambda *args: (202, [], b''))
+        self.client = RavelloClient('user', 'pass', url=self.server.url,
+                                    retry_policy=RetryPolicy(backoff=0.001))
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def get_application(self, method, path, headers, body):
+        if self.failures:
+            return self.failures.pop(0)
+        return {'id': int(path.split('/')[-1]), 'name': 'app'}
+
+    def test_stats(self):
+        self.failures = [(503, [], b'')]
+        for ident in range(1, 4):
+            self.client.get_application(ident)
+        self.client.start_vm(1, 2)
+        self.client.start_vm(3, 4)
+        stats = self.client.stats()
+        self.assertEqual(sorted(stats), ['GET /applications/{id}',
+                                         'POST /applications/{id}/vms/{id}/start',
+                                         'POST /login'])
+        apps = stats['GET /applications/{id}']
+        self.assertEqual(apps['count'], 4)
+        self.assertEqual(apps['retries'], 1)
+        self.assertEqual(apps['errors'], 0)
+        self.assertEqual(apps['statuses'], {200: 3, 503: 1})
+        self.assertEqual(apps['bytes_sent'], 0)
+        self.assertEqual(apps['bytes_received'], 3 * len(b'{"id": 1, "name": "app"}'))
+        latency = apps['latency']
+        self.assertEqual(sum(count for bound, count in latency['histogram']), 4)
+        self.assertIsNone(latency['histogram'][-1][0])
+        self.assertTrue(latency['min'] <= latency['p50'] <= latency['p99'] <= latency['max'])
+        self.assertTrue(latency['min'] <= latency['mean'] <= latency['max'])
+        start = stats['POST /applications/{id}/vms/{id}/start']
+        self.assertEqual((start['count'], start['statuses']), (2, {202: 2}))
+        self.client.stats_collector.reset()
+        self.assertEqual(self.client.stats(), {})
+
+    def test_hooks(self):
+        events = []
+        self.client.on_request.append(lambda *args: events.append(('request',) + args))
+        self.client.on_response.append(lambda *args: events.append(('response',) + args[:3]))
+        self.client.on_retry.append(lambda *args: events.append(('retry',) + args))
+        self.client.login()
+        del events[:]
+        self.failures = [(503, [], b'')]
+        self.client.get_application(1)
+        self.assertEqual(events[0], ('request', 'GET', '/applications/1'))
+        self.assertEqual(events[1], ('response', 'GET', '/applications/1', 503))
+        self.assertEqual(events[2][:4], ('retry', 'GET', '/applications/1', 0))
+        self.assertEqual(events[2][-1], 503)
+        self.assertEqual(events[3:], [('request', 'GET', '/applications/1'),
+                                      ('response', 'GET', '/applications/1', 200)])
+
+    def test_failing_hook(self):
+        def hook(*args):
+            raise ValueError('broken hook')
+        self.client.on_response.append(hook)
+        logger = logging.getLogger('ravello')
+        level, logger.level = logger.level, logging.CRITICAL
+        try:
+            self.assertEqual(self.client.get_application(1)['id'], 1)
+        finally:
+            logger.setLevel(level)
+        self.assertEqual(self.client.stats()['GET /applications/{id}']['count'], 1)
+
+    def test_connection_error(self):
+        self.failures = [None]
+        self.server.route('GET', '/applications/\\d+', self.dropping)
+        self.client.get_application(1)
+        apps = self.client.stats()['GET /applications/{id}']
+        self.assertEqual((apps['count'], apps['errors'], apps['retries']), (2, 1, 1))
+        self.assertEqual(apps['statuses'], {200: 1})
+
+    def dropping(self, method, path, headers, body):
+        if self.failures and self.failures[0] is None:
+            self.failures.pop(0)
+            raise RuntimeError('dropping connection')
+        return self.get_application(method, path, headers, body)
+
+    def test_disabled(self):
+        client = RavelloClient(stats_collector=False)
+        self.assertIsNone(client.stats())
+        self.assertEqual(client.on_response, [])
+
+    def test_percentiles(self):
+        collector = StatsCollector(buckets=[0.1, 1])
+        for elapsed in (0.05, 0.05, 0.5, 2):
+            collector.response('GET', '/applications/1', 200, elapsed, 0, 0, None)
+        latency = collector.snapshot()['GET /applications/{id}']['latency']
+        self.assertEqual(latency['histogram'], [(0.1, 2), (1, 1), (None, 1)])
+        self.assertEqual((latency['p50'], latency['p90'], latency['max']), (0.1, 2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
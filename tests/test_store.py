@@ -0,0 +1,133 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import, print_function
+
+import os
+import re
+import shutil
+import tempfile
+
+from support import *
+from ravello_sdk import *
+
+
+class RecordingCodec(JSONCodec):
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, entity):
+        self.encoded.append(entity)
+        return super(RecordingCodec, self).encode(entity)
+
+
+class TestLocalStore(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.images = {1: {'id': 1, 'name': 'centos'}, 2: {'id': 2, 'name': 'ubuntu'}}
+        self.server.route('GET', '/images', lambda *args: list(self.images.values()))
+        self.server.route('GET', r'/images/\d+', self.get_image)
+        self.client = RavelloClient('user', 'pass', url=self.server.url)
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'store.db')
+        self.store = LocalStore(self.client, self.filename)
+
+    def tearDown(self):
+        self.store.wait()
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def get_image(self, method, path, headers, body):
+        ident = int(re.search(r'\d+', path).group(0))
+        if ident not in self.images:
+            return 404, [], b''
+        return dict(self.images[ident], size=10)
+
+    def listings(self):
+        return self.server.requests.count(('GET', '/images'))
+
+    def test_lookup(self):
+        self.assertIsNone(self.store.age('images'))
+        self.assertEqual(self.store.get_id('images', 'ubuntu'), 2)
+        self.assertEqual(self.listings(), 1)
+        self.assertLess(self.store.age('images'), 5)
+        self.assertEqual(self.store.find('images', 'centos')['_href'], '/images/1')
+        self.assertEqual(sorted(image['id'] for image in self.store.list('images')), [1, 2])
+        self.assertEqual(self.listings(), 1)
+        self.assertRaises(ValueError, self.store.find, 'users', 'me')
+
+    def test_persistent(self):
+        self.store.find('images', 'centos')
+        client = RavelloClient('user', 'pass', url=self.server.url)
+        store = LocalStore(client, self.filename)
+        self.assertEqual(store.get_id('images', 'ubuntu'), 2)
+        self.assertEqual(self.listings(), 1)
+        # Entries are kept per user.
+        client = RavelloClient('other', 'pass', url=self.server.url)
+        self.assertIsNone(LocalStore(client, self.filename).age('images'))
+        client.close()
+        # And per ephemeral access token.
+        client = RavelloClient(eph_token='token1', url=self.server.url)
+        LocalStore(client, self.filename).find('images', 'centos')
+        client.close()
+        client = RavelloClient(eph_token='token2', url=self.server.url)
+        self.assertIsNone(LocalStore(client, self.filename).age('images'))
+        client.close()
+        client = RavelloClient(eph_token='token1', url=self.server.url)
+        self.assertIsNotNone(LocalStore(client, self.filename).age('images'))
+        client.close()
+
+    def test_missing_name(self):
+        self.store.find('images', 'centos')
+        self.images[3] = {'id': 3, 'name': 'fedora'}
+        self.assertEqual(self.store.get_id('images', 'fedora'), 3)
+        self.assertEqual(self.listings(), 2)
+        self.assertIsNone(self.store.find('images', 'nope'))
+        self.assertEqual(self.listings(), 3)
+
+    def test_revalidate(self):
+        self.store.find('images', 'centos')
+        self.store.max_age = 0
+        self.images[1]['name'] = 'rhel'
+        # The stale entry is returned, and refreshed in the background.
+        self.assertEqual(self.store.get_id('images', 'centos'), 1)
+        self.store.wait()
+        self.assertEqual(self.listings(), 2)
+        self.store.max_age = 300
+        self.assertEqual(self.store.get_id('images', 'rhel'), 1)
+        self.assertEqual(self.listings(), 2)
+
+    def test_load(self):
+        self.assertEqual(self.store.load('images', 'centos')['size'], 10)
+        # Deleted and recreated with a different ID.
+        self.images = {4: {'id': 4, 'name': 'centos'}}
+        self.assertEqual(self.store.load('images', 'centos')['id'], 4)
+        self.assertEqual(self.listings(), 2)
+
+    def test_codec(self):
+        codec = RecordingCodec()
+        client = RavelloClient('user', 'pass', url=self.server.url, codec=codec)
+        store = LocalStore(client, self.filename)
+        self.assertEqual(store.get_id('images', 'ubuntu'), 2)
+        self.assertEqual(sorted(entity['id'] for entity in codec.encoded), [1, 2])
+        client.close()
+
+
+
+if __name__ == '__main__':
+    unittest.main()
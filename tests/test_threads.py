@@ -0,0 +1,149 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import threading
+
+from support import *
+from ravello_sdk import *
+
+
+class TestThreads(UnitTest):
+
+    nthreads = 32
+    nrequests = 20
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.route('POST', '/login', self.login)
+        self.server.route('GET', '/applications/\\d+', self.get_application)
+        self.server.start()
+        self.lock = threading.Lock()
+        self.logins = 0
+        self.served = 0
+        self.client = RavelloClient('user', 'pass', url=self.server.url,
+                                    pool_maxsize=self.nthreads)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def login(self, method, path, headers, body):
+        with self.lock:
+            self.logins += 1
+            self.token = 'session{0}'.format(self.logins)
+        cookie = 'JSESSIONID={0}'.format(self.token)
+        return json_response({'id': 1}, headers=[('Set-Cookie', cookie)])
+
+    def get_application(self, method, path, headers, body):
+        with self.lock:
+            if headers.get('Cookie') != 'JSESSIONID={0}'.format(self.token):
+                return 401, [], b''
+            self.served += 1
+            # Expire the session half way through.
+            if self.served == self.nthreads * self.nrequests // 2:
+                self.token = 'expired'
+        return {'id': int(path.split('/')[-1])}
+
+    def test_first_requests(self):
+        # A client with an ephemeral token sends no login request, so the
+        # per-session settings are set up by concurrent requests.
+        self.server.route('GET', '/keypairs', lambda *args: [])
+        client = RavelloClient(eph_token='token', url=self.server.url,
+                               pool_maxsize=self.nthreads)
+        errors = []
+        start = threading.Event()
+        def worker():
+            start.wait()
+            try:
+                client.get_keypairs()
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker) for i in range(self.nthreads)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        client.close()
+        self.assertEqual(errors, [])
+
+    def test_shared_client(self):
+        errors = []
+        def worker(ident):
+            try:
+                for i in range(self.nrequests):
+                    app = self.client.get_application(ident)
+                    self.assertEqual(app['id'], ident)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.nthreads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.served, self.nthreads * self.nrequests)
+        # One initial login and exactly one re-login after the expiry.
+        self.assertEqual(self.logins, 2)
+        self.assertLessEqual(self.server.connections, self.nthreads)
+
+    def test_coalesce(self):
+        release = threading.Event()
+        calls = []
+        def get_application(method, path, headers, body):
+            calls.append(path)
+            release.wait(5)
+            if path.endswith('/2'):
+                return 500, [], b''
+            return {'id': 1, 'vms': [{'id': 2}]}
+        self.server.route('GET', '/applications/\\d+', get_application)
+        self.client.coalesce = True
+        self.client.login()
+        results = []
+        errors = []
+        def worker(ident):
+            try:
+                results.append(self.client.get_application(ident))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker, args=(1 + i % 2,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        # Wait until all threads are either in flight, or following.
+        while self.client.coalesced < 8:
+            release.wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(calls), ['/applications/1', '/applications/2'])
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(errors), 5)
+        self.assertTrue(all(str(e).startswith('500') for e in errors))
+        # Every caller gets its own copy.
+        results[0]['vms'].append({'id': 3})
+        self.assertEqual(results[1], {'id': 1, 'vms': [{'id': 2}], '_href': '/applications/1'})
+        self.assertEqual(len(set(map(id, results))), 5)
+        self.assertEqual(self.client._flights, {})
+
+    def test_coalesce_header_pairs(self):
+        self.client.coalesce = True
+        app = self.client.request('GET', '/applications/1', headers=[['X-Test', 'yes']])
+        self.assertEqual(app['id'], 1)
+        self.assertEqual(self.client._flights, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import os
+import json
+import tempfile
+
+from support import *
+from ravello_sdk import *
+import ravello_cli
+
+
+class TestTracer(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.failures = []
+        self.server.route('GET', '/applications/\\d+', self.get_application)
+        self.server.route('POST', '/applications/filter', lambda *args: [{'id': 1, 'name': 'app'}])
+        self.server.route('GET', '/images', lambda *args: [{'id': 5, 'name': 'image'}])
+        self.server.route('GET', '/images/\\d+', lambda *args: {'id': 5, 'name': 'image'})
+        self.tracer = Tracer()
+        self.spans = self.tracer.exporter.spans
+        self.client = RavelloClient('user', 'pass', url=self.server.url, tracer=self.tracer,
+                                    retry_policy=RetryPolicy(backoff=0.001))
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def get_application(self, method, path, headers, body):
+        if self.failures:
+            failure = self.failures.pop(0)
+            if failure is None:
+                raise RuntimeError('dropping connection')
+            return failure
+        return {'id': int(path.split('/')[-1]), 'name': 'app'}
+
+    def tree(self, spans):
+        # Return the spans as nested (name, children) tuples.
+        def children(parent):
+            return [(span.name, children(span)) for span in spans if span.parent is parent]
+        return children(None)
+
+    def test_nested(self):
+        self.client.get_application_by_name('app')
+        self.assertEqual(self.tree(self.spans), [
+            ('get_application_by_name', [
+                ('POST /login', []),
+                ('POST /applications/filter', []),
+                ('get_application', [('GET /applications/{id}', [])])])])
+        self.assertEqual(len(set(span.trace_id for span in self.spans)), 1)
+        self.assertEqual(self.spans[-1].name, 'get_application_by_name')
+        self.assertTrue(all(span.duration >= 0 for span in self.spans))
+        attempt = self.spans[-3]
+        self.assertEqual(attempt.attributes['path'], '/applications/1')
+        self.assertEqual(attempt.attributes['status'], 200)
+        self.assertGreater(attempt.attributes['bytes_received'], 0)
+
+    def test_retries(self):
+        self.client.login()
+        self.tracer.exporter.clear()
+        self.failures = [None, (503, [], b'')]
+        self.client.get_application(1)
+        self.assertEqual(self.tree(self.spans), [
+            ('get_application', [('GET /applications/{id}', [])] * 3)])
+        self.assertIsNotNone(self.spans[0].error)
+        self.assertEqual(self.spans[1].attributes['status'], 503)
+        self.assertEqual(self.spans[2].error, None)
+
+    def test_error(self):
+        self.client.login()
+        self.tracer.exporter.clear()
+        self.server.route('POST', '/applications/filter', lambda *args: [])
+        self.assertRaises(RavelloError, self.client.get_application_by_name, 'app')
+        self.assertEqual(self.spans[-1].error, 'app "app" not found')
+        self.assertIsNone(self.tracer.current())
+
+    def test_batch(self):
+        self.client.login()
+        self.tracer.exporter.clear()
+        self.client.batch([('get_application', (i,)) for i in range(1, 4)])
+        names = [name for name, children in self.tree(self.spans)[0][1]]
+        self.assertEqual(names, ['get_application'] * 3)
+
+    def test_json_file(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            exporter = JSONFileExporter(filename)
+            self.client.tracer = Tracer(exporter)
+            self.client.get_application(1)
+            exporter.close()
+            with open(filename) as fin:
+                spans = [json.loads(line) for line in fin]
+        finally:
+            os.unlink(filename)
+        self.assertEqual([span['name'] for span in spans],
+                         ['POST /login', 'GET /applications/{id}', 'get_application'])
+        self.assertEqual(spans[1]['parent_id'], spans[2]['span_id'])
+        self.assertIsNone(spans[2]['parent_id'])
+
+    def test_cli_helper(self):
+        ravello_cli.get_image(self.client, 'image')
+        self.assertEqual(self.tree(self.spans), [
+            ('cli.get_image', [
+                ('get_images', [('POST /login', []), ('GET /images', [])]),
+                ('reload', [('GET /images/{id}', [])])])])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from support import *
+from ravello_sdk import *
+
+
+class TestTransport(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.seen = []
+        self.server.route('GET', '/applications', self.get_applications)
+        self.server.route('POST', '/applications', self.create_application)
+        self.server.route('GET', '/missing', lambda *args: (404, [], b'not found'))
+        self.client = RavelloClient('user', 'pass', url=self.server.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def get_applications(self, method, path, headers, body):
+        self.seen.append(dict(headers))
+        return [{'id': 1, 'name': 'app1'}, {'id': 2, 'name': 'app2'}]
+
+    def create_application(self, method, path, headers, body):
+        self.seen.append(dict(headers))
+        app = json.loads(body.decode('utf-8'))
+        app['id'] = 3
+        return app
+
+    def test_keepalive(self):
+        for i in range(20):
+            self.client.get_applications()
+        self.client.get_application(10)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_session_cookie(self):
+        self.client.get_applications()
+        self.client.get_applications()
+        self.assertEqual(self.seen[0]['Cookie'], 'JSESSIONID=standin')
+        self.assertEqual(self.seen[1]['Cookie'], 'JSESSIONID=standin')
+        self.assertEqual(self.server.requests[0], ('POST', '/login'))
+
+    def test_session_headers(self):
+        self.client.get_applications()
+        self.client.get_applications(filter={'name': 'app1'})
+        for headers in self.seen:
+            self.assertTrue(headers['User-Agent'].startswith('python-requests/'))
+            self.assertIn('gzip', headers['Accept-Encoding'])
+            self.assertEqual(headers['Accept'], 'application/json')
+
+    def test_entities(self):
+        apps = self.client.get_applications()
+        self.assertEqual([app['_href'] for app in apps], ['/applications/1', '/applications/2'])
+        app = self.client.create_application({'name': 'app3'})
+        self.assertEqual(app['name'], 'app3')
+        self.assertEqual(app['_href'], '/applications/3')
+        self.assertEqual(self.seen[1]['Content-Type'], 'application/json;charset=utf-8')
+        self.assertEqual(self.client.get_application(42), None)
+
+    def test_pool_size(self):
+        client = RavelloClient('user', 'pass', url=self.server.url, pool_maxsize=32)
+        client.login()
+        adapter = client._connection.get_adapter(self.server.url)
+        self.assertEqual(adapter._pool_maxsize, 32)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# Copyright 2012-2014 Ravello Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from support import *
+from ravello_sdk import *
+
+
+class TestValidatorCache(UnitTest):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.route('GET', '/applications/\\d+', self.get_application)
+        self.server.route('PUT', '/applications/\\d+', self.update_application)
+        self.server.route('GET', '/keypairs/\\d+', self.get_keypair)
+        self.server.start()
+        self.apps = {1: {'id': 1, 'name': 'app1', 'design': {'vms': [{'id': 2}]}, 'version': 1}}
+        self.conditions = []
+        self.cache = ValidatorCache(maxsize=2)
+        self.client = RavelloClient('user', 'pass', url=self.server.url,
+                                    validator_cache=self.cache)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def get_application(self, method, path, headers, body):
+        app = self.apps.get(int(path.split('/')[-1]))
+        if app is None:
+            return 404, [], b''
+        etag = '"v{0}"'.format(app['version'])
+        self.conditions.append(headers.get('If-None-Match'))
+        if headers.get('If-None-Match') == etag:
+            return 304, [('ETag', etag)], b''
+        return json_response(app, headers=[('ETag', etag)])
+
+    def update_application(self, method, path, headers, body):
+        app = json.loads(body.decode('utf-8'))
+        app['version'] += 1
+        self.apps[app['id']] = app
+        return app
+
+    def get_keypair(self, method, path, headers, body):
+        self.conditions.append(headers.get('If-Modified-Since'))
+        modified = 'Thu, 01 Jan 2015 00:00:00 GMT'
+        if headers.get('If-Modified-Since') == modified:
+            return 304, [], b''
+        return json_response({'id': 1, 'name': 'kp'}, headers=[('Last-Modified', modified)])
+
+    def test_etag(self):
+        app = self.client.get_application(1)
+        self.assertEqual(app['_href'], '/applications/1')
+        app2 = self.client.get_application(1)
+        self.assertEqual(app2, app)
+        self.assertEqual(self.conditions, [None, '"v1"'])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        # Every hit returns a copy.
+        app2['design']['vms'].append({'id': 3})
+        self.assertEqual(self.client.reload(app), app)
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_modified(self):
+        self.apps[1]['version'] = 2
+        self.client.get_application(1)
+        self.apps[1] = dict(self.apps[1], name='renamed', version=3)
+        self.assertEqual(self.client.get_application(1)['name'], 'renamed')
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_last_modified(self):
+        self.client.get_keypair(1)
+        self.assertEqual(self.client.get_keypair(1)['name'], 'kp')
+        self.assertEqual(self.conditions, [None, 'Thu, 01 Jan 2015 00:00:00 GMT'])
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_invalidate(self):
+        app = self.client.get_application(1)
+        self.client.update_application(app)
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.client.get_application(1)['version'], 2)
+        self.assertEqual(self.conditions, [None, None])
+        self.assertIsNone(self.client.get_application(5))
+        self.assertEqual(len(self.cache), 1)
+
+    def test_maxsize(self):
+        self.apps[2] = dict(self.apps[1], id=2)
+        self.apps[3] = dict(self.apps[1], id=3)
+        for ident in (1, 2, 1, 3, 1):
+            self.client.get_application(ident)
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.lookup('/applications/2'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()